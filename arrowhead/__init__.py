@@ -45,10 +45,57 @@ in derivative classes, in that case the base initial step is no longer
 considered initial.
 """
 
-__all__ = ['Flow', 'step', 'arrow', 'main']
+__all__ = ['Flow', 'step', 'arrow', 'main', 'run_concurrently',
+           'run_in_processes', 'FlowBuilder']
 __version__ = (1, 0, 0, "alpha", 2)
 BUG_URL = "https://github.com/zyga/arrowhead"
 
+import sys
+import types
+
 from arrowhead.core import Flow
 from arrowhead.decorators import step, arrow
-from arrowhead.main import main
+
+# The command line interface (with the debugger and visualization), the
+# executors and the flow builder are imported on first use, programs that only
+# run flows don't pay for importing them.
+_LAZY = {
+    'main': 'arrowhead.main',
+    'run_concurrently': 'arrowhead.executors',
+    'run_in_processes': 'arrowhead.executors',
+    'FlowBuilder': 'arrowhead.builder',
+}
+
+
+class _Package(types.ModuleType):
+    """
+    Type of this package
+
+    Importing the :mod:`arrowhead.main` submodule binds it as the 'main'
+    attribute of the package, which would hide the :func:`main()` function
+    exported under that name. The function is bound instead.
+    """
+
+    def __setattr__(self, name, value):
+        if name == 'main' and isinstance(value, types.ModuleType):
+            value = value.main
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
+
+
+def __getattr__(name):
+    try:
+        module_name = _LAZY[name]
+    except KeyError:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name))
+    import importlib
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
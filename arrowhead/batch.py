@@ -0,0 +1,233 @@
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from arrowhead.errors import FlowIsAsynchronous
+from arrowhead.errors import NoArrowCouldHaveBeenFollowed
+from arrowhead.errors import NumPyNotInstalled
+from arrowhead.forks import run_fork
+
+
+class Columns:
+    """
+    Columnar view of the state of a group of flows (or steps)
+
+    Reading an attribute returns a column with the value of that attribute
+    for each object in the group. Columns are NumPy arrays, so that they
+    support arithmetic and comparisons element by element. Assigning a
+    sequence (of the same length as the group) to an attribute sets the
+    attribute on each object in the group.
+
+    Columns are passed to the functions of vectorized steps, see
+    :func:`arrowhead.step()`.
+    """
+
+    __slots__ = ('_objects',)
+
+    def __init__(self, objects):
+        object.__setattr__(self, '_objects', objects)
+
+    def __repr__(self):
+        return "<{} of {} objects>".format(
+            self.__class__.__name__, len(self._objects))
+
+    def __len__(self):
+        return len(self._objects)
+
+    def __getattr__(self, name):
+        return make_column([getattr(obj, name) for obj in self._objects])
+
+    def __setattr__(self, name, values):
+        values = unpack_column(values, len(self._objects))
+        for obj, value in zip(self._objects, values):
+            setattr(obj, name, value)
+
+
+def make_column(values):
+    """
+    Convert a list of values to a column
+
+    :param values:
+        A list of values
+    :returns:
+        A NumPy array
+    :raises NumPyNotInstalled:
+        If NumPy is not available
+    """
+    if numpy is None:
+        raise NumPyNotInstalled
+    try:
+        return numpy.asarray(values)
+    except ValueError:
+        # ragged nested sequences cannot form a regular array
+        column = numpy.empty(len(values), dtype=object)
+        column[:] = values
+        return column
+
+
+def unpack_column(column, size):
+    """
+    Convert a column back to a list of plain Python values
+
+    :param column:
+        A NumPy array, any other sequence or None
+    :param size:
+        The expected size of the column
+    :returns:
+        A list with size elements. None is expanded to a list of Nones.
+    :raises ValueError:
+        If the column has a different size
+    """
+    if column is None:
+        return [None] * size
+    if numpy is not None and isinstance(column, numpy.ndarray):
+        values = column.tolist()
+    else:
+        values = list(column)
+    if len(values) != size:
+        raise ValueError(
+            "column has {} values, expected {}".format(len(values), size))
+    return values
+
+
+def make_scalar_call(func, needs_flow):
+    """
+    Make the __call__ method of a vectorized step
+
+    :param func:
+        The vectorized step function
+    :param needs_flow:
+        if True then func accepts the flow argument
+    :returns:
+        A function that runs func on a group of one step (and flow).
+    :raises NumPyNotInstalled:
+        If NumPy is not available, vectorized steps cannot be defined then
+    """
+    if numpy is None:
+        raise NumPyNotInstalled
+    if needs_flow:
+        def __call__(step, flow):
+            return unpack_column(func(Columns([step]), Columns([flow])), 1)[0]
+    else:
+        def __call__(step):
+            return unpack_column(func(Columns([step])), 1)[0]
+    return __call__
+
+
+def run_many(flow_cls, records):
+    """
+    Run many instances of a flow together
+
+    :param flow_cls:
+        The flow class to instantiate
+    :param records:
+        An iterable of dictionaries with the initial state of each flow
+    :returns:
+        A list of values returned by each flow (in order of records)
+
+    All flows advance together, a transition at a time. Flows that are about
+    to run the same step form a group. Vectorized steps run once per group,
+    with :class:`Columns` of the flows and steps in the group. All other
+    steps run once per flow, just like they would with the regular engine.
+
+    Each flow reaches the same accepting step and returns the same value as
+    it would if it was run on its own. Only the order in which steps of
+    different flows run is different.
+
+    Flows whose class has limits or a result cache, or is compiled, run one
+    at a time with :meth:`Flow._execute()` instead, so that these settings
+    are honoured. Their vectorized steps run with a group of one flow.
+    """
+    meta = flow_cls.Meta
+    if meta.is_async:
+        raise FlowIsAsynchronous(meta.name)
+    if meta.limits is not None or meta.cache is not None or meta.compiled:
+        return [getattr(flow_cls(**record), 'return') for record in records]
+    flows = [flow_cls(autostart=False, **record) for record in records]
+    results = [None] * len(flows)
+    todo = {}
+    if flows:
+        todo[flow_cls.Meta.initial_id] = list(range(len(flows)))
+    while todo:
+        pending, todo = todo, {}
+        for step_id, members in pending.items():
+            if flow_cls.Meta.step_classes[step_id].Meta.vectorized:
+                routes = _run_vectorized(flows, members, step_id)
+            else:
+                routes = _run_scalar(flows, members, step_id)
+            for index, step, value, route in routes:
+                if route is not None:
+                    if route[1].branches:
+                        # Branches of a fork run to the join step at once
+                        run_fork(flows[index], route[1])
+                    todo.setdefault(route[0], []).append(index)
+                elif step._result.error is None and step.Meta.accepting:
+                    setattr(flows[index], 'return', value)
+                    results[index] = value
+                else:
+                    raise NoArrowCouldHaveBeenFollowed(step)
+    return results
+
+
+def _store_result(step, value, error):
+    result = step._result = step._record
+    result.value = value
+    result.error = error
+
+
+def _run_scalar(flows, members, step_id):
+    table = flows[members[0]].Meta.dispatch[step_id]
+    for index in members:
+        flow = flows[index]
+        step = flow._activate(step_id)
+        step._result = None
+        try:
+            if step.Meta.needs_flow:
+                value = step(flow)
+            else:
+                value = step()
+        except (KeyboardInterrupt, Exception) as exc:
+            _store_result(step, None, exc)
+            yield index, step, None, table.follow_error(exc)
+        else:
+            _store_result(step, value, None)
+            if step.Meta.accepting:
+                yield index, step, value, None
+            else:
+                yield index, step, value, table.follow_value(value)
+
+
+def _run_vectorized(flows, members, step_id):
+    table = flows[members[0]].Meta.dispatch[step_id]
+    group = [flows[index] for index in members]
+    steps = [flow._activate(step_id) for flow in group]
+    step_meta = steps[0].Meta
+    for step in steps:
+        step._result = None
+    try:
+        if step_meta.needs_flow:
+            column = step_meta.vectorized(Columns(steps), Columns(group))
+        else:
+            column = step_meta.vectorized(Columns(steps))
+    except (KeyboardInterrupt, Exception) as exc:
+        route = table.follow_error(exc)
+        for index, step in zip(members, steps):
+            _store_result(step, None, exc)
+            yield index, step, None, route
+        return
+    values = unpack_column(column, len(steps))
+    # Group members by value so that each distinct value is routed once
+    routes = {}
+    for index, step, value in zip(members, steps, values):
+        _store_result(step, value, None)
+        if step_meta.accepting:
+            yield index, step, value, None
+            continue
+        try:
+            route = routes[value]
+        except KeyError:
+            route = routes[value] = table.follow_value(value)
+        except TypeError:
+            route = table.follow_value(value)
+        yield index, step, value, route
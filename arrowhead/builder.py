@@ -0,0 +1,285 @@
+import collections
+import sys
+
+from arrowhead.core import ErrorArrow
+from arrowhead.core import Flow
+from arrowhead.core import ForkArrow
+from arrowhead.core import NormalArrow
+from arrowhead.core import Step
+from arrowhead.core import ValueArrow
+from arrowhead.core import _FlowMeta
+from arrowhead.core import _sorted_arrows
+from arrowhead.decorators import _get_arg_names
+from arrowhead.decorators import _is_coroutine_function
+from arrowhead.errors import DuplicateInitialStep
+from arrowhead.errors import NoInitialStep
+from arrowhead.errors import NoSuchStep
+from arrowhead.errors import UnreachableStep
+
+
+def _do_nothing(step):
+    pass
+
+
+class FlowBuilder:
+    """
+    Builder of flow classes from data
+
+    :ivar name:
+        The name of the flow class
+    :ivar module:
+        The module the flow class claims to be defined in
+
+    Flows with many steps, for example ones generated from configuration
+    tables, are awkward to write as class statements. The builder accepts
+    steps and arrows one at a time or in bulk, as columns of a table, and
+    then builds a regular flow class::
+
+        builder = FlowBuilder('Pipeline')
+        builder.add_steps(names, funcs=funcs, labels=labels)
+        builder.add_arrows(names[:-1], names[1:])
+        builder.set_initial(names[0])
+        builder.add_step('done', accepting=True)
+        builder.add_arrow(names[-1], 'done')
+        Pipeline = builder.build()
+
+    Step functions take the same arguments as functions decorated with
+    :func:`arrowhead.step()` and one function can be used by many steps.
+    Vectorized and memoized steps are not supported.
+
+    The graph is validated in one pass over all the steps and arrows when the
+    flow is built. The same exceptions are raised as for flows defined with
+    class statements.
+    """
+
+    def __init__(self, name, module=None):
+        if module is None:
+            module = sys._getframe(1).f_globals.get('__name__', '__main__')
+        self.name = name
+        self.module = module
+        self._initial = None
+        # Columns of the step table, indexed by step identifier
+        self._step_ids = collections.OrderedDict()
+        self._funcs = []
+        self._labels = []
+        self._accepting = []
+        self._levels = []
+        # Arrows of each step, indexed by step identifier
+        self._arrows = []
+
+    def __repr__(self):
+        return "<{} {} steps:{}>".format(
+            self.__class__.__name__, self.name, len(self._step_ids))
+
+    def add_step(self, name, func=None, label=None, initial=False,
+                 accepting=False, level=None):
+        """
+        Add one step
+
+        :param name:
+            The name of the step
+        :param func:
+            (optional) The step function, by default the step does nothing
+        :param label:
+            (optional) The label of the step, by default the name is used
+        :param initial:
+            if True, this step will be the initial step of the flow
+        :param accepting:
+            if True, this step will be an accepting step
+        :param level:
+            (optional) explicit level number for graph layout
+        :raises ValueError:
+            if a step with the same name was added already
+        """
+        if name in self._step_ids:
+            raise ValueError("step {!a} was added already".format(name))
+        self._step_ids[name] = len(self._step_ids)
+        self._funcs.append(func)
+        self._labels.append(label)
+        self._accepting.append(accepting)
+        self._levels.append(level)
+        self._arrows.append([])
+        if initial:
+            self.set_initial(name)
+
+    def add_steps(self, names, funcs=None, labels=None, accepting=None,
+                  levels=None):
+        """
+        Add many steps
+
+        :param names:
+            An iterable of names of steps
+        :param funcs:
+            (optional) An iterable of step functions
+        :param labels:
+            (optional) An iterable of labels (or None)
+        :param accepting:
+            (optional) An iterable of accepting flags
+        :param levels:
+            (optional) An iterable of explicit levels (or None)
+
+        All the iterables are columns of one table, they should have the
+        same length. The initial step is selected with :meth:`set_initial()`.
+        """
+        names = list(names)
+        count = len(names)
+        for name, func, label, is_accepting, level in zip(
+                names,
+                [None] * count if funcs is None else funcs,
+                [None] * count if labels is None else labels,
+                [False] * count if accepting is None else accepting,
+                [None] * count if levels is None else levels):
+            self.add_step(name, func, label, False, is_accepting, level)
+
+    def set_initial(self, name):
+        """
+        Select the initial step
+
+        :param name:
+            The name of the step
+        :raises DuplicateInitialStep:
+            if another step is initial already
+        """
+        if self._initial is not None and self._initial != name:
+            raise DuplicateInitialStep(self._initial, name)
+        self._initial = name
+
+    def add_arrow(self, source, to, **kwargs):
+        """
+        Add one arrow
+
+        :param source:
+            The name of the step the arrow starts at
+        :param to:
+            The name of the step to go to
+        :param value:
+            (optional) value to associate the arrow with
+        :param error:
+            (optional) error to associate the arrow with
+
+        Arguments have the same meaning as for :func:`arrowhead.arrow()`.
+        """
+        if 'value' in kwargs:
+            arrow = ValueArrow(to, kwargs.pop('value'))
+        elif 'error' in kwargs:
+            arrow = ErrorArrow(to, kwargs.pop('error'))
+        else:
+            arrow = NormalArrow(to)
+        if kwargs:
+            raise TypeError("stray arguments: {!r}".format(kwargs))
+        self._get_arrows(source).append(arrow)
+
+    def add_arrows(self, sources, targets, values=None, errors=None):
+        """
+        Add many arrows
+
+        :param sources:
+            An iterable of names of steps that arrows start at
+        :param targets:
+            An iterable of names of steps that arrows go to
+        :param values:
+            (optional) An iterable of values, all the arrows are value arrows
+        :param errors:
+            (optional) An iterable of errors, all the arrows are error arrows
+
+        All the iterables are columns of one table, they should have the
+        same length. Tables with arrows of different kinds are added with
+        many calls, one for each kind.
+        """
+        if values is not None and errors is not None:
+            raise TypeError("arrows cannot have both values and errors")
+        if values is not None:
+            arrows = [ValueArrow(target, value)
+                      for target, value in zip(targets, values)]
+        elif errors is not None:
+            arrows = [ErrorArrow(target, error)
+                      for target, error in zip(targets, errors)]
+        else:
+            arrows = [NormalArrow(target) for target in targets]
+        for source, arrow in zip(sources, arrows):
+            self._get_arrows(source).append(arrow)
+
+    def add_fork(self, source, branches, join, backend='threads'):
+        """
+        Add one fork arrow
+
+        Arguments have the same meaning as for :func:`arrowhead.arrow.fork()`.
+        """
+        self._get_arrows(source).append(ForkArrow(branches, join, backend))
+
+    def build(self):
+        """
+        Validate the graph and build the flow class
+
+        :returns:
+            A new subclass of :class:`arrowhead.Flow`
+        :raises ProgrammingError:
+            if the graph is not valid
+        """
+        step_ids = self._step_ids
+        initial = self._initial
+        if initial is None:
+            raise NoInitialStep()
+        if initial not in step_ids:
+            raise NoSuchStep(initial)
+        steps = collections.OrderedDict()
+        preds = {}
+        forking = {}
+        needs_flow = {}
+        for name, step_id in step_ids.items():
+            arrows = _sorted_arrows(self._arrows[step_id])
+            _FlowMeta._check_conflicts(arrows)
+            for arrow in arrows:
+                for target in (arrow.target,) + arrow.branches:
+                    if target not in step_ids:
+                        raise NoSuchStep(target)
+                for target in arrow.successors:
+                    preds.setdefault(target, []).append(name)
+            step = steps[name] = self._make_step(
+                name, step_id, arrows, needs_flow)
+            if any(arrow.branches for arrow in arrows):
+                forking[name] = step
+        forks = _FlowMeta._check_forks(steps, step_ids, forking)
+        step_levels = _FlowMeta._assign_levels(steps, initial, {})
+        if len(step_levels) < len(steps):
+            for name, step in steps.items():
+                if name not in step_levels:
+                    raise UnreachableStep(step)
+        dispatch = _FlowMeta._compile_arrows(steps, step_ids)
+        preds = {target: tuple(names) for target, names in preds.items()}
+        graph = (initial, steps, dict(step_ids), step_levels, dispatch,
+                 forks, preds)
+        namespace = collections.OrderedDict(steps)
+        namespace['__module__'] = self.module
+        namespace['__qualname__'] = self.name
+        return _FlowMeta(self.name, (Flow,), namespace, _graph=graph)
+
+    def _get_arrows(self, source):
+        try:
+            return self._arrows[self._step_ids[source]]
+        except KeyError:
+            raise NoSuchStep(source)
+
+    def _make_step(self, name, step_id, arrows, needs_flow):
+        func = self._funcs[step_id]
+        if func is None:
+            func = _do_nothing
+        if func not in needs_flow:
+            needs_flow[func] = 'flow' in _get_arg_names(func)
+        label = self._labels[step_id]
+        return type(name, (Step,), {
+            'name': name,
+            'label': name if label is None else label,
+            'initial': name == self._initial,
+            'accepting': self._accepting[step_id],
+            'arrows': arrows,
+            'needs_flow': needs_flow[func],
+            'level': self._levels[step_id],
+            'vectorized': None,
+            'is_async': _is_coroutine_function(func),
+            'cache': None,
+            '__call__': func,
+            # Steps are pickled by reference, as attributes of their flow
+            '__module__': self.module,
+            '__qualname__': '{}.{}'.format(self.name, name),
+        })
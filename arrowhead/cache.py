@@ -0,0 +1,266 @@
+import collections
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import types
+
+
+class ResultCache:
+    """
+    Bounded cache of pickled results with an optional on-disk tier
+
+    :ivar maxsize:
+        The maximum number of entries kept in memory
+    :ivar directory:
+        The directory of the on-disk tier (or None)
+    :ivar hits:
+        The number of lookups that found an entry (in memory or on disk)
+    :ivar disk_hits:
+        The number of lookups that found an entry on disk only
+    :ivar misses:
+        The number of lookups that didn't find an entry
+    :ivar evictions:
+        The number of entries dropped from memory to respect maxsize
+
+    Entries are kept in memory and dropped in least-recently-used order.
+    With a directory, each entry is also written to a file there so that it
+    survives eviction (and restarts of the program). Entries found on disk
+    are brought back to memory. Both keys and values are bytes, typically
+    pickled objects. Each cache can be shared by many threads.
+    """
+
+    def __init__(self, maxsize=128, directory=None):
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return "<{} hits:{} misses:{} evictions:{}>".format(
+            self.__class__.__name__, self.hits, self.misses, self.evictions)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Look up an entry
+
+        :param key:
+            The key of the entry (bytes)
+        :returns:
+            The value of the entry (bytes) or None
+        """
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return data
+        if self.directory is not None:
+            try:
+                with open(self._get_path(key), 'rb') as stream:
+                    data = stream.read()
+            except FileNotFoundError:
+                pass
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.disk_hits += 1
+                self._store(key, data)
+        return data
+
+    def put(self, key, data):
+        """
+        Add (or replace) an entry
+
+        :param key:
+            The key of the entry (bytes)
+        :param data:
+            The value of the entry (bytes)
+        """
+        if self.directory is not None:
+            path = self._get_path(key)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as stream:
+                stream.write(data)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._store(key, data)
+
+    def clear(self):
+        """
+        Remove all entries (from memory and from disk) and reset counters
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+            if self.directory is not None:
+                for name in os.listdir(self.directory):
+                    if name.endswith('.pickle'):
+                        os.remove(os.path.join(self.directory, name))
+
+    def _store(self, key, data):
+        entries = self._entries
+        entries[key] = data
+        entries.move_to_end(key)
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def _get_path(self, key):
+        return os.path.join(
+            self.directory, hashlib.sha1(key).hexdigest() + '.pickle')
+
+
+_MISSING = object()
+
+
+def make_cache_key(values, namespace=None):
+    """
+    Make a cache key out of a sequence of values
+
+    :param values:
+        A sequence of picklable values
+    :param namespace:
+        (optional) A string that separates these keys from keys of other
+        users of the same cache, see :func:`get_namespace()`
+    :returns:
+        The key (bytes)
+    """
+    return pickle.dumps((namespace, tuple(values)), pickle.HIGHEST_PROTOCOL)
+
+
+def get_namespace(name, funcs):
+    """
+    Get the namespace of cache keys of a step or of a flow
+
+    :param name:
+        The qualified name (``module.qualname``) of the step or flow
+    :param funcs:
+        An iterable of functions whose code determines the cached results
+    :returns:
+        The name followed by a digest of the code of all the functions
+
+    Steps and flows that share a cache (or a cache directory) never see
+    each others' results. Results cached by an older version of the code
+    are not used either.
+    """
+    digest = hashlib.sha1()
+    for func in funcs:
+        func = getattr(func, '__wrapped__', func)
+        code = getattr(func, '__code__', None)
+        if code is not None:
+            _hash_code(code, digest)
+    return '{}:{}'.format(name, digest.hexdigest()[:16])
+
+
+def _hash_code(code, digest):
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode('UTF-8'))
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _hash_code(const, digest)
+        elif isinstance(const, frozenset):
+            # The order of items depends on hash randomization
+            digest.update(repr(sorted(map(repr, const))).encode('UTF-8'))
+        else:
+            digest.update(repr(const).encode('UTF-8'))
+
+
+def make_cached_call(func, needs_flow, names, cache):
+    """
+    Make the __call__ method of a memoized step
+
+    :param func:
+        The step function
+    :param needs_flow:
+        if True then func accepts the flow argument
+    :param names:
+        A sequence with names of flow attributes that form the cache key
+    :param cache:
+        The :class:`ResultCache` to use
+    :returns:
+        A function that calls func only if the cache doesn't have the result
+        already. It always accepts the flow argument.
+
+    The cache stores the return value, the flow attributes that were assigned
+    or deleted by the step function and the state of the step. All of them
+    are restored when the result is found in the cache. Changes made to
+    objects in-place are not detected. Keys are in the namespace of the step
+    function, see :func:`get_namespace()`.
+    """
+    namespace = get_namespace(
+        '{}.{}'.format(func.__module__, func.__qualname__), [func])
+
+    def __call__(step, flow):
+        key = make_cache_key(
+            [getattr(flow, name) for name in names], namespace)
+        data = cache.get(key)
+        if data is not None:
+            value, changes, deleted, step_state = pickle.loads(data)
+            state = flow.__dict__
+            state.update(changes)
+            for name in deleted:
+                state.pop(name, None)
+            step.__dict__.update(step_state)
+            return value
+        before = dict(flow.__dict__)
+        if needs_flow:
+            value = func(step, flow)
+        else:
+            value = func(step)
+        state = flow.__dict__
+        changes = {
+            name: item for name, item in state.items()
+            if before.get(name, _MISSING) is not item}
+        deleted = tuple(name for name in before if name not in state)
+        cache.put(key, pickle.dumps(
+            (value, changes, deleted, step.__dict__),
+            pickle.HIGHEST_PROTOCOL))
+        return value
+    __call__.__wrapped__ = func
+    return __call__
+
+
+def execute_cached(flow, kwargs):
+    """
+    Run a flow unless the cache of the flow class has its final state
+
+    :param flow:
+        A flow that didn't run yet, the flow class has a cache
+    :param kwargs:
+        The initial state of the flow (the cache key)
+
+    The cache stores the final state of the flow, including the special
+    'return' item. Steps don't run (and have no state) when the state is
+    found in the cache. Keys are in the namespace of the flow class and the
+    code of all of its steps, see :func:`get_namespace()`.
+    """
+    cache = flow.Meta.cache
+    flow_cls = type(flow)
+    namespace = flow.Meta._get_derived(
+        'cache_namespace', lambda meta: get_namespace(
+            '{}.{}'.format(flow_cls.__module__, flow_cls.__qualname__),
+            [step.__call__ for step in meta.step_classes]))
+    key = make_cache_key(sorted(kwargs.items()), namespace)
+    data = cache.get(key)
+    if data is not None:
+        flow.__dict__.update(pickle.loads(data))
+        return
+    flow._execute()
+    state = dict(flow.__dict__)
+    del state['_steps']
+    cache.put(key, pickle.dumps(state, pickle.HIGHEST_PROTOCOL))
@@ -1,3 +1,8 @@
+import collections
+
+from arrowhead.errors import NoSuchStep
+
+
 class FlowVisitor:
 
     def visit_Flow(self, flow):
@@ -16,3 +21,389 @@ def explore_flow(flow, visitor):
         visitor.visit_Step(step)
         for arrow in step.Meta.arrows:
             visitor.visit_Arrow(arrow)
+
+
+def get_graph_index(flow):
+    """
+    Get the graph index of a flow
+
+    :param flow:
+        A Flow, instance or class
+    :returns:
+        The :class:`GraphIndex` of the flow class
+
+    The index is built on first use and cached on the Meta class of the flow.
+    """
+    return flow.Meta._get_derived('graph_index', GraphIndex)
+
+
+class GraphIndex:
+    """
+    Index of the graph of a flow, for fast analyses
+
+    :ivar names:
+        A tuple of step names, indexed by step identifier
+    :ivar successors:
+        A tuple of tuples of identifiers of steps that directly follow each
+        step. Fork arrows lead to the first step of each branch and to the
+        join step.
+    :ivar predecessors:
+        A tuple of tuples of identifiers of steps that each step directly
+        follows
+    :ivar initial_id:
+        The identifier of the initial step (or None for empty flows)
+    :ivar accepting_ids:
+        A frozenset of identifiers of accepting steps
+
+    Strongly connected components, the dominator tree and the set of steps
+    that can reach an accepting step are computed on first use. All of the
+    analyses take time linear in the number of steps and arrows (dominators
+    take O(E log V) in the worst case). Queries accept and return step
+    names.
+    """
+
+    def __init__(self, meta):
+        step_ids = meta.step_ids
+        self.names = tuple(step_ids)
+        self.initial_id = meta.initial_id
+        successors = []
+        predecessors = [[] for step_id in range(len(step_ids))]
+        accepting_ids = set()
+        for step_id, step in enumerate(meta.step_classes):
+            if step.Meta.accepting:
+                accepting_ids.add(step_id)
+            targets = []
+            for arrow in step.Meta.arrows:
+                for target in (arrow.target,) + arrow.branches:
+                    target_id = step_ids[target]
+                    if target_id not in targets:
+                        targets.append(target_id)
+                        predecessors[target_id].append(step_id)
+            successors.append(tuple(targets))
+        self.successors = tuple(successors)
+        self.predecessors = tuple(tuple(ids) for ids in predecessors)
+        self.accepting_ids = frozenset(accepting_ids)
+        self._step_ids = step_ids
+        self._components = None
+        self._component_ids = None
+        self._idom = None
+        self._dom_enter = None
+        self._dom_leave = None
+        self._productive = None
+
+    def __repr__(self):
+        return "<{} steps:{}>".format(
+            self.__class__.__name__, len(self.names))
+
+    @property
+    def components(self):
+        """
+        A tuple of strongly connected components
+
+        Each component is a tuple of step names. Components are listed in
+        reverse topological order: arrows lead from each component only to
+        itself and to components listed before it.
+        """
+        if self._components is None:
+            self._find_components()
+        return tuple(
+            tuple(self.names[step_id] for step_id in component)
+            for component in self._components)
+
+    def component_of(self, step_name):
+        """
+        Get the index of the strongly connected component of a step
+
+        :param step_name:
+            The name of the step
+        :returns:
+            Index of the component in :attr:`components`
+        """
+        step_id = self._get_id(step_name)
+        if self._component_ids is None:
+            self._find_components()
+        return self._component_ids[step_id]
+
+    def immediate_dominator(self, step_name):
+        """
+        Get the immediate dominator of a step
+
+        :param step_name:
+            The name of the step
+        :returns:
+            The name of the closest step that is visited before the given
+            step on every path from the initial step. None for the initial
+            step and for steps that cannot be reached.
+        """
+        step_id = self._get_id(step_name)
+        if self._idom is None:
+            self._find_dominator_tree()
+        idom = self._idom[step_id]
+        if idom is None:
+            return None
+        return self.names[idom]
+
+    def dominates(self, step_name, other_name):
+        """
+        Check if every path from the initial step to other_name visits
+        step_name first (each reachable step dominates itself)
+        """
+        step_id = self._get_id(step_name)
+        other_id = self._get_id(other_name)
+        if self._idom is None:
+            self._find_dominator_tree()
+        enter, leave = self._dom_enter, self._dom_leave
+        return (enter[step_id] != -1 and enter[other_id] != -1 and
+                enter[step_id] <= enter[other_id] and
+                leave[other_id] <= leave[step_id])
+
+    def reachable_from(self, step_name):
+        """
+        Get the names of all the steps that can be reached from a step
+
+        :param step_name:
+            The name of the step
+        :returns:
+            A frozenset of names, including step_name itself
+        """
+        seen = _visit(self.successors, [self._get_id(step_name)])
+        return frozenset(self.names[step_id] for step_id in seen)
+
+    def can_reach_accepting(self, step_name):
+        """
+        Check if an accepting step can be reached from a step
+        """
+        step_id = self._get_id(step_name)
+        if self._productive is None:
+            self._productive = frozenset(
+                _visit(self.predecessors, self.accepting_ids))
+        return step_id in self._productive
+
+    def dead_ends(self):
+        """
+        Find steps that are reachable but cannot reach any accepting step
+
+        :returns:
+            A list of step names, in the order of step identifiers
+
+        Flows that enter any of those steps can never finish, they either
+        loop forever (as the flow in ``examples/infinite.py``) or stop at a
+        step that has no arrow to follow.
+        """
+        if self.initial_id is None:
+            return []
+        reachable = _visit(self.successors, [self.initial_id])
+        return [
+            self.names[step_id] for step_id in sorted(reachable)
+            if not self.can_reach_accepting(self.names[step_id])]
+
+    def shortest_path(self, source, target):
+        """
+        Find a path with the smallest number of transitions between steps
+
+        :param source:
+            The name of the first step
+        :param target:
+            The name of the last step
+        :returns:
+            A list of step names, from source to target (inclusive), or None
+            if target cannot be reached from source
+        """
+        source_id = self._get_id(source)
+        target_id = self._get_id(target)
+        parents = {source_id: None}
+        todo = collections.deque([source_id])
+        while todo and target_id not in parents:
+            step_id = todo.popleft()
+            for next_id in self.successors[step_id]:
+                if next_id not in parents:
+                    parents[next_id] = step_id
+                    todo.append(next_id)
+        if target_id not in parents:
+            return None
+        path = []
+        step_id = target_id
+        while step_id is not None:
+            path.append(self.names[step_id])
+            step_id = parents[step_id]
+        path.reverse()
+        return path
+
+    def _get_id(self, step_name):
+        try:
+            return self._step_ids[step_name]
+        except KeyError:
+            raise NoSuchStep(step_name)
+
+    def _find_dominator_tree(self):
+        """
+        Find the dominator tree and number its nodes in depth-first order
+
+        A step dominates another step if the other step is in its subtree,
+        that is if it is entered earlier and left later.
+        """
+        idom = _find_dominators(
+            self.successors, self.predecessors, self.initial_id)
+        count = len(idom)
+        children = [[] for step_id in range(count)]
+        for step_id, parent_id in enumerate(idom):
+            if parent_id is not None:
+                children[parent_id].append(step_id)
+        enter = [-1] * count
+        leave = [-1] * count
+        if self.initial_id is not None:
+            clock = 0
+            work = [(self.initial_id, False)]
+            while work:
+                step_id, done = work.pop()
+                if done:
+                    leave[step_id] = clock
+                else:
+                    enter[step_id] = clock
+                    work.append((step_id, True))
+                    work.extend((child_id, False)
+                                for child_id in children[step_id])
+                clock += 1
+        self._dom_enter = enter
+        self._dom_leave = leave
+        self._idom = idom
+
+    def _find_components(self):
+        """
+        Find strongly connected components with Tarjan's algorithm
+        """
+        successors = self.successors
+        count = len(successors)
+        index = [-1] * count
+        low = [0] * count
+        on_stack = [False] * count
+        stack = []
+        components = []
+        component_ids = [-1] * count
+        counter = 0
+        for start_id in range(count):
+            if index[start_id] != -1:
+                continue
+            index[start_id] = low[start_id] = counter
+            counter += 1
+            stack.append(start_id)
+            on_stack[start_id] = True
+            # The DFS stack of (step_id, position of the next successor)
+            work = [(start_id, 0)]
+            while work:
+                step_id, position = work[-1]
+                if position < len(successors[step_id]):
+                    work[-1] = (step_id, position + 1)
+                    next_id = successors[step_id][position]
+                    if index[next_id] == -1:
+                        index[next_id] = low[next_id] = counter
+                        counter += 1
+                        stack.append(next_id)
+                        on_stack[next_id] = True
+                        work.append((next_id, 0))
+                    elif on_stack[next_id] and index[next_id] < low[step_id]:
+                        low[step_id] = index[next_id]
+                    continue
+                work.pop()
+                if work and low[step_id] < low[work[-1][0]]:
+                    low[work[-1][0]] = low[step_id]
+                if low[step_id] == index[step_id]:
+                    component = []
+                    while True:
+                        member_id = stack.pop()
+                        on_stack[member_id] = False
+                        component_ids[member_id] = len(components)
+                        component.append(member_id)
+                        if member_id == step_id:
+                            break
+                    component.reverse()
+                    components.append(tuple(component))
+        self._components = tuple(components)
+        self._component_ids = tuple(component_ids)
+
+
+def _visit(adjacency, start_ids):
+    """
+    Find all the nodes reachable from the start nodes
+
+    :returns:
+        A set of node identifiers
+    """
+    seen = set(start_ids)
+    todo = list(seen)
+    while todo:
+        for next_id in adjacency[todo.pop()]:
+            if next_id not in seen:
+                seen.add(next_id)
+                todo.append(next_id)
+    return seen
+
+
+def _find_dominators(successors, predecessors, root_id):
+    """
+    Find the immediate dominator of each node with the Lengauer-Tarjan
+    algorithm (with path compression)
+
+    :returns:
+        A list with the identifier of the immediate dominator of each node
+        (or None for the root and for unreachable nodes)
+    """
+    idoms = [None] * len(successors)
+    if root_id is None:
+        return idoms
+    # Number nodes in depth-first order, all arrays below are indexed by
+    # those numbers
+    number = [-1] * len(successors)
+    vertex = []
+    parent = []
+    todo = [(root_id, -1)]
+    while todo:
+        node_id, parent_num = todo.pop()
+        if number[node_id] != -1:
+            continue
+        number[node_id] = len(vertex)
+        vertex.append(node_id)
+        parent.append(parent_num)
+        for next_id in reversed(successors[node_id]):
+            if number[next_id] == -1:
+                todo.append((next_id, number[node_id]))
+    count = len(vertex)
+    semi = list(range(count))
+    label = list(range(count))
+    ancestor = [-1] * count
+    idom = [0] * count
+    bucket = [[] for num in range(count)]
+
+    def evaluate(num):
+        if ancestor[num] == -1:
+            return num
+        path = []
+        while ancestor[ancestor[num]] != -1:
+            path.append(num)
+            num = ancestor[num]
+        for num in reversed(path):
+            up = ancestor[num]
+            if semi[label[up]] < semi[label[num]]:
+                label[num] = label[up]
+            ancestor[num] = ancestor[up]
+        return label[path[0]] if path else label[num]
+
+    for num in range(count - 1, 0, -1):
+        for pred_id in predecessors[vertex[num]]:
+            pred_num = number[pred_id]
+            if pred_num == -1:
+                continue
+            found = evaluate(pred_num)
+            if semi[found] < semi[num]:
+                semi[num] = semi[found]
+        bucket[semi[num]].append(num)
+        ancestor[num] = parent[num]
+        for other in bucket[parent[num]]:
+            found = evaluate(other)
+            idom[other] = found if semi[found] < semi[other] else parent[num]
+        bucket[parent[num]] = []
+    for num in range(1, count):
+        if idom[num] != semi[num]:
+            idom[num] = idom[idom[num]]
+        idoms[vertex[num]] = vertex[idom[num]]
+    return idoms
@@ -0,0 +1,290 @@
+import math
+
+from arrowhead.errors import FlowIsAsynchronous
+from arrowhead.errors import NoArrowCouldHaveBeenFollowed
+from arrowhead.errors import NoInitialStep
+from arrowhead.forks import run_fork
+
+# Types of values that are written as literals in the generated source
+_LITERAL_TYPES = (str, bytes, int, float, bool, type(None))
+
+# Value switches with more values than this use the arrow table instead
+_MAX_INLINE_VALUES = 8
+
+
+class CompiledFlow:
+    """
+    A flow class compiled to one Python function
+
+    :ivar flow_cls:
+        The compiled flow class
+    :ivar source:
+        The generated source code
+    :ivar filename:
+        The file name of the code, as shown in tracebacks
+    :ivar initial_id:
+        Identifier of the first step to run
+    :ivar function:
+        The generated function, ``function(flow, state)`` runs the flow from
+        the step with the identifier ``state`` and returns the value returned
+        by the accepting step
+    """
+
+    def __init__(self, flow_cls, source, filename, initial_id, function):
+        self.flow_cls = flow_cls
+        self.source = source
+        self.filename = filename
+        self.initial_id = initial_id
+        self.function = function
+
+    def __repr__(self):
+        return "<{} {} lines:{}>".format(
+            self.__class__.__name__, self.flow_cls.Meta.name,
+            self.source.count('\n'))
+
+    def run(self, flow):
+        """
+        Run a flow to completion
+
+        :param flow:
+            An instance of the compiled flow class
+        :returns:
+            The value returned by the accepting step
+        """
+        return self.function(flow, self.initial_id)
+
+    def write(self, path):
+        """
+        Write the generated source to a file, for inspection
+        """
+        with open(path, 'wt', encoding='UTF-8') as stream:
+            stream.write(self.source)
+
+
+def compile_flow(flow_cls, path=None):
+    """
+    Compile a flow class to one Python function
+
+    :param flow_cls:
+        A subclass of :class:`arrowhead.Flow`
+    :param path:
+        (optional) The path of a file where the generated source is written
+    :returns:
+        A :class:`CompiledFlow`, the same one for each call with the same
+        class
+    :raises FlowIsAsynchronous:
+        if the flow has asynchronous steps
+
+    The interpreter of :meth:`Flow._execute()` looks up the step, its
+    arrow table and the selected route on each transition. The compiled
+    function keeps the identifier of the current step in a local variable
+    and has the code of every step inlined: a direct call to the step
+    function, an ``isinstance()`` chain for error arrows and an ``if``
+    chain for value arrows. Steps are found by bisection of the step
+    identifier. The optimized graph is compiled for optimized flows, see
+    :mod:`arrowhead.optimizer`.
+
+    Flows created with the ``compiled`` keyword argument of the class
+    statement are compiled when they first run and then always run the
+    compiled function (unless they are observed with hooks or limits)::
+
+        class Hot(Flow, compiled=True):
+            ...
+
+    The compiled function behaves exactly like the interpreter. Each step
+    runs on its step instance and records its outcome. Fork branches run
+    on the interpreter.
+    """
+    compiled = flow_cls.Meta._get_derived(
+        'compiled_flow', lambda meta: _compile(flow_cls))
+    if path is not None:
+        compiled.write(path)
+    return compiled
+
+
+def _compile(flow_cls):
+    import linecache
+    meta = flow_cls.Meta
+    if meta.is_async:
+        raise FlowIsAsynchronous(meta.name)
+    if meta.initial_id is None:
+        raise NoInitialStep()
+    optimized = meta.optimized
+    if optimized is not None:
+        initial_id, dispatch = optimized.initial_id, optimized.dispatch
+    else:
+        initial_id, dispatch = meta.initial_id, meta.dispatch
+    writer = _SourceWriter(meta, dispatch)
+    source = writer.write()
+    filename = '<arrowhead compiled {}.{}>'.format(
+        flow_cls.__module__, flow_cls.__qualname__)
+    # Tracebacks show lines of the generated source
+    linecache.cache[filename] = (
+        len(source), None, source.splitlines(True), filename)
+    namespace = dict(writer.names)
+    exec(compile(source, filename, 'exec'), namespace)
+    return CompiledFlow(
+        flow_cls, source, filename, initial_id, namespace['run'])
+
+
+class _SourceWriter:
+    """
+    Writer of the source code of a compiled flow
+
+    :ivar names:
+        A dictionary of global names used by the generated code
+    """
+
+    def __init__(self, meta, dispatch):
+        self.meta = meta
+        self.dispatch = dispatch
+        self.names = {
+            '_NoArrow': NoArrowCouldHaveBeenFollowed,
+            '_run_fork': run_fork,
+        }
+        self.lines = []
+
+    def write(self):
+        emit = self._emit
+        emit(0, "# Generated by arrowhead.compiler from flow {}".format(
+            self.meta.name))
+        emit(0, "def run(flow, state):")
+        emit(1, "steps = flow._steps")
+        emit(1, "activate = flow._activate")
+        emit(1, "while True:")
+        step_ids = [step_id for step_id, table in enumerate(self.dispatch)
+                    if table is not None]
+        self._write_bisection(step_ids, 2)
+        return '\n'.join(self.lines) + '\n'
+
+    def _emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def _bind(self, prefix, value):
+        """
+        Get a global name of the generated code that refers to a value
+        """
+        name = '_{}{}'.format(prefix, len(self.names))
+        self.names[name] = value
+        return name
+
+    def _literal(self, prefix, value):
+        """
+        Get an expression that evaluates to a given value
+        """
+        if type(value) in _LITERAL_TYPES and not (
+                isinstance(value, float) and not math.isfinite(value)):
+            return repr(value)
+        return self._bind(prefix, value)
+
+    def _write_bisection(self, step_ids, indent):
+        if len(step_ids) == 1:
+            self._write_step(step_ids[0], indent)
+            return
+        middle = len(step_ids) // 2
+        self._emit(indent, "if state < {}:".format(step_ids[middle]))
+        self._write_bisection(step_ids[:middle], indent + 1)
+        self._emit(indent, "else:")
+        self._write_bisection(step_ids[middle:], indent + 1)
+
+    def _write_step(self, step_id, indent):
+        emit = self._emit
+        step_cls = self.meta.step_classes[step_id]
+        table = self.dispatch[step_id]
+        call = self._bind('call', step_cls.__call__)
+        emit(indent, "# step {!a}".format(step_cls.Meta.name))
+        emit(indent, "step = steps[{}]".format(step_id))
+        emit(indent, "if step is None:")
+        emit(indent + 1, "step = activate({})".format(step_id))
+        emit(indent, "step._result = None")
+        emit(indent, "try:")
+        if step_cls.Meta.needs_flow:
+            emit(indent + 1, "value = {}(step, flow)".format(call))
+        else:
+            emit(indent + 1, "value = {}(step)".format(call))
+        emit(indent, "except (KeyboardInterrupt, Exception) as exc:")
+        emit(indent + 1, "result = step._result = step._record")
+        emit(indent + 1, "result.value = None")
+        emit(indent + 1, "result.error = exc")
+        missing = self._write_errors(table, indent + 1)
+        emit(indent, "else:")
+        emit(indent + 1, "result = step._result = step._record")
+        emit(indent + 1, "result.value = value")
+        emit(indent + 1, "result.error = None")
+        if step_cls.Meta.accepting:
+            emit(indent + 1, "setattr(flow, 'return', value)")
+            emit(indent + 1, "return value")
+        else:
+            missing |= self._write_values(table, indent + 1)
+        if missing:
+            emit(indent, "if state == -1:")
+            emit(indent + 1, "raise _NoArrow(step)")
+
+    def _write_route(self, route, indent):
+        if route is None:
+            self._emit(indent, "state = -1")
+            return True
+        target_id, arrow = route
+        self._emit(indent, "# {}".format(str(arrow).replace('\n', ' ')))
+        if arrow.branches:
+            self._emit(indent, "_run_fork(flow, {})".format(
+                self._bind('fork', arrow)))
+        self._emit(indent, "state = {}".format(target_id))
+        return False
+
+    def _write_errors(self, table, indent):
+        """
+        Write the selection of the route taken after an exception
+
+        :returns:
+            True if there may be no route to take
+        """
+        keyword = "if"
+        for route in table.errors:
+            self._emit(indent, "{} isinstance(exc, {}):".format(
+                keyword, self._bind('error', route[1].error)))
+            self._write_route(route, indent + 1)
+            keyword = "elif"
+        if keyword == "elif":
+            self._emit(indent, "else:")
+            indent += 1
+        return self._write_route(None, indent)
+
+    def _write_values(self, table, indent):
+        """
+        Write the selection of the route taken after a value was returned
+
+        :returns:
+            True if there may be no route to take
+        """
+        # Values of the dictionary are compared like dictionary keys, by
+        # identity first
+        routes = [(value, route, True)
+                  for value, route in table.values.items()]
+        routes.extend(
+            (route[1].value, route, False) for route in table.fallback)
+        if len(routes) > _MAX_INLINE_VALUES:
+            # Large switches are looked up in the arrow table
+            self._emit(indent, "route = {}.follow_value(value)".format(
+                self._bind('table', table)))
+            self._emit(indent, "if route is None:")
+            self._emit(indent + 1, "state = -1")
+            self._emit(indent, "else:")
+            self._emit(indent + 1, "if route[1].branches:")
+            self._emit(indent + 2, "_run_fork(flow, route[1])")
+            self._emit(indent + 1, "state = route[0]")
+            return True
+        keyword = "if"
+        for value, route, is_key in routes:
+            literal = self._literal('value', value)
+            if is_key and literal.startswith('_'):
+                test = "{0} is value or {0} == value".format(literal)
+            else:
+                test = "{} == value".format(literal)
+            self._emit(indent, "{} {}:".format(keyword, test))
+            self._write_route(route, indent + 1)
+            keyword = "elif"
+        if keyword == "elif":
+            self._emit(indent, "else:")
+            indent += 1
+        return self._write_route(table.default, indent)
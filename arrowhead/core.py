@@ -1,14 +1,21 @@
 import abc
 import collections
 import sys
+import types
 
 from arrowhead.errors import Bug
 from arrowhead.errors import ConflictingArrow
 from arrowhead.errors import DuplicateInitialStep
+from arrowhead.errors import FlowIsAsynchronous
+from arrowhead.errors import InvalidFork
+from arrowhead.errors import LimitExceeded
 from arrowhead.errors import NoArrowCouldHaveBeenFollowed
 from arrowhead.errors import NoInitialStep
 from arrowhead.errors import NoSuchStep
 from arrowhead.errors import UnreachableStep
+from arrowhead.forks import run_fork
+from arrowhead.forks import run_fork_async
+from arrowhead.hooks import CompiledHooks
 
 
 class StopFlow(Exception):
@@ -25,12 +32,22 @@ class Arrow(metaclass=abc.ABCMeta):
     Base class for other arrows
     """
 
+    # Names of the first steps of concurrent branches (see ForkArrow)
+    branches = ()
+
     def __init__(self, target):
         self.target = target
 
     def __str__(self):
         return "@arrow({!a})".format(self.target)
 
+    @property
+    def successors(self):
+        """
+        names of steps that directly follow this arrow
+        """
+        return (self.target,)
+
     def __repr__(self):
         return "{}({!r})".format(self.__class__.__name__, self.target)
 
@@ -113,33 +130,279 @@ class ErrorArrow(Arrow):
         return isinstance(getattr(step, 'raise'), self.error)
 
 
+class ForkArrow(Arrow):
+    """
+    Arrow that is followed if step.raise doesn't exist. Following this arrow
+    runs several branches of the flow concurrently and continues at the join
+    step (arrow.target) when all of them reach it.
+
+    :ivar branches:
+        A tuple with names of the first step of each branch
+    :ivar target:
+        The name of the join step
+    :ivar backend:
+        The name of the concurrency backend ('threads', 'processes' or
+        'asyncio')
+
+    This arrow should be constructed with
+    ``@arrow.fork('first', 'second', join='target')``
+    """
+
+    # Lowest priority (just like NormalArrow)
+    priority = 2
+
+    backends = ('threads', 'processes', 'asyncio')
+
+    def __init__(self, branches, target, backend='threads'):
+        if backend not in self.backends:
+            raise ValueError("unsupported backend: {!r}".format(backend))
+        super().__init__(target)
+        self.branches = tuple(branches)
+        self.backend = backend
+
+    def __str__(self):
+        return '@arrow.fork({}, join={!a}, backend={!r})'.format(
+            ', '.join(ascii(branch) for branch in self.branches),
+            self.target, self.backend)
+
+    def __repr__(self):
+        return "{}({!r}, {!r}, backend={!r})".format(
+            self.__class__.__name__, self.branches, self.target, self.backend)
+
+    @property
+    def successors(self):
+        return self.branches
+
+    def should_follow(self, step):
+        if hasattr(step, 'raise'):
+            return False
+        return True
+
+
+class ArrowTable:
+    """
+    Precompiled arrow dispatch table of a single step
+
+    :ivar errors:
+        A tuple of routes of :class:`ErrorArrow` in priority order
+    :ivar values:
+        A dictionary mapping hashable values to routes of :class:`ValueArrow`
+    :ivar fallback:
+        A tuple of routes of :class:`ValueArrow` with unhashable values
+    :ivar default:
+        The route of the :class:`NormalArrow` (or :class:`ForkArrow`) or None
+
+    Each route is a tuple (target_id, arrow) where target_id is the integer
+    identifier of the target step, as assigned by :class:`_FlowMeta`.
+
+    Tables are built by :class:`_FlowMeta` when flow classes are created. They
+    select the same arrow as calling :meth:`Arrow.should_follow()` on each
+    (sorted) arrow in turn would but value arrows are found with a single
+    dictionary lookup. Tables must not be modified once they are built.
+    """
+
+    __slots__ = ('errors', 'values', 'fallback', 'default')
+
+    def __init__(self, arrows, step_ids):
+        errors = []
+        fallback = []
+        self.values = {}
+        self.default = None
+        for arrow in arrows:
+            route = (step_ids[arrow.target], arrow)
+            if isinstance(arrow, ErrorArrow):
+                errors.append(route)
+            elif isinstance(arrow, ValueArrow):
+                try:
+                    self.values.setdefault(arrow.value, route)
+                except TypeError:
+                    fallback.append(route)
+            elif isinstance(arrow, (NormalArrow, ForkArrow)):
+                if self.default is None:
+                    self.default = route
+        self.errors = tuple(errors)
+        self.fallback = tuple(fallback)
+
+    def __repr__(self):
+        return (
+            "<{} errors:{!r} values:{!r} fallback:{!r} default:{!r}>".format(
+                self.__class__.__name__, self.errors, self.values,
+                self.fallback, self.default))
+
+    def follow_value(self, value):
+        """
+        Select the route to follow after a step returned a value
+
+        :param value:
+            The value returned by the step
+        :returns:
+            The selected route or None
+        """
+        try:
+            route = self.values.get(value)
+        except TypeError:
+            # Unhashable values can still compare equal to anything
+            for route in self.values.values():
+                if route[1].value == value:
+                    return route
+        else:
+            if route is not None:
+                return route
+        for route in self.fallback:
+            if route[1].value == value:
+                return route
+        return self.default
+
+    def follow_error(self, exc):
+        """
+        Select the route to follow after a step raised an exception
+
+        :param exc:
+            The exception raised by the step
+        :returns:
+            The selected route or None
+        """
+        for route in self.errors:
+            if isinstance(exc, route[1].error):
+                return route
+
+
+class StepResult:
+    """
+    Outcome of the most recent execution of a step
+
+    :ivar value:
+        The value returned by the step function
+    :ivar error:
+        The exception raised by the step function or None
+
+    The outcome is also available as the special 'return' or 'raise' state
+    item of the step, that is, with ``getattr(step, 'return')``. Each step
+    instance owns one record that is updated every time the step runs.
+    """
+
+    __slots__ = ('value', 'error')
+
+    def __init__(self, value=None, error=None):
+        self.value = value
+        self.error = error
+
+    def __repr__(self):
+        if self.error is not None:
+            return "{}(error={!r})".format(
+                self.__class__.__name__, self.error)
+        return "{}({!r})".format(self.__class__.__name__, self.value)
+
+    @property
+    def raised(self):
+        """
+        flag indicating that the step has raised an exception
+        """
+        return self.error is not None
+
+    def as_state_item(self):
+        """
+        Get the special state item ('return' or 'raise') and its value
+        """
+        if self.error is not None:
+            return 'raise', self.error
+        return 'return', self.value
+
+
+def _snapshot(result):
+    # Records are updated in place, observers get a copy they can keep
+    if result is None:
+        return None
+    return StepResult(result.value, result.error)
+
+
+def _sorted_arrows(arrows):
+    """
+    Get a tuple of arrows sorted in order of priority
+    """
+    return tuple(sorted(arrows, key=lambda arrow: arrow.priority))
+
+
+class _ReadOnlyMeta(type):
+    """
+    Metaclass of the Meta classes of steps and flows.
+
+    Meta classes are frozen, with :meth:`_freeze()`, as soon as the flow they
+    belong to is created. Frozen Meta classes cannot be modified. This allows
+    many threads to run flows concurrently without any locking.
+    """
+
+    _frozen = False
+
+    def __setattr__(cls, name, value):
+        if cls._frozen:
+            raise AttributeError(
+                "{} is read-only, cannot set {!a}".format(cls.__name__, name))
+        super().__setattr__(name, value)
+
+    def __delattr__(cls, name):
+        if cls._frozen:
+            raise AttributeError(
+                "{} is read-only, cannot delete {!a}".format(
+                    cls.__name__, name))
+        super().__delattr__(name)
+
+    def _freeze(cls):
+        super().__setattr__('_frozen', True)
+
+    def _get_derived(cls, name, func):
+        """
+        Get a value derived from the meta-data, computing it on first use
+
+        :param name:
+            The name of the attribute that stores the value
+        :param func:
+            A function that computes the value, called with the Meta class
+
+        Derived values, such as the rendered graph of a flow, are stored even
+        if the Meta class is frozen. They may be computed by a few threads
+        at the same time, each computes the same value.
+        """
+        try:
+            return cls.__dict__[name]
+        except KeyError:
+            value = func(cls)
+            super().__setattr__(name, value)
+            return value
+
+
 class _StepMeta(type):
     """
     Metaclass for all step classes.
 
     This metaclass is responsible for storing all the step meta-data inside the
-    new Meta class. This includes step name (name), label (label), a list of
-    arrows (arrows), three flags (initial, accepting, needs_flow) and a
-    numerical value used for displaying graphs (level)
+    new Meta class. This includes step name (name), label (label), a tuple of
+    arrows sorted by priority (arrows), three flags (initial, accepting,
+    needs_flow), a numerical value used for displaying graphs (level), the
+    batch function of vectorized steps (vectorized), a flag that indicates
+    that the step function is a coroutine function (is_async) and the result
+    cache of memoized steps (cache).
 
     The namespace of the newly created step class is actually empty apart
     from the Meta class and the __call__ method which is copied directly
     from the __call__ method of the original namespace.
+
+    The Meta class becomes read-only once the step is used by a flow.
     """
 
     def __new__(mcls, name, bases, namespace, **kwargs):
         metadata = ('name', 'label', 'arrows', 'initial', 'accepting',
-                    'needs_flow', 'level')
+                    'needs_flow', 'level', 'vectorized', 'is_async', 'cache')
         for attr in metadata:
             if attr not in namespace:
                 # This is an internal error, unless someone really
                 # inherits from Step directly
                 raise Bug("Step {!a} doesn't have {!a}".format(
                     name, attr))
+        meta_ns = {attr: namespace[attr] for attr in metadata}
+        meta_ns['arrows'] = _sorted_arrows(meta_ns['arrows'])
         new_ns = {
-            'Meta': type('StepMeta', (object,), {
-                attr: namespace[attr] for attr in metadata
-            }),
+            'Meta': _ReadOnlyMeta('StepMeta', (object,), meta_ns),
         }
         new_ns.update({
             key: value
@@ -163,16 +426,41 @@ class Step(metaclass=_StepMeta):
     """
     name = "step"
     label = "Step"
-    arrows = []
+    arrows = ()
     initial = False
     accepting = False
     needs_flow = False
     level = None
+    vectorized = None
+    is_async = False
+    cache = None
+
+    __slots__ = ('_result', '_record', '__dict__')
+
+    def __init__(self):
+        self._result = None
+        self._record = StepResult()
 
     def __call__(self):
         pass
 
+    def result(self):
+        """
+        Get the outcome of the most recent execution of this step
+
+        :returns:
+            A :class:`StepResult` or None if the step didn't run yet
+        """
+        return self._result
+
     def __getattr__(self, attr):
+        if attr == 'return' or attr == 'raise':
+            result = self._result
+            if result is not None and result.as_state_item()[0] == attr:
+                return result.as_state_item()[1]
+        elif attr == '_result' or attr == '_record':
+            # The slot is empty, this is an uninitialized step
+            return None
         raise AttributeError(
             "the step {!a} doesn't have state item {!a}".format(
                 self.Meta.label, attr))
@@ -185,169 +473,1089 @@ class _FlowMeta(type):
     This metaclass is responsible for collecting steps and determining the
     initial step of a flow. It sets the 'steps' and 'initial' class
     attributes on newly created classes. It also uses an ordered dictionary for
-    class namespace to retain step ordering.
+    class namespace to retain step ordering. The level of each step, used for
+    displaying graphs, is stored in the 'step_levels' class attribute.
+
+    Each step is also given a dense integer identifier. The 'step_ids' class
+    attribute maps step names to identifiers while 'step_classes' is a tuple of
+    step classes indexed by identifier. Arrows of each step are compiled to an
+    :class:`ArrowTable` and stored in the 'dispatch' tuple (also indexed by
+    step identifier). In the flow class namespace each step is replaced by a
+    :class:`_StepAccessor` that finds the step instance in the step table of
+    each flow instance.
+
+    All of the meta-data (of the flow and of each of the steps) is read-only
+    once the flow class is created.
+
+    The optional 'cache' keyword argument of the class statement is stored in
+    the 'cache' class attribute, see :class:`Flow`. The optional 'limits'
+    keyword argument is stored in the 'limits' class attribute, it is
+    inherited from the base flow when not given. So is the optional
+    'optimize' keyword argument, flows created with ``optimize=True`` store
+    their :class:`arrowhead.optimizer.OptimizedGraph` in the 'optimized'
+    class attribute (which is None otherwise), and the optional 'compiled'
+    keyword argument, stored in the 'compiled' class attribute (see
+    :func:`arrowhead.compiler.compile_flow()`). The private '_graph'
+    keyword argument carries the graph of a flow that was validated already,
+    see :class:`arrowhead.builder.FlowBuilder`.
     """
 
-    def __new__(mcls, name, bases, namespace, **kwargs):
-        initial = mcls._find_initial_step(bases, namespace)
-        steps = mcls._find_steps(bases, namespace)
-        mcls._sort_arrows(steps)
-        mcls._check_arrows(steps)
-        if initial is not None:
-            mcls._assign_levels(steps, initial)
-            for step in steps.values():
-                if step.Meta.level is None:
-                    raise UnreachableStep(step)
-        namespace['Meta'] = type('FlowMeta', (object,), {
-            'steps': steps,
+    def __new__(mcls, name, bases, namespace, cache=None, limits=None,
+                optimize=None, compiled=None, _graph=None, **kwargs):
+        if cache is True:
+            from arrowhead.cache import ResultCache
+            cache = ResultCache()
+        flow_bases = [base for base in bases if issubclass(base, Flow)]
+        if len(flow_bases) == 1:
+            if limits is None:
+                limits = flow_bases[0].Meta.limits
+            if optimize is None:
+                optimize = flow_bases[0].Meta.optimize
+            if compiled is None:
+                compiled = flow_bases[0].Meta.compiled
+        if _graph is not None:
+            initial, own_steps = _graph[:2]
+            graph = _graph[1:]
+        else:
+            own_steps = collections.OrderedDict(
+                (k, v) for k, v in namespace.items()
+                if isinstance(v, type) and issubclass(v, Step))
+            initial = mcls._find_initial_step(flow_bases, own_steps)
+            mcls._check_arrows(own_steps, flow_bases)
+            if len(flow_bases) == 1:
+                graph = mcls._derive_graph(
+                    flow_bases[0].Meta, own_steps, initial)
+            else:
+                graph = mcls._build_graph(flow_bases, own_steps, initial)
+        steps, step_ids, step_levels, dispatch, forks, preds = graph
+        step_classes = tuple(steps.values())
+        namespace['Meta'] = _ReadOnlyMeta('FlowMeta', (object,), {
+            'steps': types.MappingProxyType(steps),
+            'own_steps': types.MappingProxyType(own_steps),
             'initial': initial,
-            'levels': max(
-                step.Meta.level for step in steps.values()
-            ) if steps else 0,
+            'levels': max(step_levels.values()) if step_levels else 0,
+            'step_levels': types.MappingProxyType(step_levels),
             'name': name,
+            'step_ids': types.MappingProxyType(step_ids),
+            'step_classes': step_classes,
+            'initial_id': step_ids.get(initial),
+            'dispatch': dispatch,
+            'forks': types.MappingProxyType(forks),
+            'predecessors': types.MappingProxyType(preds),
+            'is_async': mcls._is_async(flow_bases, own_steps, step_classes),
+            'cache': cache,
+            'limits': limits,
+            'optimize': bool(optimize),
+            'optimized': None,
+            'compiled': bool(compiled),
         })
+        # Accessors of inherited steps are inherited as well, unless the
+        # identifiers of steps have changed
+        if len(flow_bases) == 1:
+            accessed = own_steps
+        else:
+            accessed = steps
+        for step_name in accessed:
+            namespace[step_name] = _StepAccessor(
+                step_ids[step_name], steps[step_name])
+        if optimize:
+            from arrowhead.optimizer import optimize_flow
+            namespace['Meta'].optimized = optimize_flow(namespace['Meta'])
+        namespace['Meta']._freeze()
+        for step in own_steps.values():
+            step.Meta._freeze()
         return super().__new__(mcls, name, bases, namespace, **kwargs)
 
-    def _check_arrows(steps):
+    def _is_async(flow_bases, own_steps, step_classes):
+        if len(flow_bases) == 1 and not flow_bases[0].Meta.is_async:
+            steps = own_steps.values()
+        else:
+            steps = step_classes
+        return any(step.Meta.is_async for step in steps)
+
+    def _build_graph(flow_bases, own_steps, initial):
         """
-        Check if all arrows are okay
+        Build the graph of a flow from scratch
+
+        :param flow_bases:
+            A list of base flow classes
+        :param own_steps:
+            A dictionary of steps defined in the flow class itself
+        :param initial:
+            The name of the initial step
+        :returns:
+            A tuple (steps, step_ids, step_levels, dispatch, forks,
+            predecessors)
         """
-        for step in steps.values():
-            # check if targets exist
+        steps = _FlowMeta._find_steps(flow_bases, own_steps)
+        step_ids = {step_name: step_id
+                    for step_id, step_name in enumerate(steps)}
+        forks = _FlowMeta._check_forks(steps, step_ids)
+        preds = _FlowMeta._find_predecessors({}, steps, {}, step_ids)
+        step_levels = {}
+        if initial is not None:
+            step_levels = _FlowMeta._assign_levels(
+                steps, initial,
+                _FlowMeta._find_step_levels(flow_bases, steps))
+            for step_name, step in steps.items():
+                if step_name not in step_levels:
+                    raise UnreachableStep(step)
+        dispatch = _FlowMeta._compile_arrows(steps, step_ids)
+        return steps, step_ids, step_levels, dispatch, forks, preds
+
+    def _derive_graph(base, own_steps, initial):
+        """
+        Derive the graph of a flow from the graph of its only base flow
+
+        :param base:
+            The meta-data of the base flow
+        :param own_steps:
+            A dictionary of steps defined in the flow class itself
+        :param initial:
+            The name of the initial step
+        :returns:
+            The same tuple as :meth:`_build_graph()`
+
+        Inherited steps keep their identifiers, levels, dispatch tables and
+        fork branches. Only the steps that were added or overridden are
+        checked and only they are placed on the graph. The result is
+        identical to what :meth:`_build_graph()` would compute.
+        """
+        steps = collections.OrderedDict(base.steps)
+        steps.update(own_steps)
+        # Steps that are re-assigned in the flow class are not changed
+        changed = collections.OrderedDict(
+            (step_name, step) for step_name, step in own_steps.items()
+            if base.steps.get(step_name) is not step)
+        overridden = {
+            step_name: base.steps[step_name] for step_name in changed
+            if step_name in base.steps}
+        step_ids = dict(base.step_ids)
+        dispatch = list(base.dispatch)
+        for step_name in changed:
+            if step_name not in step_ids:
+                step_ids[step_name] = len(step_ids)
+                dispatch.append(None)
+        for step_name, step in changed.items():
+            dispatch[step_ids[step_name]] = ArrowTable(
+                step.Meta.arrows, step_ids)
+        forks = _FlowMeta._derive_forks(
+            base, steps, changed, step_ids, overridden)
+        preds = _FlowMeta._find_predecessors(
+            base.predecessors, changed, overridden, step_ids)
+        step_levels = {}
+        if initial is not None:
+            step_levels = _FlowMeta._derive_levels(
+                base, steps, changed, step_ids, initial, preds)
+        return steps, step_ids, step_levels, tuple(dispatch), forks, preds
+
+    def _derive_forks(base, steps, changed, step_ids, overridden):
+        """
+        Find the branches of each fork arrow, reusing those of the base flow
+
+        Branches of inherited forks stay the same unless one of the steps in
+        a branch was overridden. In that case all forks are checked again.
+        """
+        forks = dict(base.forks)
+        for step in overridden.values():
+            for arrow in step.Meta.arrows:
+                forks.pop(arrow, None)
+        if forks and overridden:
+            overridden_ids = {step_ids[step_name] for step_name in overridden}
+            for branches in forks.values():
+                for start_id, member_ids in branches:
+                    if not overridden_ids.isdisjoint(member_ids):
+                        return _FlowMeta._check_forks(steps, step_ids)
+        forks.update(_FlowMeta._check_forks(steps, step_ids, changed))
+        return forks
+
+    def _find_predecessors(base_preds, added, removed, step_ids):
+        """
+        Find the predecessors of each step
+
+        :param base_preds:
+            A mapping of predecessors in the base flow (or an empty dict)
+        :param added:
+            A dictionary of steps added to the graph
+        :param removed:
+            A dictionary of steps removed from the graph (and replaced by
+            added steps with the same name)
+        :param step_ids:
+            A dictionary mapping step names to identifiers
+        :returns:
+            A dictionary mapping step names to tuples of names of steps that
+            have arrows leading to them, in the order of steps
+
+        Steps without predecessors are not in the dictionary.
+        """
+        preds = dict(base_preds)
+        targets = set()
+        for step_name, step in removed.items():
             for arrow in step.Meta.arrows:
-                if arrow.target not in steps:
-                    raise NoSuchStep(arrow.target)
-            # check if values are unique
-            values = set()
-            errors = set()
-            normal = False
+                for target in arrow.successors:
+                    preds[target] = tuple(
+                        pred for pred in preds[target] if pred != step_name)
+                    targets.add(target)
+        for step_name, step in added.items():
             for arrow in step.Meta.arrows:
-                if isinstance(arrow, NormalArrow):
-                    if normal:
-                        raise ConflictingArrow(arrow)
-                    normal = True
-                elif isinstance(arrow, ErrorArrow):
-                    if arrow.error in errors:
-                        raise ConflictingArrow(arrow)
-                elif isinstance(arrow, ValueArrow):
+                for target in arrow.successors:
+                    preds[target] = preds.get(target, ()) + (step_name,)
+                    targets.add(target)
+        for target in targets:
+            if preds[target]:
+                preds[target] = tuple(
+                    sorted(preds[target], key=step_ids.__getitem__))
+            else:
+                del preds[target]
+        return preds
+
+    def _derive_levels(base, steps, changed, step_ids, initial, preds):
+        """
+        Compute the level of each step, reusing levels of the base flow
+
+        :param base:
+            The meta-data of the base flow
+        :param steps:
+            A dictionary of all the steps
+        :param changed:
+            A dictionary of steps that were added or overridden
+        :param step_ids:
+            A dictionary mapping step names to identifiers
+        :param initial:
+            The name of the initial step
+        :param preds:
+            A dictionary of predecessors of each step
+        :returns:
+            A dictionary mapping step names to levels
+
+        This gives the same levels as :meth:`_assign_levels()` but only
+        visits the steps that lead to changed steps without a level.
+        """
+        levels = dict(base.step_levels)
+        for step_name, step in changed.items():
+            levels.pop(step_name, None)
+            level = step.Meta.level
+            if level is None and step_name == initial:
+                level = 1
+            if level is not None:
+                levels[step_name] = level
+        pending = sorted(
+            (step_name for step_name in changed if step_name not in levels),
+            key=step_ids.__getitem__)
+        if not pending:
+            return levels
+        # Only steps that already have a level and lead to pending steps can
+        # be the first to reach them (in the order of steps).
+        todo = collections.deque(
+            (pred, levels[pred]) for pred in sorted({
+                pred for step_name in pending
+                for pred in preds.get(step_name, ()) if pred in levels
+            }, key=step_ids.__getitem__))
+        while todo:
+            step_name, level = todo.popleft()
+            levels.setdefault(step_name, level)
+            for arrow in steps[step_name].Meta.arrows:
+                for target in arrow.successors:
+                    if target not in levels:
+                        todo.append((target, level + 1))
+        for step_name in pending:
+            if step_name not in levels:
+                raise UnreachableStep(steps[step_name])
+        return levels
+
+    def _check_arrows(own_steps, flow_bases):
+        """
+        Check if all arrows of steps defined in a flow class are okay
+
+        Steps of base flows were checked when base flows were created. Since
+        steps cannot be removed, targets of their arrows still exist.
+        """
+        for step in own_steps.values():
+            # check if targets exist
+            for arrow in step.Meta.arrows:
+                for target in (arrow.target,) + arrow.branches:
+                    if target not in own_steps and not any(
+                            target in base.Meta.steps for base in flow_bases):
+                        raise NoSuchStep(target)
+            _FlowMeta._check_conflicts(step.Meta.arrows)
+
+    def _check_conflicts(arrows):
+        """
+        Check if arrows of one step are unique
+
+        :param arrows:
+            A sequence of arrows of the step
+        :raises ConflictingArrow:
+            if there is more than one normal (or fork) arrow or more than one
+            arrow with the same value or with the same error
+        """
+        values = set()
+        errors = set()
+        normal = False
+        for arrow in arrows:
+            if isinstance(arrow, (NormalArrow, ForkArrow)):
+                if normal:
+                    raise ConflictingArrow(arrow)
+                normal = True
+            elif isinstance(arrow, ErrorArrow):
+                if arrow.error in errors:
+                    raise ConflictingArrow(arrow)
+                errors.add(arrow.error)
+            elif isinstance(arrow, ValueArrow):
+                try:
                     if arrow.value in values:
                         raise ConflictingArrow(arrow)
+                    values.add(arrow.value)
+                except TypeError:
+                    # unhashable values are compared at runtime
+                    pass
+
+    def _check_forks(steps, step_ids, forking=None):
+        """
+        Check if fork arrows are okay and find the steps of each branch
+
+        :param steps:
+            A dictionary of all the steps
+        :param step_ids:
+            A dictionary mapping step names to identifiers
+        :param forking:
+            (optional) A dictionary of steps with fork arrows to check, all
+            the steps are checked by default
+
+        :returns:
+            A dictionary mapping each :class:`ForkArrow` to a tuple of
+            branches. Each branch is a tuple (start_id, step_ids) where
+            step_ids is a frozenset of identifiers of all the steps that
+            belong to the branch.
+
+        Branches cannot share steps, cannot reach an accepting step and
+        cannot lead back to the step that forks (without passing through the
+        join step first).
+        """
+        forks = {}
+        if forking is None:
+            forking = steps
+        for name, step in forking.items():
+            for arrow in step.Meta.arrows:
+                if not arrow.branches:
+                    continue
+                seen = set()
+                branches = []
+                for start in arrow.branches:
+                    members = set()
+                    todo = [start]
+                    while todo:
+                        member = todo.pop()
+                        if member == arrow.target or member in members:
+                            continue
+                        if member == name:
+                            raise InvalidFork(
+                                arrow, "branch {!a} leads back to {!a}".format(
+                                    start, name))
+                        if steps[member].Meta.accepting:
+                            raise InvalidFork(
+                                arrow, "branch {!a} reaches accepting step"
+                                " {!a}".format(start, member))
+                        if member in seen:
+                            raise InvalidFork(
+                                arrow, "branches share step {!a}".format(
+                                    member))
+                        members.add(member)
+                        for member_arrow in steps[member].Meta.arrows:
+                            todo.extend(member_arrow.successors)
+                    seen.update(members)
+                    branches.append((step_ids[start], frozenset(
+                        step_ids[member] for member in members)))
+                forks[arrow] = tuple(branches)
+        return forks
 
-    def _find_steps(bases, namespace):
+    def _compile_arrows(steps, step_ids):
+        """
+        Build an :class:`ArrowTable` for each step
+        """
+        return tuple(
+            ArrowTable(step.Meta.arrows, step_ids)
+            for step in steps.values())
+
+    def _find_steps(flow_bases, own_steps):
         """
         Build an OrderedDict of all steps
         """
         steps = collections.OrderedDict()
-        for base in bases:
-            if issubclass(base, Flow):
-                steps.update(base.Meta.steps)
-        for k, v in namespace.items():
-            if isinstance(v, type) and issubclass(v, Step):
-                steps[k] = v
+        for base in flow_bases:
+            steps.update(base.Meta.steps)
+        steps.update(own_steps)
         return steps
 
-    def _sort_arrows(steps):
+    def _find_step_levels(flow_bases, steps):
         """
-        Sort arrows in order of priority
+        Build a dictionary of levels of all inherited (and not overridden)
+        steps
         """
-        for step in steps.values():
-            step.Meta.arrows.sort(key=lambda arrow: arrow.priority)
+        levels = {}
+        for base in flow_bases:
+            levels.update(
+                (name, level)
+                for name, level in base.Meta.step_levels.items()
+                if base.Meta.steps[name] is steps[name])
+        return levels
 
-    def _assign_levels(steps, initial):
+    def _assign_levels(steps, initial, base_levels):
+        """
+        Compute the level of each step reachable from the initial step
+
+        :param steps:
+            A dictionary of all the steps
+        :param initial:
+            The name of the initial step
+        :param base_levels:
+            A dictionary of levels computed for base flows
+        :returns:
+            A dictionary mapping step names to levels
+
+        Steps with explicit levels, or levels inherited from base flows, keep
+        their levels. Other steps are placed one level below the step that
+        first reaches them.
+        """
         branch = collections.namedtuple('branch', 'target level')
         todo = collections.deque()
+        existing = collections.OrderedDict(
+            (name, base_levels.get(name, step.Meta.level))
+            for name, step in steps.items())
         # Set initial step to level=1 (if it's not something else already)
-        if steps[initial].Meta.level is None:
-            steps[initial].Meta.level = 1
-        # For all steps with existing levels, add them to the TODO list and
-        # reset level to None
-        for step in steps.values():
-            if step.Meta.level is not None:
-                todo.append(branch(step, step.Meta.level))
-                step.Meta.level = None
+        if existing[initial] is None:
+            existing[initial] = 1
+        # For all steps with existing levels, add them to the TODO list
+        for name, level in existing.items():
+            if level is not None:
+                todo.append(branch(name, level))
         # While there are more steps to do, assign the level and recursively
         # (well, not really because we use the todo list) process all outgoing
         # arrows.
+        levels = {}
         while todo:
-            step, level = todo.popleft()
-            if step.Meta.level is None:
-                step.Meta.level = level
-            for arrow in step.Meta.arrows:
-                next_step = steps[arrow.target]
-                if next_step.Meta.level is None:
-                    todo.append(branch(next_step, level + 1))
+            name, level = todo.popleft()
+            if name not in levels:
+                levels[name] = level
+            for arrow in steps[name].Meta.arrows:
+                for target in arrow.successors:
+                    if target not in levels:
+                        todo.append(branch(target, level + 1))
+        return levels
 
-    def _find_initial_step(bases, namespace):
+    def _find_initial_step(flow_bases, own_steps):
         base_initial = None
         this_initial = None
         seen_steps = False
-        for base in bases:
-            if issubclass(base, Flow):
-                base_initial = base.Meta.initial
-        for k, v in namespace.items():
-            if isinstance(v, type) and issubclass(v, Step):
-                seen_steps = True
-                if v.Meta.initial:
-                    if this_initial is None:
-                        this_initial = k
-                    else:
-                        raise DuplicateInitialStep(k, this_initial)
+        for base in flow_bases:
+            base_initial = base.Meta.initial
+        for k, v in own_steps.items():
+            seen_steps = True
+            if v.Meta.initial:
+                if this_initial is None:
+                    this_initial = k
+                else:
+                    raise DuplicateInitialStep(k, this_initial)
         if this_initial is None:
             this_initial = base_initial
         if this_initial is None and seen_steps:
             raise NoInitialStep()
         return this_initial
 
+    def __init__(cls, name, bases, namespace, cache=None, limits=None,
+                 optimize=None, compiled=None, _graph=None, **kwargs):
+        super().__init__(name, bases, namespace, **kwargs)
+
     def __prepare__(name, bases, **kwargs):
         return collections.OrderedDict()
 
 
+class _StepAccessor:
+    """
+    Descriptor for accessing steps of a flow
+
+    :ivar step_id:
+        Identifier of the step
+    :ivar step_cls:
+        The step class
+
+    Accessed on a flow class it returns the step class. Accessed on a flow
+    instance it returns the step instance from the step table of that flow,
+    instantiating the step if necessary.
+    """
+
+    __slots__ = ('step_id', 'step_cls')
+
+    def __init__(self, step_id, step_cls):
+        self.step_id = step_id
+        self.step_cls = step_cls
+
+    def __get__(self, flow, flow_cls=None):
+        if flow is None:
+            return self.step_cls
+        step = flow._steps[self.step_id]
+        if step is None:
+            step = flow._activate(self.step_id)
+        return step
+
+
 class Flow(metaclass=_FlowMeta):
     """
     A set of connected steps.
+
+    Flows that are often created with the same arguments can cache their
+    final state. The cache is given with the 'cache' keyword argument of the
+    class statement, either as ``True`` or as a
+    :class:`arrowhead.cache.ResultCache`::
+
+        class Scoring(Flow, cache=ResultCache(maxsize=1000)):
+            ...
+
+    Such flows run only if the cache doesn't have the final state for the
+    given arguments already. Otherwise the final state (including the
+    'return' item) is restored without running any steps. Arguments and
+    state of such flows have to be picklable.
+
+    Execution of flows can be observed with hooks, see
+    :class:`arrowhead.hooks.FlowHooks`. Flows that could run for too long
+    can be limited, see :class:`arrowhead.limits.FlowLimits`. Flows with
+    many steps that do nothing can skip them, see
+    :class:`arrowhead.optimizer.OptimizedGraph`. Flows that run very often
+    can be compiled to Python functions, see
+    :func:`arrowhead.compiler.compile_flow()`.
     """
 
+    # Hooks registered with add_class_hooks(), including those of base flows
+    _class_hooks = ()
+
+    # Hooks registered with add_hooks(), limits set with set_limits(), the
+    # enforcement of those limits and the list of instantiated steps (see
+    # _reset()) are not a part of the flow state
+    __slots__ = ('_instance_hooks', '_limits', '_limiter', '_activated',
+                 '__dict__', '__weakref__')
+
     def __init__(self, autostart=True, **kwargs):
         self.__dict__.update(kwargs)
-        # Instantiate all the steps
-        for name, step_cls in self.Meta.steps.items():
-            setattr(self, name, step_cls())
+        self._instance_hooks = ()
+        self._limits = self._limiter = None
+        # Steps are instantiated on first use, see _activate()
+        self._steps = [None] * len(self.Meta.step_classes)
+        self._activated = []
         if autostart:
-            for step in self._run():
+            if self.Meta.cache is None:
+                self._execute()
+            else:
+                from arrowhead.cache import execute_cached
+                execute_cached(self, kwargs)
+
+    def _activate(self, step_id):
+        """
+        Get the instance of a given step, instantiating it if necessary
+        """
+        step = self._steps[step_id]
+        if step is None:
+            step = self._steps[step_id] = self.Meta.step_classes[step_id]()
+            self._activated.append(step)
+        return step
+
+    def _reset(self, kwargs):
+        """
+        Reset the state of this flow so that it can run again
+
+        :param kwargs:
+            The new state of the flow (as passed to the constructor)
+
+        All of the flow state is discarded and replaced with kwargs. Steps that
+        were already instantiated are kept but their state, including the
+        special 'return' and 'raise' items, is discarded as well. Only the
+        steps that were instantiated are visited, not the whole step table.
+        """
+        steps = self._steps
+        self.__dict__.clear()
+        self.__dict__.update(kwargs)
+        self._instance_hooks = ()
+        self._limits = self._limiter = None
+        self._steps = steps
+        for step in self._activated:
+            step.__dict__.clear()
+            step._result = None
+            # Don't keep the old value (or exception) alive
+            record = step._record
+            record.value = record.error = None
+
+    def _execute(self):
+        """
+        Run the flow to completion without any observers
+
+        This is the fast equivalent of exhausting :meth:`_run()`. It doesn't
+        yield anything and stores the outcome of each step directly. Flows
+        with hooks or limits are run by exhausting :meth:`_run()` instead.
+        Compiled flows run their compiled function, see
+        :func:`arrowhead.compiler.compile_flow()`.
+        """
+        if self.Meta.is_async:
+            raise FlowIsAsynchronous(self.Meta.name)
+        if (self._class_hooks or self._instance_hooks or
+                self._limits is not None or self.Meta.limits is not None):
+            for obj in self._run():
                 pass
+            return getattr(self, 'return')
+        if self.Meta.compiled:
+            compiled = self.Meta.__dict__.get('compiled_flow')
+            if compiled is None:
+                from arrowhead.compiler import compile_flow
+                compiled = compile_flow(type(self))
+            return compiled.function(self, compiled.initial_id)
+        optimized = self.Meta.optimized
+        if optimized is not None:
+            return self._execute_from(
+                optimized.initial_id, None, optimized.dispatch)
+        return self._execute_from(self.Meta.initial_id, None)
+
+    def run(self):
+        """
+        Run a flow that was created with ``autostart=False``
+
+        :returns:
+            The value returned by the accepting step
+        """
+        return self._execute()
+
+    def add_hooks(self, hooks):
+        """
+        Add hooks that observe execution of this flow
+
+        :param hooks:
+            A :class:`arrowhead.hooks.FlowHooks` instance
+
+        Hooks of the flow class are called before hooks of the flow.
+        """
+        self._instance_hooks += (hooks,)
+
+    def remove_hooks(self, hooks):
+        """
+        Remove hooks added with :meth:`add_hooks()`
+        """
+        self._instance_hooks = tuple(
+            item for item in self._instance_hooks if item is not hooks)
+
+    @classmethod
+    def add_class_hooks(cls, hooks):
+        """
+        Add hooks that observe execution of all flows of this class
+
+        :param hooks:
+            A :class:`arrowhead.hooks.FlowHooks` instance
+
+        The hooks observe flows of all the subclasses as well. Hooks of base
+        classes are called first.
+        """
+        own = cls.__dict__.get('_own_hooks', ()) + (hooks,)
+        cls._own_hooks = own
+        cls._update_class_hooks()
+
+    @classmethod
+    def remove_class_hooks(cls, hooks):
+        """
+        Remove hooks added with :meth:`add_class_hooks()`
+        """
+        own = tuple(
+            item for item in cls.__dict__.get('_own_hooks', ())
+            if item is not hooks)
+        cls._own_hooks = own
+        cls._update_class_hooks()
+
+    @classmethod
+    def _update_class_hooks(cls):
+        hooks = ()
+        for klass in reversed(cls.__mro__):
+            hooks += klass.__dict__.get('_own_hooks', ())
+        cls._class_hooks = hooks
+        for subclass in cls.__subclasses__():
+            subclass._update_class_hooks()
 
-    def _run(self):
-        active_step_name = self.Meta.initial
+    def _get_hooks(self):
+        """
+        Get the compiled hooks of this flow (or None if there are none)
+        """
+        hooks = self._class_hooks + self._instance_hooks
+        if hooks:
+            return CompiledHooks(hooks)
+
+    def set_limits(self, limits):
+        """
+        Limit the execution of this flow
+
+        :param limits:
+            A :class:`arrowhead.limits.FlowLimits` instance that replaces the
+            limits of the flow class (or None to use them again)
+        """
+        self._limits = limits
+
+    def _start_limiter(self):
+        """
+        Start enforcing the limits of this flow (if it has any)
+        """
+        limits = self._limits
+        if limits is None:
+            limits = self.Meta.limits
+            if limits is None:
+                return
+        from arrowhead.limits import _Limiter
+        self._limiter = _Limiter(self, limits)
+
+    def _stop_limiter(self):
+        if self._limiter is not None:
+            self._limiter.close()
+            self._limiter = None
+
+    def _execute_from(self, step_id, join_id, dispatch=None):
+        """
+        Run the flow from a given step until it finishes or reaches join_id
+
+        The arrow tables of ``Meta.dispatch`` are used unless other tables
+        (of an optimized graph) are given.
+        """
+        steps = self._steps
+        if dispatch is None:
+            dispatch = self.Meta.dispatch
+        while True:
+            step = steps[step_id]
+            if step is None:
+                step = self._activate(step_id)
+            # Reset special internal state
+            step._result = None
+            # Run the step function and find the arrow to follow
+            try:
+                if step.Meta.needs_flow:
+                    value = step(self)
+                else:
+                    value = step()
+            except (KeyboardInterrupt, Exception) as exc:
+                result = step._result = step._record
+                result.value = None
+                result.error = exc
+                route = dispatch[step_id].follow_error(exc)
+            else:
+                result = step._result = step._record
+                result.value = value
+                result.error = None
+                # stop the flow if an accepting step succeeds
+                if step.Meta.accepting:
+                    setattr(self, 'return', value)
+                    return value
+                route = dispatch[step_id].follow_value(value)
+            if route is None:
+                raise NoArrowCouldHaveBeenFollowed(step)
+            if route[1].branches:
+                run_fork(self, route[1])
+            step_id = route[0]
+            if step_id == join_id:
+                return
+
+    async def run_async(self):
+        """
+        Run the flow to completion, awaiting asynchronous steps
+
+        :returns:
+            The value returned by the accepting step
+
+        This is the only way to run flows with ``async def`` steps. Such flows
+        need to be created with ``autostart=False``. Regular steps are simply
+        called, just as they would be by the synchronous engine. Exceptions
+        raised by coroutines are handled exactly like exceptions raised by
+        regular steps. Many flows can run concurrently on one event loop.
+        """
+        if (self._class_hooks or self._instance_hooks or
+                self._limits is not None or self.Meta.limits is not None):
+            async for obj in self._run_async():
+                pass
+            return getattr(self, 'return')
+        optimized = self.Meta.optimized
+        if optimized is not None:
+            return await self._execute_async_from(
+                optimized.initial_id, None, optimized.dispatch)
+        return await self._execute_async_from(self.Meta.initial_id, None)
+
+    async def _execute_async_from(self, step_id, join_id, dispatch=None):
+        """
+        Asynchronous counterpart of :meth:`_execute_from()`
+        """
+        steps = self._steps
+        if dispatch is None:
+            dispatch = self.Meta.dispatch
+        while True:
+            step = steps[step_id]
+            if step is None:
+                step = self._activate(step_id)
+            # Reset special internal state
+            step._result = None
+            # Run (and await) the step function and find the arrow to follow
+            try:
+                if step.Meta.needs_flow:
+                    value = step(self)
+                else:
+                    value = step()
+                if step.Meta.is_async:
+                    value = await value
+            except (KeyboardInterrupt, Exception) as exc:
+                result = step._result = step._record
+                result.value = None
+                result.error = exc
+                route = dispatch[step_id].follow_error(exc)
+            else:
+                result = step._result = step._record
+                result.value = value
+                result.error = None
+                # stop the flow if an accepting step succeeds
+                if step.Meta.accepting:
+                    setattr(self, 'return', value)
+                    return value
+                route = dispatch[step_id].follow_value(value)
+            if route is None:
+                raise NoArrowCouldHaveBeenFollowed(step)
+            if route[1].branches:
+                await run_fork_async(self, route[1])
+            step_id = route[0]
+            if step_id == join_id:
+                return
+
+    def _run(self, journal=None, step_id=None, profiler=None):
+        """
+        Run the flow, yielding each step before it runs and each arrow after
+        it was followed
+
+        :param journal:
+            (optional) :class:`arrowhead.journal.Journal` that records each
+            transition
+        :param step_id:
+            (optional) Identifier of the first step to run, the initial step
+            is used by default
+        :param profiler:
+            (optional) :class:`arrowhead.profiler.FlowProfiler` that runs
+            and times each step
+        """
+        if self.Meta.is_async:
+            raise FlowIsAsynchronous(self.Meta.name)
+        steps = self._steps
+        dispatch = self.Meta.dispatch
+        hooks = self._get_hooks()
+        if step_id is None:
+            step_id = self.Meta.initial_id
+        self._start_limiter()
+        limiter = self._limiter
+        if hooks is not None:
+            for hook in hooks.on_flow_start:
+                hook(self)
         try:
             while True:
-                step = getattr(self, active_step_name)
+                step = steps[step_id]
+                if step is None:
+                    step = self._activate(step_id)
                 yield step
-                arrow = self._run_one_step(step)
+                if hooks is not None:
+                    for hook in hooks.on_step_enter:
+                        hook(self, step)
+                if limiter is not None:
+                    limiter.enter(step)
+                try:
+                    if profiler is None:
+                        next_id, arrow = self._run_one_step(
+                            step, dispatch[step_id])
+                    else:
+                        next_id, arrow = profiler.run_step(
+                            self, step, dispatch[step_id])
+                finally:
+                    if hooks is not None and hooks.on_step_exit:
+                        result = _snapshot(step._result)
+                        for hook in hooks.on_step_exit:
+                            hook(self, step, result)
+                if hooks is not None:
+                    for hook in hooks.on_arrow:
+                        hook(self, step, arrow)
+                if arrow.branches:
+                    run_fork(self, arrow)
+                if journal is not None:
+                    journal.record(self, step_id, arrow, next_id)
+                step_id = next_id
                 yield arrow
-                active_step_name = arrow.target
         except StopFlow:
             setattr(self, 'return', getattr(step, 'return'))
+            if journal is not None:
+                journal.record(self, step_id, None, None)
+            if hooks is not None:
+                for hook in hooks.on_flow_end:
+                    hook(self)
+        finally:
+            self._stop_limiter()
+
+    async def _run_async(self, profiler=None):
+        """
+        Asynchronous counterpart of :meth:`_run()`
 
-    def _run_one_step(self, step):
+        :param profiler:
+            (optional) :class:`arrowhead.profiler.FlowProfiler` that runs
+            and times each step
+        """
+        steps = self._steps
+        dispatch = self.Meta.dispatch
+        hooks = self._get_hooks()
+        step_id = self.Meta.initial_id
+        self._start_limiter()
+        limiter = self._limiter
+        if hooks is not None:
+            for hook in hooks.on_flow_start:
+                hook(self)
+        try:
+            while True:
+                step = steps[step_id]
+                if step is None:
+                    step = self._activate(step_id)
+                yield step
+                if hooks is not None:
+                    for hook in hooks.on_step_enter:
+                        hook(self, step)
+                if limiter is not None:
+                    limiter.enter(step)
+                try:
+                    if profiler is None:
+                        step_id, arrow = await self._run_one_step_async(
+                            step, dispatch[step_id])
+                    else:
+                        step_id, arrow = await profiler.run_step_async(
+                            self, step, dispatch[step_id])
+                finally:
+                    if hooks is not None and hooks.on_step_exit:
+                        result = _snapshot(step._result)
+                        for hook in hooks.on_step_exit:
+                            hook(self, step, result)
+                if hooks is not None:
+                    for hook in hooks.on_arrow:
+                        hook(self, step, arrow)
+                if arrow.branches:
+                    await run_fork_async(self, arrow)
+                yield arrow
+        except StopFlow:
+            setattr(self, 'return', getattr(step, 'return'))
+            if hooks is not None:
+                for hook in hooks.on_flow_end:
+                    hook(self)
+        finally:
+            self._stop_limiter()
+
+    @classmethod
+    def run_journaled(cls, journal_path, sync_every=1, **kwargs):
+        """
+        Run a new instance of this flow, journaling each transition
+
+        :param journal_path:
+            The path of the journal file (any previous content is discarded)
+        :param sync_every:
+            (optional) The number of journal records synced at a time
+        :param kwargs:
+            The initial state of the flow
+        :returns:
+            The flow, after it finished running
+
+        See :class:`arrowhead.journal.Journal` for details.
+        """
+        from arrowhead.journal import run_journaled
+        return run_journaled(cls, journal_path, kwargs, sync_every)
+
+    @classmethod
+    def resume(cls, journal_path, sync_every=1):
+        """
+        Rebuild an instance of this flow from a journal and finish running it
+
+        :param journal_path:
+            The path of the journal file, created by :meth:`run_journaled()`
+        :param sync_every:
+            (optional) The number of journal records synced at a time
+        :returns:
+            The flow, after it finished running
+
+        See :func:`arrowhead.journal.resume()` for details.
+        """
+        from arrowhead.journal import resume
+        return resume(cls, journal_path, sync_every)
+
+    @classmethod
+    def run_many(cls, records):
+        """
+        Run many instances of this flow together
+
+        :param records:
+            An iterable of dictionaries with the initial state of each flow
+        :returns:
+            A list of values returned by each flow (in order of records)
+
+        See :func:`arrowhead.batch.run_many()` for details.
+        """
+        from arrowhead.batch import run_many
+        return run_many(cls, records)
+
+    def _run_one_step(self, step, table):
         # Reset special internal state
-        if hasattr(step, 'return'):
-            delattr(step, 'return')
-        if hasattr(step, 'raise'):
-            delattr(step, 'raise')
-        # Run the step function
+        step._result = None
+        # Run the step function and find the route to follow
         try:
             if step.Meta.needs_flow:
-                setattr(step, 'return', step(self))
+                value = step(self)
             else:
-                setattr(step, 'return', step())
+                value = step()
         except (KeyboardInterrupt, Exception):
-            setattr(step, 'raise', sys.exc_info()[1])
+            return self._follow(step, table, None, sys.exc_info()[1])
         else:
+            return self._follow(step, table, value, None)
+
+    async def _run_one_step_async(self, step, table):
+        # Reset special internal state
+        step._result = None
+        # Run (and await) the step function and find the route to follow
+        try:
+            if step.Meta.needs_flow:
+                value = step(self)
+            else:
+                value = step()
+            if step.Meta.is_async:
+                if self._limiter is None:
+                    value = await value
+                else:
+                    value = await self._limiter.wait_for(step, value)
+        except (KeyboardInterrupt, Exception):
+            return self._follow(step, table, None, sys.exc_info()[1])
+        else:
+            return self._follow(step, table, value, None)
+
+    def _follow(self, step, table, value, exc):
+        """
+        Store the outcome of a step and find the route to follow
+
+        Limits of the flow are checked here, a limit that was exceeded
+        replaces the outcome of the step. A limit that was exceeded again
+        is raised instead.
+        """
+        limiter = self._limiter
+        if limiter is not None and (exc is not None or
+                                    not step.Meta.accepting):
+            error = limiter.check(step, exc)
+            if error is not None:
+                value, exc = None, error
+        result = step._result = step._record
+        result.value = value
+        result.error = exc
+        if exc is not None:
+            if limiter is not None and exc is limiter.final:
+                # A limit was exceeded again, it cannot be routed
+                raise exc
+            route = table.follow_error(exc)
+        elif step.Meta.accepting:
             # stop the flow if an accepting step succeeds
-            if step.Meta.accepting:
-                raise StopFlow
-        # Find the arrow to follow
-        for arrow in step.Meta.arrows:
-            if arrow.should_follow(step):
-                return arrow
-        raise NoArrowCouldHaveBeenFollowed(step)
+            raise StopFlow
+        else:
+            route = table.follow_value(value)
+        if route is None:
+            if isinstance(exc, LimitExceeded):
+                raise exc
+            raise NoArrowCouldHaveBeenFollowed(step)
+        return route
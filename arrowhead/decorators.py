@@ -1,8 +1,8 @@
 import functools
-import inspect
 import types
 
 from arrowhead.core import ErrorArrow
+from arrowhead.core import ForkArrow
 from arrowhead.core import NormalArrow
 from arrowhead.core import Step
 from arrowhead.core import ValueArrow
@@ -63,6 +63,51 @@ def step(func_or_label=None, **kwargs):
             This long description is not a part of the label. Luckily!
             '''
 
+    Steps that process many flows at once can be vectorized. Such steps are
+    called once for a whole group of flows that reached the step together in
+    :meth:`Flow.run_many()`. The step and flow arguments are
+    :class:`arrowhead.batch.Columns` of NumPy arrays and the function must
+    return a sequence of values, one for each flow in the group (or None).
+    Vectorized steps require NumPy::
+
+        @step(vectorized=True)
+        @arrow('big', value=True)
+        @arrow('small', value=False)
+        def is_big(step, flow):
+            flow.size = flow.width * flow.height
+            return flow.size > 100
+
+    Vectorized steps also work with the regular engine, they are just called
+    with a group of one flow. If a vectorized step raises an exception then
+    the exception becomes the outcome of the step for every flow in the group.
+
+    Steps that are pure functions of a few flow attributes can be memoized.
+    The ``cache`` argument lists the flow attributes that form the cache key.
+    When the cache already has the result for those values, the step function
+    is not called. Instead the return value, the flow attributes it assigned
+    (or deleted) and the state of the step are restored and arrows are
+    followed as usual. The cache keeps up to ``cache_size`` results in memory
+    and, if ``cache_dir`` is given, on disk as well. Keys, return values and
+    state have to be picklable::
+
+        @step(cache=('word',), cache_size=10000)
+        @arrow('lookup')
+        def normalize(step, flow):
+            flow.word = flow.word.strip().lower()
+
+    The cache is available as ``Meta.cache`` of the step class, see
+    :class:`arrowhead.cache.ResultCache` for the hit, miss and eviction
+    counters.
+
+    Steps can also be coroutine functions. Flows with such steps have to be
+    executed with ``await flow.run_async()``, which allows many flows that
+    spend most of their time waiting for I/O to share one event loop::
+
+        @step
+        @arrow('parse')
+        async def download(step, flow):
+            flow.page = await fetch(flow.url)
+
     .. note::
         The order of @step and @arrow calls is irrelevant.
     """
@@ -139,11 +184,73 @@ def arrow(to, **kwargs):
         arrow = NormalArrow(target)
     if kwargs:
         raise TypeError("stray arguments: {!r}".format(kwargs))
+    return _attach_arrow(arrow)
+
+
+def fork(*branches, join, backend='threads'):
+    """
+    Decorator for attaching fork arrows that run many branches concurrently.
+
+    :param branches:
+        first step of each branch
+    :param join:
+        step where all the branches meet and where the flow continues
+    :param backend:
+        (optional) one of ``'threads'`` (default), ``'processes'`` or
+        ``'asyncio'``
+
+    The fork arrow is followed just like a normal arrow would be. Each branch
+    runs from its first step until it reaches the join step. When all of the
+    branches have finished the flow continues with the join step::
+
+        @arrow.fork('download_a', 'download_b', join='compare')
+        @step
+        def start(self):
+            pass
+
+        @arrow('compare')
+        @step
+        def download_a(self):
+            self.a = download('a')
+
+        @arrow('compare')
+        @step
+        def download_b(self):
+            self.b = download('b')
+
+    Each branch runs on a shallow copy of the flow. Attributes assigned in a
+    branch are merged back into the flow once all the branches finish. Two
+    branches may not assign different values to the same attribute and
+    objects shared by all the branches should not be modified in-place.
+    Branches cannot share any steps and cannot reach an accepting step.
+
+    The ``'asyncio'`` backend runs branches with ``async def`` steps as tasks
+    of one event loop. Branches that have only ordinary steps run in the
+    default executor of that loop, so that they don't block each other.
+    """
+    arrow = ForkArrow(
+        [_resolve_arrow_target(branch) for branch in branches],
+        _resolve_arrow_target(join), backend)
+    return _attach_arrow(arrow)
+
+
+arrow.fork = fork
+
+
+def _attach_arrow(arrow):
+    """
+    Create a decorator that attaches an arrow to a step or a function
+    """
 
     def decorator(decoratee):
-        if isinstance(decoratee, Step):
+        if (isinstance(decoratee, Step) or (
+                isinstance(decoratee, type) and issubclass(decoratee, Step))):
             step = decoratee
-            step.Meta.arrows.append(arrow)
+            # NOTE: this fails once the step belongs to a flow as the
+            # meta-data of such steps is read-only.
+            step.Meta.arrows = tuple(sorted(
+                step.Meta.arrows + (arrow,),
+                key=lambda arrow: arrow.priority))
         elif isinstance(decoratee, types.FunctionType):
             func = decoratee
             if not hasattr(func, 'arrows'):
@@ -182,7 +289,8 @@ def _resolve_arrow_target(target):
 
 
 def _convert_to_step(func, label=None, initial=None, accepting=False,
-                     level=None):
+                     level=None, vectorized=False, cache=None,
+                     cache_size=128, cache_dir=None):
     """
     Convert a step function to a subclass of :class:`Step`
 
@@ -196,20 +304,95 @@ def _convert_to_step(func, label=None, initial=None, accepting=False,
         if True, this step will be an accepting step
     :param level:
         explicit level number for graph layout
+    :param vectorized:
+        if True, func operates on columns of a group of flows (this
+        requires NumPy)
+    :param cache:
+        names of flow attributes that form the key of the result cache
+    :param cache_size:
+        number of results cached in memory
+    :param cache_dir:
+        directory where results are cached on disk
     """
     if label is None:
         if func.__doc__:
             label = func.__doc__.lstrip().splitlines()[0]
         else:
             label = func.__name__
+    needs_flow = 'flow' in _get_arg_names(func)
+    is_async = _is_coroutine_function(func)
+    if is_async and vectorized:
+        raise TypeError("vectorized steps cannot be asynchronous")
+    if cache is not None:
+        if is_async or vectorized:
+            raise TypeError(
+                "asynchronous and vectorized steps cannot be memoized")
+        if isinstance(cache, str):
+            cache = (cache,)
+        from arrowhead.cache import ResultCache
+        from arrowhead.cache import make_cached_call
+        result_cache = ResultCache(cache_size, cache_dir)
+        call = make_cached_call(func, needs_flow, cache, result_cache)
+    elif vectorized:
+        from arrowhead.batch import make_scalar_call
+        result_cache = None
+        call = make_scalar_call(func, needs_flow)
+    else:
+        result_cache = None
+        call = func
     ns = {
         'name': func.__name__,
         'label': label,
         'initial': initial,
         'accepting': accepting,
         'arrows': func.arrows if hasattr(func, 'arrows') else [],
-        'needs_flow': 'flow' in inspect.getargspec(func)[0],
+        'needs_flow': needs_flow or cache is not None,
         'level': level,
-        '__call__': func,
+        'vectorized': func if vectorized else None,
+        'is_async': is_async,
+        'cache': result_cache,
+        '__call__': call,
+        # Steps are pickled by reference, as attributes of their flow class
+        '__module__': func.__module__,
+        '__qualname__': func.__qualname__,
     }
     return type(func.__name__, (Step,), ns)
+
+
+# Same as inspect.CO_COROUTINE, without importing inspect
+_CO_COROUTINE = 0x0080
+
+
+def _get_arg_names(func):
+    """
+    Get the names of positional arguments of a function
+
+    :param func:
+        the function to inspect
+    :returns:
+        a sequence of argument names
+
+    This is the same as ``inspect.getfullargspec(func).args`` but for plain
+    Python functions the names are read straight from the code object.
+    """
+    try:
+        code = func.__code__
+    except AttributeError:
+        import inspect
+        return inspect.getfullargspec(func).args
+    return code.co_varnames[:code.co_argcount]
+
+
+def _is_coroutine_function(func):
+    """
+    Check if a function is a coroutine function (``async def``)
+
+    This is the same as ``inspect.iscoroutinefunction(func)`` but for plain
+    Python functions only the flags of the code object are checked.
+    """
+    try:
+        code = func.__code__
+    except AttributeError:
+        import inspect
+        return inspect.iscoroutinefunction(func)
+    return bool(code.co_flags & _CO_COROUTINE)
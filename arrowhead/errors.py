@@ -35,6 +35,19 @@ class GraphvizNotInstalled(EnvironmentError):
         ])
 
 
+class NumPyNotInstalled(EnvironmentError):
+    """
+    Exception raised when NumPy is not installed
+    """
+
+    def __str__(self):
+        return '\n'.join([
+            "NumPy could not be found",
+            "It is required by vectorized steps",
+            "You may install it with 'pip install numpy'",
+        ])
+
+
 class NoInitialStep(ProgrammingError):
     """
     Exception raised when a non-empty flow has no initial steps.
@@ -61,6 +74,7 @@ class DuplicateInitialStep(ProgrammingError):
     """
 
     def __init__(self, old_initial, new_initial):
+        super().__init__(old_initial, new_initial)
         self.old_initial = old_initial
         self.new_initial = new_initial
 
@@ -84,6 +98,7 @@ class NoArrowCouldHaveBeenFollowed(ProgrammingError):
     """
 
     def __init__(self, step):
+        super().__init__(step)
         self.step = step
 
     def __str__(self):
@@ -97,10 +112,37 @@ class NoArrowCouldHaveBeenFollowed(ProgrammingError):
             "This is the state of this step right now:"
         ] + ([
             "    {k}: {v!r}".format(k=k, v=v)
-            for k, v in self.step.__dict__.items()
-            if not k.startswith("_")
+            for k, v in self._get_step_state()
         ] or [" (there is no state yet)"]))
 
+    def _get_step_state(self):
+        state = [
+            (k, v) for k, v in self.step.__dict__.items()
+            if not k.startswith("_")]
+        if self.step.result() is not None:
+            state.append(self.step.result().as_state_item())
+        return state
+
+
+class FlowIsAsynchronous(ProgrammingError):
+    """
+    Exception raised when a flow with asynchronous steps is run synchronously
+
+    :ivar flow_name:
+        The name of the flow
+
+    Flows with ``async def`` steps have to be created with ``autostart=False``
+    and then executed with ``await flow.run_async()``.
+    """
+
+    def __init__(self, flow_name):
+        super().__init__(flow_name)
+        self.flow_name = flow_name
+
+    def __str__(self):
+        return "Flow {} has asynchronous steps, use run_async()".format(
+            self.flow_name)
+
 
 class NoSuchStep(ProgrammingError):
     """
@@ -111,6 +153,7 @@ class NoSuchStep(ProgrammingError):
     """
 
     def __init__(self, step_name):
+        super().__init__(step_name)
         self.step_name = step_name
 
     def __str__(self):
@@ -127,12 +170,52 @@ class ConflictingArrow(ProgrammingError):
     """
 
     def __init__(self, arrow):
-        self.arrow
+        super().__init__(arrow)
+        self.arrow = arrow
 
     def __str__(self):
         return "Conflicting arrow detected: {}".format(self.arrow)
 
 
+class InvalidFork(ProgrammingError):
+    """
+    Exception raised when branches of a fork arrow are structured incorrectly
+
+    :ivar arrow:
+        The fork arrow
+    :ivar reason:
+        Description of the problem
+    """
+
+    def __init__(self, arrow, reason):
+        super().__init__(arrow, reason)
+        self.arrow = arrow
+        self.reason = reason
+
+    def __str__(self):
+        return "Invalid fork {}: {}".format(self.arrow, self.reason)
+
+
+class ConflictingBranchState(ProgrammingError):
+    """
+    Exception raised when concurrent branches change the same flow attribute
+
+    :ivar key:
+        The name of the flow attribute
+
+    Branches of a fork may change any number of flow attributes but each
+    attribute should be changed by at most one branch.
+    """
+
+    def __init__(self, key):
+        super().__init__(key)
+        self.key = key
+
+    def __str__(self):
+        return "Flow attribute {!a} was changed by many branches".format(
+            self.key)
+
+
 class UnreachableStep(ProgrammingError):
     """
     Exception raised when an unreachable step is found
@@ -142,8 +225,82 @@ class UnreachableStep(ProgrammingError):
     """
 
     def __init__(self, step):
+        super().__init__(step)
         self.step = step
 
     def __str__(self):
         return "Step {} cannot be reached from the initial step".format(
             self.step.Meta.name)
+
+
+class LimitExceeded(RuntimeError):
+    """
+    Base class of exceptions raised when a flow exceeds one of its limits
+
+    :ivar step:
+        The step that was running (or that had just finished) when the
+        limit was exceeded
+
+    Such exceptions become the outcome of the step, just as if the step had
+    raised them, so they can be routed with error arrows. A transition
+    budget or a deadline that is exceeded for the second time in one run
+    stops the flow instead. See :class:`arrowhead.limits.FlowLimits`.
+
+    Unlike :class:`ProgrammingError` these exceptions don't indicate that
+    the flow was constructed incorrectly.
+    """
+
+    def __init__(self, step, *args):
+        super().__init__(step, *args)
+        self.step = step
+
+
+class TransitionBudgetExceeded(LimitExceeded):
+    """
+    Exception raised when a flow makes more transitions than it may
+
+    :ivar max_transitions:
+        The maximum number of transitions
+    """
+
+    def __init__(self, step, max_transitions):
+        super().__init__(step, max_transitions)
+        self.max_transitions = max_transitions
+
+    def __str__(self):
+        return "Flow exceeded {} transitions after step {!a}".format(
+            self.max_transitions, self.step.Meta.name)
+
+
+class DeadlineExceeded(LimitExceeded):
+    """
+    Exception raised when a flow runs for longer than it may
+
+    :ivar deadline:
+        The maximum run time of the flow, in seconds
+    """
+
+    def __init__(self, step, deadline):
+        super().__init__(step, deadline)
+        self.deadline = deadline
+
+    def __str__(self):
+        return "Flow exceeded its deadline of {}s at step {!a}".format(
+            self.deadline, self.step.Meta.name)
+
+
+class StepTimeout(LimitExceeded):
+    """
+    Exception raised when a step runs for longer than it may
+
+    :ivar timeout:
+        The maximum run time of the step, in seconds
+    """
+
+    def __init__(self, step, timeout):
+        super().__init__(step, timeout)
+        self.timeout = timeout
+
+    def __str__(self):
+        return "Step {!a} exceeded its timeout of {}s".format(
+            self.step.Meta.name, self.timeout)
@@ -0,0 +1,113 @@
+import asyncio
+import concurrent.futures
+
+
+def execute_flow(flow_cls, kwargs):
+    """
+    Run a flow to completion and return the value it returned
+
+    :param flow_cls:
+        The flow class to instantiate
+    :param kwargs:
+        A dictionary with the initial state of the flow
+    :returns:
+        The value returned by the accepting step
+
+    Flows with asynchronous steps are run on a new event loop.
+    """
+    return getattr(execute_flow_state(flow_cls, kwargs), 'return')
+
+
+def execute_flow_state(flow_cls, kwargs):
+    """
+    Run a flow to completion and return the flow itself
+
+    :param flow_cls:
+        The flow class to instantiate
+    :param kwargs:
+        A dictionary with the initial state of the flow
+    :returns:
+        The flow instance, with the final state of the flow and its steps
+
+    Flows with asynchronous steps are run on a new event loop.
+    """
+    if flow_cls.Meta.is_async:
+        flow = flow_cls(autostart=False, **kwargs)
+        asyncio.run(flow.run_async())
+        return flow
+    return flow_cls(**kwargs)
+
+
+def submit_flows(executor, flow_cls, inputs, return_flows=False):
+    """
+    Submit flows for execution to an executor
+
+    :param executor:
+        A :class:`concurrent.futures.Executor`
+    :param flow_cls:
+        The flow class to instantiate
+    :param inputs:
+        An iterable of dictionaries with the initial state of each flow
+    :param return_flows:
+        (optional) if True, futures hold flows rather than returned values
+    :returns:
+        A list of futures (in order of inputs) of values returned by each flow
+        or of the flows themselves.
+    """
+    func = execute_flow_state if return_flows else execute_flow
+    return [executor.submit(func, flow_cls, kwargs) for kwargs in inputs]
+
+
+def run_concurrently(flow_cls, inputs, max_workers=None, return_flows=False):
+    """
+    Run many flows in a pool of threads
+
+    :param flow_cls:
+        The flow class to instantiate
+    :param inputs:
+        An iterable of dictionaries with the initial state of each flow
+    :param max_workers:
+        (optional) the maximum number of threads to use
+    :param return_flows:
+        (optional) if True, return flows rather than returned values
+    :returns:
+        A list of values returned by each flow (in order of inputs)
+    :raises Exception:
+        Any exception that escaped from any of the flows
+
+    Flows don't share any mutable state (the meta-data of flows and steps is
+    read-only) so this is safe as long as the steps themselves are
+    thread-safe. This works best for flows that wait for I/O most of the
+    time.
+    """
+    with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+        futures = submit_flows(executor, flow_cls, inputs, return_flows)
+        return [future.result() for future in futures]
+
+
+def run_in_processes(flow_cls, inputs, max_workers=None, return_flows=False):
+    """
+    Run many flows in a pool of processes
+
+    :param flow_cls:
+        The flow class to instantiate
+    :param inputs:
+        An iterable of dictionaries with the initial state of each flow
+    :param max_workers:
+        (optional) the maximum number of processes to use, defaults to the
+        number of processors
+    :param return_flows:
+        (optional) if True, return flows rather than returned values
+    :returns:
+        A list of values returned by each flow (in order of inputs)
+    :raises Exception:
+        Any exception that escaped from any of the flows
+
+    Only the flow class (by reference), the initial state and the outcome of
+    each flow cross process boundaries so all of those must be picklable. In
+    practice this means that the flow class must be defined at module level.
+    This works best for flows that are CPU-bound.
+    """
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = submit_flows(executor, flow_cls, inputs, return_flows)
+        return [future.result() for future in futures]
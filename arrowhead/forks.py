@@ -0,0 +1,185 @@
+import copy
+
+from arrowhead.errors import ConflictingBranchState
+
+# NOTE: asyncio and concurrent.futures are imported on first use, they are
+# expensive to import and most flows never fork.
+
+
+def run_fork(flow, arrow):
+    """
+    Run all the branches of a fork arrow and merge their state
+
+    :param flow:
+        The flow that follows the arrow
+    :param arrow:
+        The :class:`arrowhead.core.ForkArrow` to follow
+
+    Each branch runs on a shallow copy of the flow, from the first step of
+    the branch until it reaches the join step. The state of all the branches
+    is merged back with :func:`merge_branches()`.
+
+    With the 'asyncio' backend branches that have asynchronous steps run as
+    tasks of one event loop. Branches without any asynchronous steps would
+    block that loop so they run in its default executor (a thread pool)
+    instead.
+    """
+    snapshot, branches, tasks = _prepare_branches(flow, arrow)
+    if arrow.backend == 'asyncio':
+        import asyncio
+        views = asyncio.run(_gather_branches(flow, branches, tasks))
+    else:
+        with _make_executor(arrow.backend, len(tasks)) as executor:
+            futures = [executor.submit(run_branch, *task) for task in tasks]
+            views = [future.result() for future in futures]
+    merge_branches(flow, snapshot, branches, views)
+
+
+async def run_fork_async(flow, arrow):
+    """
+    Asynchronous counterpart of :func:`run_fork()`
+    """
+    import asyncio
+    snapshot, branches, tasks = _prepare_branches(flow, arrow)
+    if arrow.backend == 'asyncio':
+        views = await _gather_branches(flow, branches, tasks)
+    else:
+        loop = asyncio.get_running_loop()
+        with _make_executor(arrow.backend, len(tasks)) as executor:
+            views = await asyncio.gather(*[
+                loop.run_in_executor(executor, run_branch, *task)
+                for task in tasks])
+    merge_branches(flow, snapshot, branches, views)
+
+
+def run_branch(view, start_id, join_id):
+    """
+    Run one branch of a fork
+
+    :param view:
+        A copy of the flow
+    :param start_id:
+        Identifier of the first step of the branch
+    :param join_id:
+        Identifier of the join step
+    :returns:
+        The view, with the state of the branch
+    """
+    if view.Meta.is_async:
+        import asyncio
+        asyncio.run(view._execute_async_from(start_id, join_id))
+    else:
+        view._execute_from(start_id, join_id)
+    return view
+
+
+def merge_branches(flow, snapshot, branches, views):
+    """
+    Merge the state of all branches of a fork back into the flow
+
+    :param flow:
+        The flow that forked
+    :param snapshot:
+        A copy of the flow state from before the fork
+    :param branches:
+        A sequence of branches, as in ``flow.Meta.forks``
+    :param views:
+        A sequence of views, one for each branch, with the state of the
+        branch
+    :raises ConflictingBranchState:
+        If two branches changed the same flow attribute in different ways
+
+    Flow attributes that were assigned (or deleted) in any one branch are
+    assigned (or deleted) in the flow. Attributes that are equal to their
+    value from before the fork are considered unchanged. Steps that belong to
+    each branch (with their state) are copied back to the flow.
+    """
+    changes = {}
+    for view in views:
+        state = view.__dict__
+        for key, value in state.items():
+            if key == '_steps':
+                continue
+            if key in snapshot and _is_unchanged(snapshot[key], value):
+                continue
+            if key in changes and not _is_unchanged(changes[key], value):
+                raise ConflictingBranchState(key)
+            changes[key] = value
+        for key in snapshot:
+            if key not in state:
+                if key in changes and changes[key] is not _DELETED:
+                    raise ConflictingBranchState(key)
+                changes[key] = _DELETED
+    for key, value in changes.items():
+        if value is _DELETED:
+            del flow.__dict__[key]
+        else:
+            flow.__dict__[key] = value
+    for (start_id, step_ids), view in zip(branches, views):
+        for step_id in step_ids:
+            step = view._steps[step_id]
+            if step is not None and step is not flow._steps[step_id]:
+                flow._steps[step_id] = step
+                flow._activated.append(step)
+
+
+_DELETED = object()
+
+
+def _is_unchanged(old, new):
+    if old is new:
+        return True
+    try:
+        return bool(old == new)
+    except Exception:
+        return False
+
+
+def _prepare_branches(flow, arrow):
+    snapshot = dict(flow.__dict__)
+    branches = flow.Meta.forks[arrow]
+    join_id = flow.Meta.step_ids[arrow.target]
+    tasks = [
+        (_make_view(flow), start_id, join_id)
+        for start_id, step_ids in branches]
+    return snapshot, branches, tasks
+
+
+def _make_view(flow):
+    view = copy.copy(flow)
+    view._steps = list(flow._steps)
+    # Steps of the branch are added to the flow by merge_branches()
+    view._activated = []
+    return view
+
+
+def _make_executor(backend, max_workers):
+    import concurrent.futures
+    if backend == 'processes':
+        return concurrent.futures.ProcessPoolExecutor(max_workers)
+    return concurrent.futures.ThreadPoolExecutor(max_workers)
+
+
+async def _gather_branches(flow, branches, tasks):
+    import asyncio
+    loop = asyncio.get_running_loop()
+    step_classes = flow.Meta.step_classes
+    awaitables = []
+    for (start_id, step_ids), task in zip(branches, tasks):
+        if any(step_classes[step_id].Meta.is_async for step_id in step_ids):
+            awaitables.append(_run_branch_async(*task))
+        else:
+            # Synchronous steps would run one branch after another
+            awaitables.append(
+                loop.run_in_executor(None, _run_branch_sync, *task))
+    return await asyncio.gather(*awaitables)
+
+
+def _run_branch_sync(view, start_id, join_id):
+    view._execute_from(start_id, join_id)
+    return view
+
+
+async def _run_branch_async(view, start_id, join_id):
+    await view._execute_async_from(start_id, join_id)
+    return view
@@ -0,0 +1,76 @@
+class FlowHooks:
+    """
+    Base class for hooks that observe execution of flows
+
+    Hooks are registered for all flows of a class (and its subclasses) with
+    :meth:`Flow.add_class_hooks()` or for one flow with
+    :meth:`Flow.add_hooks()`. The engine calls only the methods that were
+    overridden, flows without any hooks run without any overhead::
+
+        class Tracer(FlowHooks):
+
+            def on_step_enter(self, flow, step):
+                print("entering", step.Meta.name)
+
+        MyFlow.add_class_hooks(Tracer())
+
+    Hooks are called by the thread (or the task) that runs the flow. Steps of
+    fork branches and flows run with :meth:`Flow.run_many()` are not
+    observed.
+    """
+
+    def on_flow_start(self, flow):
+        """
+        Called before the first step of a flow runs
+        """
+
+    def on_step_enter(self, flow, step):
+        """
+        Called before a step runs
+        """
+
+    def on_step_exit(self, flow, step, result):
+        """
+        Called after a step runs
+
+        :param result:
+            A new :class:`arrowhead.core.StepResult` with the value returned
+            by the step or with the exception it raised
+
+        The result is a copy of the outcome recorded by the step, it doesn't
+        change when the step runs again and it may be kept by the hook.
+        """
+
+    def on_arrow(self, flow, step, arrow):
+        """
+        Called after an arrow was selected, before it is followed
+        """
+
+    def on_flow_end(self, flow):
+        """
+        Called after the accepting step of a flow succeeds
+        """
+
+
+_EVENTS = ('on_flow_start', 'on_step_enter', 'on_step_exit', 'on_arrow',
+           'on_flow_end')
+
+
+class CompiledHooks:
+    """
+    Hooks of one flow, grouped by event
+
+    Each attribute is named after one of the methods of :class:`FlowHooks`
+    and holds a tuple of bound methods that handle that event. Methods that
+    were not overridden are left out so that unused events cost nothing.
+    """
+
+    __slots__ = _EVENTS
+
+    def __init__(self, hooks):
+        for event in _EVENTS:
+            default = getattr(FlowHooks, event)
+            setattr(self, event, tuple(
+                getattr(hook, event) for hook in hooks
+                if getattr(type(hook), event, default) is not default
+                and hasattr(hook, event)))
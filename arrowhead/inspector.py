@@ -1,9 +1,15 @@
+import collections
+import io
+import itertools
+import reprlib
 import sys
 
 from arrowhead.core import Step
 from arrowhead.core import ErrorArrow
+from arrowhead.core import ForkArrow
 from arrowhead.core import NormalArrow
 from arrowhead.core import ValueArrow
+from arrowhead.errors import GraphvizNotInstalled
 
 
 def print_flow_state(flow, active_step_name=None, file=sys.stdout):
@@ -31,7 +37,7 @@ def print_flow_state(flow, active_step_name=None, file=sys.stdout):
         if f_k.startswith("_"):
             continue
         # steps are handled later
-        if (isinstance(f_v, Step) or
+        if (f_k in flow.Meta.steps or isinstance(f_v, Step) or
                 (isinstance(f_v, type) and issubclass(f_v, Step))):
             continue
         # skip Meta
@@ -65,12 +71,13 @@ def print_flow_state(flow, active_step_name=None, file=sys.stdout):
             indent=indent, flags=rendered_flags, step=step.Meta.label
         ), file=file)
         needs_header = False
-        for s_k, s_v in step.__dict__.items():
-            if s_k.startswith("_"):
-                continue
-            # skip Meta
-            if s_k == 'Meta':
-                continue
+        step_state = [
+            (s_k, s_v) for s_k, s_v in step.__dict__.items()
+            if not s_k.startswith("_") and s_k != 'Meta']
+        # show the outcome of the step
+        if isinstance(step, Step) and step.result() is not None:
+            step_state.append(step.result().as_state_item())
+        for s_k, s_v in step_state:
             if needs_header:
                 print("STATE:", file=file)
                 needs_header = False
@@ -80,6 +87,232 @@ def print_flow_state(flow, active_step_name=None, file=sys.stdout):
     print("." * 40, file=file)
 
 
+# Identical objects of these types cannot change between updates
+_SCALARS = frozenset([type(None), bool, int, float, complex, str, bytes])
+
+# Objects of these types are formatted in constant time, even when large, so
+# they are formatted again to show changes made in place
+_CONTAINERS = frozenset([list, dict, set, collections.deque])
+
+
+class _BoundedRepr(reprlib.Repr):
+    """
+    Repr with size limits that takes constant time for large containers
+
+    Unlike :class:`reprlib.Repr` it doesn't sort dictionaries and sets, it
+    shows their first items instead. Objects of other types (such as data
+    frames or arrays) are shown as their type name and size, their own
+    :func:`repr()` could take a long time.
+    """
+
+    def repr_instance(self, x, level):
+        if type(x) in _SCALARS or isinstance(x, BaseException):
+            return super().repr_instance(x, level)
+        shape = getattr(x, 'shape', None)
+        if isinstance(shape, tuple):
+            return '<{} shape:{}>'.format(type(x).__name__, shape)
+        try:
+            size = len(x)
+        except Exception:
+            return '<{}>'.format(type(x).__name__)
+        return '<{} len:{}>'.format(type(x).__name__, size)
+
+    def repr_dict(self, x, level):
+        if not x:
+            return '{}'
+        if level <= 0:
+            return '{' + self.fillvalue + '}'
+        pieces = [
+            '{}: {}'.format(
+                self.repr1(key, level - 1), self.repr1(value, level - 1))
+            for key, value in itertools.islice(x.items(), self.maxdict)]
+        if len(x) > self.maxdict:
+            pieces.append(self.fillvalue)
+        return '{' + ', '.join(pieces) + '}'
+
+    def repr_set(self, x, level):
+        if not x:
+            return 'set()'
+        return self._repr_iterable(x, level, '{', '}', self.maxset)
+
+    def repr_frozenset(self, x, level):
+        if not x:
+            return 'frozenset()'
+        return self._repr_iterable(
+            x, level, 'frozenset({', '})', self.maxfrozenset)
+
+
+class FlowChangePrinter:
+    """
+    Printer of changes to the state of a running flow
+
+    :ivar max_steps:
+        The number of steps shown in each update. Larger flows are shown as
+        the neighborhood of the active step: its predecessors and the targets
+        of its arrows.
+    :ivar repr:
+        The :class:`reprlib.Repr` instance used to format values. Values of
+        unknown types are shown as their type name and size.
+
+    Unlike :func:`print_flow_state()`, which prints the whole flow each time,
+    :meth:`update()` prints only the state items that have changed since the
+    previous update. Only the state of the flow and of the step that ran last
+    is inspected, so each update takes time proportional to the number of
+    flow state items, not to the number of steps. Values are formatted with
+    size limits so that large containers are cheap to show. Items that are
+    the same object as in the previous update are not formatted again,
+    unless they are lists, dictionaries, sets or deques, which may have been
+    changed in place. Changes made by steps of fork branches are not shown.
+    """
+
+    def __init__(self, file=sys.stdout, max_steps=20, max_repr=80):
+        self.file = file
+        self.max_steps = max_steps
+        self.repr = _BoundedRepr()
+        self.repr.maxstring = self.repr.maxother = max_repr
+        self._flow = None
+        self._active_id = None
+        # Formatted state items of the flow and of each step, by name
+        self._flow_seen = {}
+        self._step_seen = {}
+
+    def __repr__(self):
+        return "<{} max_steps:{}>".format(
+            self.__class__.__name__, self.max_steps)
+
+    def update(self, flow, active_step_name=None):
+        """
+        Print the changes since the previous update
+
+        :param flow:
+            A Flow instance (classes are shown with
+            :func:`print_flow_state()`)
+        :param active_step_name:
+            (optional) name of the active step
+
+        The first update of each flow prints its name and its whole state.
+        """
+        if isinstance(flow, type):
+            print_flow_state(flow, active_step_name, file=self.file)
+            return
+        file = self.file
+        if flow is not self._flow:
+            self._flow = flow
+            self._active_id = None
+            self._flow_seen.clear()
+            self._step_seen.clear()
+            print("[{}]".format(flow.Meta.name).center(40, "~"), file=file)
+        changes = self._diff(_public_items(flow.__dict__), self._flow_seen)
+        if changes:
+            print("STATE:", file=file)
+            for line in changes:
+                print("{}{}".format(" " * 4, line), file=file)
+        step_ids = flow.Meta.step_ids
+        ran_id = self._active_id
+        self._active_id = step_ids.get(active_step_name)
+        ran_name = None
+        if ran_id is not None:
+            ran_name = flow.Meta.step_classes[ran_id].Meta.name
+        print("STEPS:", file=file)
+        shown = self._get_shown(flow, active_step_name, ran_name)
+        for step_name in shown:
+            step_cls = flow.Meta.steps[step_name]
+            flags = []
+            if step_cls.Meta.accepting:
+                flags.append('A')
+            if flow.Meta.initial == step_name:
+                flags.append('I')
+            if flags:
+                rendered_flags = " ({})".format(''.join(flags))
+            else:
+                rendered_flags = ""
+            if step_name == active_step_name:
+                indent = " => "
+            else:
+                indent = "    "
+            print("{indent}{step}{flags:4}".format(
+                indent=indent, flags=rendered_flags,
+                step=step_cls.Meta.label), file=file)
+            if step_name != ran_name:
+                continue
+            step = flow._steps[ran_id]
+            if step is None:
+                continue
+            items = _public_items(step.__dict__)
+            if step.result() is not None:
+                items.append(step.result().as_state_item())
+            seen = self._step_seen.setdefault(step_name, {})
+            for line in self._diff(items, seen):
+                print("{}{}".format(" " * 8, line), file=file)
+        hidden = len(flow.Meta.steps) - len(shown)
+        if hidden:
+            print("    ... ({} more steps)".format(hidden), file=file)
+        print("." * 40, file=file)
+
+    def _get_shown(self, flow, active_step_name, ran_name):
+        """
+        Get the names of steps to show, in the order of definition
+        """
+        meta = flow.Meta
+        if len(meta.steps) <= self.max_steps:
+            return list(meta.steps)
+        names = [ran_name]
+        if active_step_name in meta.steps:
+            names.append(active_step_name)
+            names.extend(meta.predecessors.get(active_step_name, ()))
+            for arrow in meta.steps[active_step_name].Meta.arrows:
+                names.extend(arrow.successors)
+                names.append(arrow.target)
+        elif active_step_name == '_start' and meta.initial is not None:
+            names.append(meta.initial)
+        shown = []
+        for step_name in names:
+            if step_name not in shown and step_name in meta.steps:
+                shown.append(step_name)
+                if len(shown) == self.max_steps:
+                    break
+        return sorted(shown, key=meta.step_ids.__getitem__)
+
+    def _diff(self, items, seen):
+        """
+        Format the state items that have changed since they were last seen
+
+        :param items:
+            A list of (name, value) pairs
+        :param seen:
+            A dictionary mapping names to a tuple (value, formatted value), as
+            they were last printed. This dictionary is updated.
+        :returns:
+            A list of lines to print
+        """
+        lines = []
+        names = set()
+        for key, value in items:
+            names.add(key)
+            old = seen.get(key)
+            if (old is not None and old[0] is value and
+                    type(value) not in _CONTAINERS):
+                continue
+            text = self.repr.repr(value)
+            if old is None or old[1] != text:
+                lines.append("{}: {}".format(key, text))
+            seen[key] = (value, text)
+        if len(seen) > len(names):
+            for key in [key for key in seen if key not in names]:
+                lines.append("{}: (deleted)".format(key))
+                del seen[key]
+        return lines
+
+
+def _public_items(state):
+    """
+    Get a list of state items that are shown to the user
+    """
+    return [
+        (key, value) for key, value in state.items()
+        if not key.startswith("_") and key != 'Meta']
+
+
 def print_dot_graph(flow, active_step_name=None, file=sys.stdout):
     """
     Print the dot(1) description of a given flow.
@@ -90,7 +323,237 @@ def print_dot_graph(flow, active_step_name=None, file=sys.stdout):
         (optional) name of the active step
     :param file:
         (optional) file to print to (defaults to sys.stdout)
+
+    The description is generated once for each flow class, only the
+    highlighting of the active step is added each time.
+    """
+    text, nodes = flow.Meta._get_derived('dot_template', _make_dot_template)
+    if active_step_name in nodes:
+        start, end, highlighted = nodes[active_step_name]
+        text = text[:start] + highlighted + text[end:]
+    file.write(text)
+
+
+def export_json(flow, file=sys.stdout):
+    """
+    Export the graph of a flow as JSON
+
+    :param flow:
+        A Flow, instance or class
+    :param file:
+        (optional) file to write to (defaults to sys.stdout)
+
+    The document is an object with the name of the flow, the name of the
+    initial step, the number of levels and the list of steps. Each step has a
+    name, a label, a level, the initial and accepting flags and the list of
+    arrows. Each arrow has a kind ('normal', 'value', 'error' or 'fork'), a
+    target and, depending on the kind, a value, an error type or a list of
+    branches. Values that are not JSON types are written as their repr().
+
+    The document is written one step at a time, without building it in
+    memory first, so that flows of any size can be exported.
+    """
+    import json
+    meta = flow.Meta
+    file.write('{{"name": {}, "initial": {}, "levels": {}, "steps": ['.format(
+        json.dumps(meta.name), json.dumps(meta.initial), meta.levels))
+    sep = '\n'
+    for name, step in meta.steps.items():
+        file.write(sep)
+        sep = ',\n'
+        json.dump({
+            'name': name,
+            'label': step.Meta.label,
+            'level': meta.step_levels[name],
+            'initial': name == meta.initial,
+            'accepting': step.Meta.accepting,
+            'arrows': [_describe_arrow(arrow) for arrow in step.Meta.arrows],
+        }, file, default=repr)
+    file.write('\n]}\n')
+
+
+def export_graphml(flow, file=sys.stdout):
+    """
+    Export the graph of a flow as GraphML
+
+    :param flow:
+        A Flow, instance or class
+    :param file:
+        (optional) file to write to (defaults to sys.stdout)
+
+    Steps are nodes with the label, level, initial and accepting attributes.
+    Arrows are edges with the kind, value and error attributes (see
+    :func:`export_json()`). Fork arrows are exported as one 'fork' edge to
+    each branch and one 'join' edge to the join step. Values are written as
+    their repr(). Just like :func:`export_json()` the document is written one
+    step at a time.
+    """
+    from xml.sax.saxutils import escape, quoteattr
+    meta = flow.Meta
+    print('<?xml version="1.0" encoding="UTF-8"?>', file=file)
+    print('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">',
+          file=file)
+    for key, domain, attr_type in _GRAPHML_KEYS:
+        print('  <key id="{0}" for="{1}" attr.name="{0}" attr.type="{2}"/>'
+              .format(key, domain, attr_type), file=file)
+    print('  <graph id={} edgedefault="directed">'.format(
+        quoteattr(meta.name)), file=file)
+    for name, step in meta.steps.items():
+        print('    <node id={}>'.format(quoteattr(name)), file=file)
+        for key, value in (
+                ('label', escape(step.Meta.label)),
+                ('level', meta.step_levels[name]),
+                ('initial', str(name == meta.initial).lower()),
+                ('accepting', str(bool(step.Meta.accepting)).lower())):
+            print('      <data key="{}">{}</data>'.format(key, value),
+                  file=file)
+        print('    </node>', file=file)
+        for arrow in step.Meta.arrows:
+            info = _describe_arrow(arrow)
+            edges = [(info['target'], info['kind'])]
+            if info['kind'] == 'fork':
+                edges = [(branch, 'fork') for branch in info['branches']]
+                edges.append((info['target'], 'join'))
+            for target, kind in edges:
+                print('    <edge source={} target={}>'.format(
+                    quoteattr(name), quoteattr(target)), file=file)
+                print('      <data key="kind">{}</data>'.format(kind),
+                      file=file)
+                if 'value' in info:
+                    print('      <data key="value">{}</data>'.format(
+                        escape(repr(info['value']))), file=file)
+                if info.get('error') is not None:
+                    print('      <data key="error">{}</data>'.format(
+                        escape(info['error'])), file=file)
+                print('    </edge>', file=file)
+    print('  </graph>', file=file)
+    print('</graphml>', file=file)
+
+
+_GRAPHML_KEYS = (
+    ('label', 'node', 'string'),
+    ('level', 'node', 'int'),
+    ('initial', 'node', 'boolean'),
+    ('accepting', 'node', 'boolean'),
+    ('kind', 'edge', 'string'),
+    ('value', 'edge', 'string'),
+    ('error', 'edge', 'string'),
+)
+
+
+def _describe_arrow(arrow):
+    """
+    Describe an arrow with a dictionary, as written by :func:`export_json()`
+    """
+    if isinstance(arrow, ForkArrow):
+        return {'kind': 'fork', 'target': arrow.target,
+                'branches': list(arrow.branches)}
+    elif isinstance(arrow, ValueArrow):
+        return {'kind': 'value', 'target': arrow.target,
+                'value': arrow.value}
+    elif isinstance(arrow, ErrorArrow):
+        error = arrow.error
+        if error is not None:
+            if error.__module__ == 'builtins':
+                error = error.__qualname__
+            else:
+                error = '{}.{}'.format(error.__module__, error.__qualname__)
+        return {'kind': 'error', 'target': arrow.target, 'error': error}
+    else:
+        return {'kind': 'normal', 'target': arrow.target}
+
+
+def get_graph_hash(flow):
+    """
+    Get the structural hash of a flow
+
+    :param flow:
+        A Flow, instance or class
+    :returns:
+        A hex digest of the dot(1) description of the flow. It changes when
+        steps, their labels or their arrows change.
+    """
+    return flow.Meta._get_derived('graph_hash', _make_graph_hash)
+
+
+def render_graph(flow, format='svg', active_step_name=None, cache=None):
     """
+    Render the graph of a flow to an image with dot(1)
+
+    :param flow:
+        A Flow, instance or class
+    :param format:
+        (optional) any output format of dot(1), such as 'svg' or 'png'
+    :param active_step_name:
+        (optional) name of the active step
+    :param cache:
+        (optional) a :class:`arrowhead.cache.ResultCache` of rendered images.
+        By default images are cached on disk, in the ``arrowhead/graphs``
+        directory of ``$XDG_CACHE_HOME`` (or of ``~/.cache``).
+    :returns:
+        The rendered image (bytes)
+    :raises GraphvizNotInstalled:
+        If dot(1) is not installed
+
+    Images are cached by the structural hash of the flow (see
+    :func:`get_graph_hash()`) so dot(1) runs only for flows that have
+    changed.
+    """
+    from arrowhead.cache import make_cache_key
+    if cache is None:
+        cache = _get_graph_cache()
+    key = make_cache_key((get_graph_hash(flow), active_step_name, format))
+    data = cache.get(key)
+    if data is None:
+        import subprocess
+        text = io.StringIO()
+        print_dot_graph(flow, active_step_name, file=text)
+        try:
+            data = subprocess.run(
+                ['dot', '-T' + format], input=text.getvalue().encode('UTF-8'),
+                stdout=subprocess.PIPE, check=True).stdout
+        except FileNotFoundError:
+            raise GraphvizNotInstalled
+        cache.put(key, data)
+    return data
+
+
+_graph_cache = None
+
+
+def _get_graph_cache():
+    global _graph_cache
+    if _graph_cache is None:
+        import os
+        from arrowhead.cache import ResultCache
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+            os.path.expanduser('~'), '.cache')
+        _graph_cache = ResultCache(
+            maxsize=16, directory=os.path.join(
+                cache_home, 'arrowhead', 'graphs'))
+    return _graph_cache
+
+
+def _make_graph_hash(meta):
+    import hashlib
+    text, nodes = meta._get_derived('dot_template', _make_dot_template)
+    return hashlib.sha1(text.encode('UTF-8')).hexdigest()
+
+
+def _make_dot_template(meta):
+    """
+    Generate the dot(1) description of a flow, without any active step
+
+    :param meta:
+        The Meta class of a flow
+    :returns:
+        A tuple (text, nodes) where nodes maps names of steps (and of the
+        special '_start' and '_end' nodes) to a tuple (start, end, line) with
+        the position of the line that describes the node in text and the
+        replacement line that highlights it.
+    """
+    file = io.StringIO()
+    nodes = {}
     print('digraph {', file=file)
     print('\tnode [shape=box, color=black];', file=file)
     print('\tedge [arrowsize=0.5];', file=file)
@@ -102,45 +565,49 @@ def print_dot_graph(flow, active_step_name=None, file=sys.stdout):
     # represented anywhere in the flow. We
     # just add them for graphviz
     print('\t\t{};'.format(
-        ' -> '.join(str(i) for i in range(flow.Meta.levels + 2))
+        ' -> '.join(str(i) for i in range(meta.levels + 2))
     ), file=file)
     print('\t}', file=file)
     print(file=file)
     # NOTE: levels + 2 as above
-    levels = {i: [] for i in range(flow.Meta.levels + 2)}
+    levels = {i: [] for i in range(meta.levels + 2)}
     levels[0].append('_start')
     # NOTE: levels + 1 is the last element
-    levels[flow.Meta.levels + 1].append('_end')
-    for step in flow.Meta.steps.values():
-        levels[step.Meta.level].append(step.Meta.name)
+    levels[meta.levels + 1].append('_end')
+    for name, step in meta.steps.items():
+        levels[meta.step_levels[name]].append(step.Meta.name)
     for level, steps in sorted(levels.items()):
         print('\t{{ rank=same; {}; {}; }}'.format(
             level, '; '.join(steps)
         ), file=file)
     print(file=file)
-    if active_step_name == '_start':
-        print('\t_start [shape=circle, style=filled,'
-              ' fillcolor=blue, label=""];', file=file)
-    else:
-        print('\t_start [shape=circle, style=filled,'
-              ' fillcolor=black, label=""];', file=file)
-    for step in flow.Meta.steps.values():
+    start = file.tell()
+    print('\t_start [shape=circle, style=filled,'
+          ' fillcolor=black, label=""];', file=file)
+    nodes['_start'] = (start, file.tell(), '\t_start [shape=circle,'
+                       ' style=filled, fillcolor=blue, label=""];\n')
+    for step in meta.steps.values():
         if step.Meta.initial:
             print('\t_start -> {};'.format(step.Meta.name), file=file)
     print(file=file)
-    for step in flow.Meta.steps.values():
-        if active_step_name == step.Meta.name:
-            print('\t{} [shape={}, label="{}", style=filled, fillcolor=blue, fontcolor=white];'.format(
-                step.Meta.name, "box",
-                step.Meta.label.replace('"', '\\"')
-            ), file=file)
-        else:
-            print('\t{} [shape={}, label="{}"];'.format(
-                step.Meta.name, "box",
-                step.Meta.label.replace('"', '\\"')
-            ), file=file)
+    for step in meta.steps.values():
+        label = step.Meta.label.replace('"', '\\"')
+        start = file.tell()
+        print('\t{} [shape={}, label="{}"];'.format(
+            step.Meta.name, "box", label
+        ), file=file)
+        nodes[step.Meta.name] = (start, file.tell(), (
+            '\t{} [shape={}, label="{}", style=filled, fillcolor=blue,'
+            ' fontcolor=white];\n').format(step.Meta.name, "box", label))
         for arrow in step.Meta.arrows:
-            if isinstance(arrow, NormalArrow):
+            if isinstance(arrow, ForkArrow):
+                for branch in arrow.branches:
+                    print('\t{} -> {} [color=blue, style=bold];'.format(
+                        step.Meta.name, branch
+                    ), file=file)
+                print('\t{} -> {} [label="join", color=blue, style=dashed];'
+                      .format(step.Meta.name, arrow.target), file=file)
+            elif isinstance(arrow, NormalArrow):
                 print('\t{} -> {};'.format(
                     step.Meta.name, arrow.target
                 ), file=file)
@@ -153,13 +620,13 @@ def print_dot_graph(flow, active_step_name=None, file=sys.stdout):
                     step.Meta.name, arrow.target, arrow.error.__name__
                 ), file=file)
         print(file=file)
-    if active_step_name == '_end':
-        print('\t_end [shape=doublecircle, style=filled, '
-              'fillcolor=blue, label=""];', file=file)
-    else:
-        print('\t_end [shape=doublecircle, style=filled, '
-              'fillcolor=black, label=""];', file=file)
-    for step in flow.Meta.steps.values():
+    start = file.tell()
+    print('\t_end [shape=doublecircle, style=filled, '
+          'fillcolor=black, label=""];', file=file)
+    nodes['_end'] = (start, file.tell(), '\t_end [shape=doublecircle,'
+                     ' style=filled, fillcolor=blue, label=""];\n')
+    for step in meta.steps.values():
         if step.Meta.accepting:
             print('\t{} -> _end;'.format(step.Meta.name), file=file)
     print("}", file=file)
+    return file.getvalue(), nodes
@@ -0,0 +1,321 @@
+import hashlib
+import os
+import pickle
+import struct
+
+
+# Each record is a pickled tuple, prefixed with its size
+_FRAME = struct.Struct('<I')
+
+# Identical objects of these types cannot change between transitions
+_SCALARS = frozenset([type(None), bool, int, float, complex, str, bytes])
+
+_MAGIC = 'arrowhead-journal-1'
+
+
+class Journal:
+    """
+    Append-only journal of flow transitions
+
+    :ivar path:
+        The path of the journal file
+    :ivar sync_every:
+        The number of records written to disk (and synced) at a time
+
+    The journal starts with the name of the flow and its initial state. Each
+    transition appends a record with the identifier of the step that ran, the
+    arrow that was followed, the identifier of the next step, the outcome of
+    the step and all the changes to the state of the flow and of the step.
+    Only the changes are written, state items that stayed the same are not
+    written again. Immutable items (numbers, strings and tuples of them) are
+    compared by identity. Other items are compared by a digest of their
+    pickled form, so that changes made in place (for example to a list that
+    is appended to) are journaled too.
+
+    Records are buffered and written (and synced) in batches of
+    ``sync_every`` records. Larger batches make journaling cheaper but up to
+    ``sync_every - 1`` of the most recent transitions may be lost in a crash.
+    All records are synced when the journal is closed.
+    """
+
+    def __init__(self, path, sync_every=1):
+        if sync_every < 1:
+            raise ValueError("sync_every must be positive")
+        self.path = path
+        self.sync_every = sync_every
+        self._file = open(path, 'ab')
+        self._pending = 0
+        # State items that are already in the journal, with digests
+        self._flow_seen = {}
+        self._step_seen = {}
+
+    def __repr__(self):
+        return "<{} {!r}>".format(self.__class__.__name__, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def begin(self, flow):
+        """
+        Start a new journal for a given flow
+
+        :param flow:
+            A flow that didn't run yet
+
+        Anything that was written to the journal file before is discarded.
+        """
+        self._file.truncate(0)
+        self._flow_seen.clear()
+        self._step_seen.clear()
+        self._write((_MAGIC, flow.Meta.name))
+        changes, deleted = _diff(flow.__dict__, self._flow_seen)
+        self._write((None, None, flow.Meta.initial_id, changes, deleted, ()))
+
+    def record(self, flow, step_id, arrow, next_id):
+        """
+        Append a record of one transition
+
+        :param flow:
+            The flow that made the transition
+        :param step_id:
+            Identifier of the step that ran
+        :param arrow:
+            The arrow that was followed (or None if the flow has finished)
+        :param next_id:
+            Identifier of the next step (or None if the flow has finished)
+        """
+        step_cls = flow.Meta.step_classes[step_id]
+        if arrow is None:
+            arrow_index = None
+            step_ids = (step_id,)
+        else:
+            arrow_index = step_cls.Meta.arrows.index(arrow)
+            step_ids = (step_id,)
+            if arrow.branches:
+                for start_id, branch_ids in flow.Meta.forks[arrow]:
+                    step_ids += tuple(branch_ids)
+        steps = []
+        for changed_id in step_ids:
+            step = flow._steps[changed_id]
+            if step is None:
+                continue
+            seen = self._step_seen.setdefault(changed_id, {})
+            changes, deleted = _diff(step.__dict__, seen)
+            result = step._result
+            if result is not None:
+                result = pickle.dumps(
+                    (result.value, result.error), pickle.HIGHEST_PROTOCOL)
+            steps.append((changed_id, changes, deleted, result))
+        changes, deleted = _diff(flow.__dict__, self._flow_seen)
+        self._write(
+            (step_id, arrow_index, next_id, changes, deleted, tuple(steps)))
+
+    def replay(self, flow_cls):
+        """
+        Rebuild a flow from the records in the journal
+
+        :param flow_cls:
+            The class of the flow that was journaled
+        :returns:
+            A tuple (flow, step_id) with the rebuilt flow and the identifier
+            of the next step to run (or None if the flow has finished)
+        :raises ValueError:
+            If the journal is empty or belongs to a different flow
+
+        A partially written record at the end of the journal (left behind by
+        a crash) is discarded.
+        """
+        self._flow_seen.clear()
+        self._step_seen.clear()
+        flow = flow_cls(autostart=False)
+        flow_state = {}
+        step_id = None
+        size = 0
+        with open(self.path, 'rb') as stream:
+            records = _read_records(stream)
+            for offset, record in records:
+                if record[0] != _MAGIC or record[1] != flow_cls.Meta.name:
+                    raise ValueError("{!r} is not a journal of {}".format(
+                        self.path, flow_cls.Meta.name))
+                size = offset
+                break
+            else:
+                raise ValueError("{!r} is empty".format(self.path))
+            for offset, record in records:
+                changes, deleted, changed_steps = record[3:]
+                step_id = record[2]
+                _apply(flow_state, self._flow_seen, changes, deleted)
+                for changed_id, changes, deleted, result in changed_steps:
+                    step = flow._activate(changed_id)
+                    _apply(
+                        step.__dict__, self._step_seen.setdefault(
+                            changed_id, {}),
+                        changes, deleted)
+                    if result is not None:
+                        step._record.value, step._record.error = (
+                            pickle.loads(result))
+                        step._result = step._record
+                size = offset
+        # Discard the incomplete record (if any) so that new records follow
+        # the last complete one.
+        self._file.truncate(size)
+        steps = flow._steps
+        flow.__dict__.clear()
+        flow.__dict__.update(flow_state)
+        flow._steps = steps
+        return flow, step_id
+
+    def sync(self):
+        """
+        Write all the buffered records and sync them to disk
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._pending = 0
+
+    def close(self):
+        """
+        Sync and close the journal
+        """
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def _write(self, record):
+        data = pickle.dumps(record, pickle.HIGHEST_PROTOCOL)
+        self._file.write(_FRAME.pack(len(data)))
+        self._file.write(data)
+        self._pending += 1
+        if self._pending >= self.sync_every:
+            self.sync()
+
+
+def run_journaled(flow_cls, journal_path, kwargs, sync_every=1):
+    """
+    Run a flow and journal each transition
+
+    :param flow_cls:
+        The class of the flow to run
+    :param journal_path:
+        The path of the journal file (any previous content is discarded)
+    :param kwargs:
+        The initial state of the flow
+    :param sync_every:
+        The number of records synced at a time, see :class:`Journal`
+    :returns:
+        The flow, after it finished running
+    """
+    flow = flow_cls(autostart=False, **kwargs)
+    with Journal(journal_path, sync_every) as journal:
+        journal.begin(flow)
+        for obj in flow._run(journal):
+            pass
+    return flow
+
+
+def resume(flow_cls, journal_path, sync_every=1):
+    """
+    Rebuild a journaled flow and run it to completion
+
+    :param flow_cls:
+        The class of the flow that was journaled
+    :param journal_path:
+        The path of the journal file
+    :param sync_every:
+        The number of records synced at a time, see :class:`Journal`
+    :returns:
+        The flow, after it finished running
+
+    The flow continues from the step that follows the last journaled
+    transition. New transitions are appended to the same journal. Flows that
+    have already finished are only rebuilt.
+    """
+    with Journal(journal_path, sync_every) as journal:
+        flow, step_id = journal.replay(flow_cls)
+        if step_id is not None:
+            for obj in flow._run(journal, step_id):
+                pass
+    return flow
+
+
+def _diff(state, seen):
+    """
+    Find the changes to state since it was last seen
+
+    :param state:
+        A dictionary with the state of a flow or a step
+    :param seen:
+        A dictionary mapping names to a tuple (value, digest), as they were
+        last written to the journal. The digest is None for immutable values.
+        This dictionary is updated.
+    :returns:
+        A tuple (changes, deleted) with a dictionary of pickled values that
+        have changed and a tuple of names that were deleted
+
+    Immutable values are not pickled unless they were replaced by another
+    object.
+    """
+    changes = {}
+    for key, value in state.items():
+        if key == '_steps':
+            continue
+        old = seen.get(key)
+        immutable = _is_immutable(value)
+        if old is not None and old[0] is value and immutable:
+            continue
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        digest = None if immutable else _digest(data)
+        if old is None or immutable or old[1] != digest:
+            changes[key] = data
+        seen[key] = (value, digest)
+    deleted = ()
+    if len(seen) > len(state) - ('_steps' in state):
+        deleted = tuple(key for key in seen if key not in state)
+        for key in deleted:
+            del seen[key]
+    return changes, deleted
+
+
+def _apply(state, seen, changes, deleted):
+    for key in deleted:
+        state.pop(key, None)
+        seen.pop(key, None)
+    for key, data in changes.items():
+        value = state[key] = pickle.loads(data)
+        seen[key] = (value, None if _is_immutable(value) else _digest(data))
+
+
+def _is_immutable(value):
+    if type(value) in _SCALARS:
+        return True
+    if type(value) in (tuple, frozenset):
+        return all(type(item) in _SCALARS for item in value)
+    return False
+
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _read_records(stream):
+    """
+    Read complete records from a journal
+
+    :returns:
+        A generator of tuples (offset, record) where offset is the position
+        just past the record
+    """
+    offset = 0
+    while True:
+        header = stream.read(_FRAME.size)
+        if len(header) < _FRAME.size:
+            return
+        size, = _FRAME.unpack(header)
+        data = stream.read(size)
+        if len(data) < size:
+            return
+        offset += _FRAME.size + size
+        yield offset, pickle.loads(data)
@@ -0,0 +1,260 @@
+import sys
+import threading
+import time
+
+from arrowhead.errors import DeadlineExceeded
+from arrowhead.errors import StepTimeout
+from arrowhead.errors import TransitionBudgetExceeded
+
+
+class FlowLimits:
+    """
+    Limits that keep flows from running forever
+
+    :ivar max_transitions:
+        The maximum number of transitions (arrows followed) of each run
+    :ivar deadline:
+        The maximum run time of each run, in seconds
+    :ivar step_timeout:
+        The maximum run time of each step, in seconds
+    :ivar step_timeouts:
+        A dictionary mapping step names to their own maximum run time
+
+    Each limit is optional. Limits are given to a flow class with the
+    ``limits`` keyword argument of the class statement (subclasses inherit
+    them) or to one flow with :meth:`Flow.set_limits()`::
+
+        class Worker(Flow, limits=FlowLimits(max_transitions=10000)):
+            ...
+
+        flow = Worker(autostart=False, job=job)
+        flow.set_limits(FlowLimits(deadline=60, step_timeouts={'fetch': 5}))
+        flow.run()
+
+    Exceeding a limit makes the step that was running fail with one of the
+    :class:`arrowhead.errors.LimitExceeded` exceptions, which can be routed
+    with error arrows. The transition budget and the deadline stay in force
+    once they were exceeded. When either is exceeded for the second time in
+    one run the exception stops the flow, error arrows are not followed
+    again. Steps that handle them should lead straight to an accepting step
+    (accepting steps that succeed finish the flow regardless of limits).
+    Step timeouts can be routed every time.
+
+    Steps of regular functions cannot be interrupted, they fail only once
+    they return. Asynchronous steps are cancelled when they run out of time.
+    Use :class:`FlowWatchdog` to find steps that are stuck. Limits are not
+    enforced in branches of fork arrows and in :meth:`Flow.run_many()`.
+    """
+
+    def __init__(self, max_transitions=None, deadline=None, step_timeout=None,
+                 step_timeouts=None):
+        self.max_transitions = max_transitions
+        self.deadline = deadline
+        self.step_timeout = step_timeout
+        self.step_timeouts = dict(step_timeouts or {})
+
+    def __repr__(self):
+        return ("<{} max_transitions:{} deadline:{} step_timeout:{}"
+                " step_timeouts:{!r}>").format(
+            self.__class__.__name__, self.max_transitions, self.deadline,
+            self.step_timeout, self.step_timeouts)
+
+
+# Limiters of all the flows that are running right now, see FlowWatchdog
+_active = set()
+_active_lock = threading.Lock()
+
+
+class _Limiter:
+    """
+    Enforcement of the limits of one run of a flow
+
+    The engine calls :meth:`enter()` before each step runs and
+    :meth:`check()` after it finishes, through :meth:`Flow._follow()`.
+    """
+
+    def __init__(self, flow, limits):
+        self.flow = flow
+        self.limits = limits
+        self.thread_id = threading.get_ident()
+        self.transitions = 0
+        self.max_transitions = limits.max_transitions
+        self.start = time.monotonic()
+        self.deadline_at = None
+        # Limits that were exceeded already and the exception that has to
+        # stop the flow (it must not be routed with error arrows)
+        self.exceeded = set()
+        self.final = None
+        if limits.deadline is not None:
+            self.deadline_at = self.start + limits.deadline
+        self.step = None
+        self.step_start = None
+        self.timeout = None
+        # The step run already reported by the watchdog
+        self.reported = None
+        with _active_lock:
+            _active.add(self)
+
+    def close(self):
+        with _active_lock:
+            _active.discard(self)
+
+    def enter(self, step):
+        """
+        Note that a step is about to run
+        """
+        self.timeout = self.limits.step_timeouts.get(
+            step.Meta.name, self.limits.step_timeout)
+        self.step_start = time.monotonic()
+        self.step = step
+
+    def check(self, step, exc):
+        """
+        Check the limits after a step finished
+
+        :param step:
+            The step that has finished
+        :param exc:
+            The exception raised by the step (or None)
+        :returns:
+            The exception that becomes the outcome of the step instead (or
+            None if no limit was exceeded)
+        """
+        now = time.monotonic()
+        self.transitions += 1
+        if isinstance(exc, (StepTimeout, DeadlineExceeded)):
+            # Raised by wait_for(), the limit is enforced already
+            return None
+        if (self.timeout is not None and
+                now - self.step_start > self.timeout):
+            return StepTimeout(step, self.timeout)
+        if (self.max_transitions is not None and
+                self.transitions > self.max_transitions):
+            return self._exceed('transitions', TransitionBudgetExceeded(
+                step, self.max_transitions))
+        if self.deadline_at is not None and now > self.deadline_at:
+            return self._exceed('deadline', DeadlineExceeded(
+                step, self.limits.deadline))
+        return None
+
+    def _exceed(self, limit, error):
+        if limit in self.exceeded:
+            self.final = error
+        self.exceeded.add(limit)
+        return error
+
+    async def wait_for(self, step, awaitable):
+        """
+        Await the coroutine of an asynchronous step, cancelling it when the
+        step (or the flow) runs out of time
+        """
+        import asyncio
+        now = time.monotonic()
+        timeout = error = None
+        if self.timeout is not None:
+            timeout = self.step_start + self.timeout - now
+            error = StepTimeout(step, self.timeout)
+        if self.deadline_at is not None and (
+                timeout is None or self.deadline_at - now < timeout):
+            timeout = self.deadline_at - now
+            error = DeadlineExceeded(step, self.limits.deadline)
+        if timeout is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, max(timeout, 0))
+        except asyncio.TimeoutError:
+            if isinstance(error, DeadlineExceeded):
+                self._exceed('deadline', error)
+            raise error from None
+
+
+class FlowWatchdog:
+    """
+    Thread that reports flows that exceed their time limits
+
+    :ivar interval:
+        The number of seconds between checks
+    :ivar file:
+        The stream that reports are written to
+
+    The watchdog looks at all the running flows that have limits (see
+    :class:`FlowLimits`). Each flow that is past its deadline, or whose
+    active step is past its timeout, is reported once for each step, with
+    the name of the step and the Python stack of the thread that runs it.
+    This helps to find steps that are stuck, which cannot be interrupted::
+
+        watchdog = FlowWatchdog(interval=5)
+        watchdog.start()
+        ...
+        watchdog.stop()
+    """
+
+    def __init__(self, interval=1.0, file=None):
+        self.interval = interval
+        self.file = file
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __repr__(self):
+        return "<{} interval:{}>".format(
+            self.__class__.__name__, self.interval)
+
+    def start(self):
+        """
+        Start the watchdog thread
+        """
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._watch, name='FlowWatchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the watchdog thread
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self):
+        """
+        Report all the flows that exceed their time limits right now
+
+        :returns:
+            The number of flows that were reported
+        """
+        import traceback
+        now = time.monotonic()
+        frames = sys._current_frames()
+        with _active_lock:
+            limiters = list(_active)
+        reported = 0
+        for limiter in limiters:
+            step, step_start = limiter.step, limiter.step_start
+            if step is None or limiter.reported == (step, step_start):
+                continue
+            if limiter.deadline_at is not None and now > limiter.deadline_at:
+                reason = "exceeded its deadline of {}s".format(
+                    limiter.limits.deadline)
+            elif (limiter.timeout is not None and
+                    now - step_start > limiter.timeout):
+                reason = "exceeded the step timeout of {}s".format(
+                    limiter.timeout)
+            else:
+                continue
+            limiter.reported = (step, step_start)
+            reported += 1
+            file = self.file if self.file is not None else sys.stderr
+            print("arrowhead> flow {} {}, active step: {!a} (running for"
+                  " {:.1f}s)".format(
+                      limiter.flow.Meta.name, reason, step.Meta.name,
+                      now - step_start), file=file)
+            frame = frames.get(limiter.thread_id)
+            if frame is not None:
+                file.write(''.join(traceback.format_stack(frame)))
+        return reported
+
+    def _watch(self):
+        while not self._stopped.wait(self.interval):
+            self.check()
@@ -1,15 +1,35 @@
 import argparse
 import errno
-import pdb
-import subprocess
-import tempfile
-import time
+import os
 
-from arrowhead.core import Arrow, Step
 from arrowhead.errors import ProgrammingError
 from arrowhead.errors import GraphvizNotInstalled
+from arrowhead.errors import LimitExceeded
+from arrowhead.hooks import FlowHooks
+from arrowhead.inspector import FlowChangePrinter
+from arrowhead.inspector import export_graphml
+from arrowhead.inspector import export_json
 from arrowhead.inspector import print_dot_graph
 from arrowhead.inspector import print_flow_state
+from arrowhead.inspector import render_graph
+
+
+_EXPORTERS = {
+    'dot': print_dot_graph,
+    'graphml': export_graphml,
+    'json': export_json,
+}
+
+
+def _positive_float(text):
+    try:
+        value = float(text)
+    except ValueError:
+        value = None
+    if value is None or not value > 0:
+        raise argparse.ArgumentTypeError(
+            "{!r} is not a positive number".format(text))
+    return value
 
 
 def add_flow_arguments(parser):
@@ -24,15 +44,34 @@ def add_flow_arguments(parser):
     group.add_argument(
         '--preview', action='store_const', const='preview', dest='action',
         help="Show the flow diagram in a X11 window")
+    group.add_argument(
+        '--export', choices=sorted(_EXPORTERS), metavar='FORMAT',
+        help="Export the flow in the given format ({})".format(
+            ', '.join(sorted(_EXPORTERS))))
+    group.add_argument(
+        '--render', metavar='FILE',
+        help="Render the flow diagram to an image file, in the format named"
+        " by its extension (for example .svg or .png)")
     parser.add_argument(
-        '-t', '--trace', choices=['console', 'x11'],
-        help="Display visual trace of flow execution")
+        '-t', '--trace', choices=['console', 'changes', 'x11'],
+        help="Display visual trace of flow execution ('changes' shows only"
+        " the state that changed at each step)")
     parser.add_argument(
         '--pdb', default=False, action='store_true',
         help="Jump into the pdb between steps (for --run)")
     parser.add_argument(
         '--delay', default=0, action='store', type=int,
         help="Insert artificial delays between steps")
+    parser.add_argument(
+        '--fps', default=10, action='store', type=_positive_float,
+        help="Maximum number of redraws per second of the x11 trace")
+    parser.add_argument(
+        '--profile', default=False, action='store_true',
+        help="Print time spent in each step (for --run)")
+    parser.add_argument(
+        '--profile-stacks', metavar='FILE',
+        help="Save step timings in the collapsed stack format of flamegraph"
+        " tools (for --run)")
 
 
 def main(flow_cls, argv=None, **kwargs):
@@ -52,11 +91,21 @@ def run_flow(flow_cls, flow_ns, **kwargs):
     if flow_ns.action == 'dot':
         print_dot_graph(flow_cls)
         return
+    if flow_ns.export:
+        _EXPORTERS[flow_ns.export](flow_cls)
+        return
+    if flow_ns.render:
+        format = os.path.splitext(flow_ns.render)[1].lstrip('.') or 'svg'
+        with open(flow_ns.render, 'wb') as stream:
+            stream.write(render_graph(flow_cls, format))
+        return
     # Create a viewer
     if flow_ns.trace == 'console':
         viewer = ConsoleFlowViewer()
+    elif flow_ns.trace == 'changes':
+        viewer = ConsoleFlowViewer(changes_only=True)
     elif flow_ns.trace == 'x11':
-        viewer = X11FlowViewer()
+        viewer = X11FlowViewer(flow_ns.fps)
     else:
         viewer = DummyViewer()
     # Preview the flow
@@ -69,47 +118,84 @@ def run_flow(flow_cls, flow_ns, **kwargs):
         finally:
             viewer.close()
     elif flow_ns.action == 'run':
+        profiler = None
+        if flow_ns.profile or flow_ns.profile_stacks:
+            from arrowhead.profiler import FlowProfiler
+            profiler = FlowProfiler()
         try:
             retval = _run_flow(
-                flow_cls, viewer, flow_ns.pdb, flow_ns.delay, kwargs)
+                flow_cls, viewer, flow_ns.pdb, flow_ns.delay, kwargs,
+                profiler)
             if retval is not None:
                 print("arrowhead> flow returned: {!r}".format(retval))
+            if flow_ns.profile:
+                profiler.print_summary()
+            if flow_ns.profile_stacks:
+                with open(flow_ns.profile_stacks, 'wt') as stream:
+                    profiler.write_collapsed(stream)
         except ProgrammingError as exc:
             raise SystemExit(exc)
+        except LimitExceeded as exc:
+            raise SystemExit("arrowhead> flow stopped: {}".format(exc))
         else:
             viewer.wait_for_exit()
         finally:
             viewer.close()
 
 
-def _run_flow(flow_cls, viewer, use_pdb, delay, kwargs):
+def _run_flow(flow_cls, viewer, use_pdb, delay, kwargs, profiler=None):
     flow = flow_cls(autostart=False, **kwargs)
-    viewer.update(flow, '_start')
-    if use_pdb:
-        print("arrowhead> about to start flow execution (pdb)")
-        pdb.set_trace()
-    for obj in flow._run():
-        if isinstance(obj, Step):
-            step = obj
-            viewer.update(flow, step.Meta.name)
-            if delay:
-                print("arrowhead> waiting for {}s".format(delay))
-                time.sleep(delay)
-            if use_pdb:
-                print("arrowhead> current step: {} (pdb)".format(step))
-                pdb.set_trace()
-        elif isinstance(obj, Arrow):
-            # TODO: make the viewer capable of showing the active arrow
-            # arrow = obj
-            # print("Following", arrow)
+    flow.add_hooks(_ObserverHooks(viewer, use_pdb, delay))
+    if flow.Meta.is_async:
+        import asyncio
+        asyncio.run(_run_flow_async(flow, profiler))
+    else:
+        for obj in flow._run(profiler=profiler):
             pass
-    viewer.update(flow, '_end')
-    if use_pdb:
-        print("arrowhead> finished flow (pdb)")
-        pdb.set_trace()
     return getattr(flow, 'return')
 
 
+async def _run_flow_async(flow, profiler=None):
+    async for obj in flow._run_async(profiler):
+        pass
+
+
+class _ObserverHooks(FlowHooks):
+    """
+    Hooks that show the running flow in a viewer and (optionally) pause it
+    """
+
+    def __init__(self, viewer, use_pdb, delay):
+        self.viewer = viewer
+        self.use_pdb = use_pdb
+        self.delay = delay
+
+    def on_flow_start(self, flow):
+        self.viewer.update(flow, '_start')
+        if self.use_pdb:
+            import pdb
+            print("arrowhead> about to start flow execution (pdb)")
+            pdb.set_trace()
+
+    def on_step_enter(self, flow, step):
+        self.viewer.update(flow, step.Meta.name)
+        if self.delay:
+            import time
+            print("arrowhead> waiting for {}s".format(self.delay))
+            time.sleep(self.delay)
+        if self.use_pdb:
+            import pdb
+            print("arrowhead> current step: {} (pdb)".format(step))
+            pdb.set_trace()
+
+    def on_flow_end(self, flow):
+        self.viewer.update(flow, '_end')
+        if self.use_pdb:
+            import pdb
+            print("arrowhead> finished flow (pdb)")
+            pdb.set_trace()
+
+
 class DummyViewer:
 
     def update(self, flow, active_step_name=None):
@@ -124,8 +210,16 @@ class DummyViewer:
 
 class ConsoleFlowViewer:
 
+    def __init__(self, changes_only=False):
+        self.printer = None
+        if changes_only:
+            self.printer = FlowChangePrinter()
+
     def update(self, flow, active_step_name=None):
-        print_flow_state(flow, active_step_name)
+        if self.printer is None:
+            print_flow_state(flow, active_step_name)
+        else:
+            self.printer.update(flow, active_step_name)
 
     def close(self):
         pass
@@ -140,26 +234,89 @@ class ConsoleFlowViewer:
 
 
 class X11FlowViewer:
+    """
+    Viewer that shows the flow graph in a X11 window of dot(1)
+
+    :ivar fps:
+        The maximum number of times per second the graph is redrawn
 
-    def __init__(self):
+    The first update is rendered right away. Subsequent updates are rendered
+    by a background thread, at most ``fps`` times per second, so that the
+    flow doesn't wait for the graph to be rendered. Only the most recent
+    update is rendered, intermediate ones are skipped. The file read by dot(1)
+    is rewritten only when the highlighted step changes.
+    """
+
+    def __init__(self, fps=10):
+        import tempfile
+        import threading
+        if not fps > 0:
+            raise ValueError("fps must be positive")
+        self.fps = fps
         self.dot_file = tempfile.NamedTemporaryFile(
             mode='w+t', suffix='.dot', encoding='UTF-8')
         self.proc = None
+        # The update waiting to be rendered and the one shown now
+        self._pending = None
+        self._shown = None
+        self._stopping = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(
+            target=self._render_loop, name='X11FlowViewer', daemon=True)
 
     def update(self, flow, active_step_name=None):
-        self.dot_file.seek(0)
-        self.dot_file.truncate()
-        print_dot_graph(flow, active_step_name, file=self.dot_file)
-        self.dot_file.flush()
         if self.proc is None:
+            self._render(flow, active_step_name)
+            import subprocess
             try:
                 self.proc = subprocess.Popen(['dot', '-Txlib', self.dot_file.name])
             except OSError as exc:
                 if exc.errno == errno.ENOENT:
                     raise GraphvizNotInstalled
+            else:
+                self._thread.start()
+            return
+        with self._cond:
+            self._pending = (flow, active_step_name)
+            self._cond.notify()
+
+    def _render_loop(self):
+        import time
+        while True:
+            with self._cond:
+                while self._pending is None and not self._stopping:
+                    self._cond.wait()
+                if self._pending is None:
+                    return
+                flow, active_step_name = self._pending
+                self._pending = None
+            self._render(flow, active_step_name)
+            time.sleep(1 / self.fps)
+
+    def _render(self, flow, active_step_name):
+        # The graph depends only on the flow class and the active step
+        shown = (flow.Meta, active_step_name)
+        if shown == self._shown:
+            return
+        self._shown = shown
+        # The file is rewritten in place, dot(1) reloads it when it changes
+        self.dot_file.seek(0)
+        self.dot_file.truncate()
+        print_dot_graph(flow, active_step_name, file=self.dot_file)
+        self.dot_file.flush()
 
+    def _stop(self):
+        """
+        Render the most recent update and stop the rendering thread
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread.is_alive():
+            self._thread.join()
 
     def close(self):
+        self._stop()
         if self.proc is not None:
             try:
                 self.proc.terminate()
@@ -169,6 +326,7 @@ class X11FlowViewer:
         self.dot_file.close()
 
     def wait_for_exit(self):
+        self._stop()
         if self.proc:
             print("(close the graphviz window or control+C to close)")
         while True:
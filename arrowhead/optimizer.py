@@ -0,0 +1,226 @@
+import copy
+import dis
+import inspect
+
+from arrowhead.core import ArrowTable
+from arrowhead.core import ForkArrow
+
+# Instructions that don't do anything
+_IGNORED = frozenset(['RESUME', 'NOP', 'CACHE', 'EXTENDED_ARG'])
+
+# Instructions that load a constant, small integers have their own (3.14+)
+_LOAD_CONSTANT = frozenset(['LOAD_CONST', 'LOAD_SMALL_INT'])
+
+# Marker of functions that don't just return a constant
+_NOT_CONSTANT = object()
+
+
+class OptimizedGraph:
+    """
+    Execution graph of a flow, optimized for the headless engine
+
+    :ivar initial_id:
+        Identifier of the first step to run
+    :ivar dispatch:
+        A tuple of :class:`arrowhead.core.ArrowTable` indexed by step
+        identifier, just like ``Meta.dispatch``, with None in place of the
+        tables of steps that are never reached
+    :ivar folded:
+        A dictionary mapping names of steps that are skipped to the value
+        their step functions always return
+    :ivar removed:
+        A tuple of names of steps that are never reached
+
+    The graph is computed by :func:`optimize_flow()` for flows created with
+    the ``optimize`` keyword argument of the class statement::
+
+        class Pipeline(Flow, optimize=True):
+            ...
+
+    Steps with constant step functions (that just return the same value,
+    including steps that do nothing at all) are folded into the arrows that
+    lead to them. Arrows are threaded straight to the step their route ends
+    at. Steps that cannot be reached any more are removed.
+
+    Only :meth:`Flow._execute()` and :meth:`Flow.run_async()` follow the
+    optimized graph, flows that are observed (with hooks, limits, viewers,
+    profilers or journals) run every step. Folded steps are not
+    instantiated and their outcome (:meth:`Step.result()`) is not recorded.
+    Apart from that the flows are equivalent, see :func:`compare_engines()`.
+    The graph described by ``Meta`` and shown by
+    :func:`arrowhead.inspector.print_dot_graph()` is not changed.
+    """
+
+    def __init__(self, initial_id, dispatch, folded, removed):
+        self.initial_id = initial_id
+        self.dispatch = dispatch
+        self.folded = folded
+        self.removed = removed
+
+    def __repr__(self):
+        return "<{} folded:{} removed:{}>".format(
+            self.__class__.__name__, len(self.folded), len(self.removed))
+
+
+def optimize_flow(meta):
+    """
+    Optimize the execution graph of a flow
+
+    :param meta:
+        The meta-data (``Meta`` attribute) of a flow class
+    :returns:
+        A new :class:`OptimizedGraph`
+    """
+    if meta.initial_id is None:
+        return OptimizedGraph(None, meta.dispatch, {}, ())
+    routes = _fold_constants(meta)
+    # Thread each route through the chain of folded steps
+    threaded = {}
+    for step_id in routes:
+        seen = set()
+        target_id = step_id
+        while target_id in routes and target_id not in seen:
+            seen.add(target_id)
+            target_id = routes[target_id]
+        if target_id in seen:
+            # Folded steps that form a loop keep running, forever
+            continue
+        threaded[step_id] = target_id
+    dispatch = [_thread_table(table, threaded) for table in meta.dispatch]
+    initial_id = threaded.get(meta.initial_id, meta.initial_id)
+    # Remove steps that can no longer be reached by the headless engine
+    live = {initial_id}
+    todo = [initial_id]
+    while todo:
+        for target_id, arrow in _iter_routes(dispatch[todo.pop()]):
+            if target_id not in live:
+                live.add(target_id)
+                todo.append(target_id)
+    removed = []
+    for step_id, step in enumerate(meta.step_classes):
+        if step_id not in live:
+            dispatch[step_id] = None
+            removed.append(step.Meta.name)
+    folded = {
+        meta.step_classes[step_id].Meta.name:
+        _get_constant(meta.step_classes[step_id].__call__)
+        for step_id in threaded}
+    return OptimizedGraph(initial_id, tuple(dispatch), folded, tuple(removed))
+
+
+def _fold_constants(meta):
+    """
+    Find steps with constant step functions and the route each one takes
+
+    :returns:
+        A dictionary mapping identifiers of such steps to identifiers of
+        the steps they lead to
+    """
+    # Fork branches end at join steps, they have to keep running
+    joins = set()
+    for step in meta.step_classes:
+        for arrow in step.Meta.arrows:
+            if isinstance(arrow, ForkArrow):
+                joins.add(meta.step_ids[arrow.target])
+    routes = {}
+    for step_id, step in enumerate(meta.step_classes):
+        if (step_id in joins or step.Meta.accepting or step.Meta.is_async
+                or step.Meta.vectorized is not None
+                or step.Meta.cache is not None):
+            continue
+        value = _get_constant(step.__call__)
+        if value is _NOT_CONSTANT:
+            continue
+        route = meta.dispatch[step_id].follow_value(value)
+        if route is not None and not route[1].branches:
+            routes[step_id] = route[0]
+    return routes
+
+
+def _get_constant(func):
+    """
+    Get the value that a function always returns
+
+    :returns:
+        The value or _NOT_CONSTANT if the function does anything else
+    """
+    code = getattr(func, '__code__', None)
+    if code is None or not inspect.isfunction(func) or (
+            inspect.isgeneratorfunction(func) or
+            inspect.iscoroutinefunction(func)):
+        return _NOT_CONSTANT
+    ops = [instr for instr in dis.get_instructions(code)
+           if instr.opname not in _IGNORED]
+    if len(ops) == 1 and ops[0].opname == 'RETURN_CONST':
+        return ops[0].argval
+    if (len(ops) == 2 and ops[0].opname in _LOAD_CONSTANT and
+            ops[1].opname == 'RETURN_VALUE'):
+        return ops[0].argval
+    return _NOT_CONSTANT
+
+
+def _thread_table(table, threaded):
+    """
+    Copy an arrow table, replacing targets of routes with threaded ones
+    """
+    def thread(route):
+        if route is None or route[0] not in threaded or route[1].branches:
+            return route
+        return (threaded[route[0]], route[1])
+    new_table = ArrowTable((), {})
+    new_table.errors = tuple(thread(route) for route in table.errors)
+    new_table.values = {
+        value: thread(route) for value, route in table.values.items()}
+    new_table.fallback = tuple(thread(route) for route in table.fallback)
+    new_table.default = thread(table.default)
+    return new_table
+
+
+def _iter_routes(table):
+    yield from table.errors
+    yield from table.values.values()
+    yield from table.fallback
+    if table.default is not None:
+        yield table.default
+
+
+def compare_engines(flow_cls, records):
+    """
+    Run a flow with and without the optimized graph and compare the outcome
+
+    :param flow_cls:
+        A flow class created with ``optimize=True``
+    :param records:
+        An iterable of dictionaries with the initial state of each flow,
+        each one is copied for both runs
+    :returns:
+        A list of tuples (record, optimized, unoptimized) with each record
+        that gave different outcomes
+
+    The outcome of a run is the value returned by the flow (or the type and
+    message of the exception it raised) and the final state of the flow.
+    This is the differential test harness of the optimizer, flows whose steps
+    have other side effects should be compared by other means.
+    """
+    optimized = flow_cls.Meta.optimized
+    if optimized is None:
+        raise ValueError(
+            "flow {} is not optimized".format(flow_cls.Meta.name))
+    mismatches = []
+    for record in records:
+        outcomes = []
+        for initial_id, dispatch in (
+                (optimized.initial_id, optimized.dispatch),
+                (flow_cls.Meta.initial_id, flow_cls.Meta.dispatch)):
+            flow = flow_cls(autostart=False, **copy.deepcopy(record))
+            try:
+                outcome = ('return', flow._execute_from(
+                    initial_id, None, dispatch))
+            except Exception as exc:
+                outcome = ('raise', type(exc), str(exc))
+            state = {key: value for key, value in flow.__dict__.items()
+                     if not key.startswith('_')}
+            outcomes.append((outcome, state))
+        if outcomes[0] != outcomes[1]:
+            mismatches.append((record, outcomes[0], outcomes[1]))
+    return mismatches
@@ -0,0 +1,87 @@
+import threading
+
+
+class FlowPool:
+    """
+    Pool of reusable flow instances
+
+    :ivar flow_cls:
+        The flow class instantiated by this pool
+    :ivar maxsize:
+        The maximum number of idle flows kept around (or None)
+
+    Flows obtained from the pool behave exactly like freshly constructed
+    flows, apart from the fact that steps that were instantiated by a previous
+    run are reused (with their state discarded). Returning flows to the pool
+    avoids allocating the flow and its steps over and over again::
+
+        pool = FlowPool(MyFlow)
+        for record in records:
+            print(pool.run(record=record))
+
+    Flows should not be used after they were released back to the pool.
+    """
+
+    def __init__(self, flow_cls, maxsize=None):
+        self.flow_cls = flow_cls
+        self.maxsize = maxsize
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<{} of {} idle:{}>".format(
+            self.__class__.__name__, self.flow_cls.__name__, len(self._idle))
+
+    def acquire(self, autostart=True, **kwargs):
+        """
+        Get a flow from the pool
+
+        :param autostart:
+            if True (default) then the flow is started immediately
+        :param kwargs:
+            initial state of the flow
+        :returns:
+            A flow instance, just like ``flow_cls(autostart, **kwargs)``
+        """
+        with self._lock:
+            flow = self._idle.pop() if self._idle else None
+        if flow is None:
+            return self.flow_cls(autostart=autostart, **kwargs)
+        flow._reset(kwargs)
+        if autostart:
+            if flow.Meta.cache is None:
+                flow._execute()
+            else:
+                from arrowhead.cache import execute_cached
+                execute_cached(flow, kwargs)
+        return flow
+
+    def release(self, flow):
+        """
+        Return a flow to the pool
+
+        :param flow:
+            A flow instance (of the class managed by this pool)
+        :raises TypeError:
+            If the flow is not an instance of the right class
+        """
+        if type(flow) is not self.flow_cls:
+            raise TypeError("{!r} cannot hold {!r}".format(self, flow))
+        with self._lock:
+            if self.maxsize is None or len(self._idle) < self.maxsize:
+                self._idle.append(flow)
+
+    def run(self, **kwargs):
+        """
+        Run a flow from the pool and return the value it returned
+
+        :param kwargs:
+            initial state of the flow
+        :returns:
+            The value returned by the accepting step
+        """
+        flow = self.acquire(**kwargs)
+        try:
+            return getattr(flow, 'return')
+        finally:
+            self.release(flow)
@@ -0,0 +1,180 @@
+import sys
+import time
+
+
+class StepStats:
+    """
+    Timing statistics of one step
+
+    :ivar calls:
+        number of times the step ran
+    :ivar wall:
+        total wall-clock time spent in the step function
+    :ivar cpu:
+        total CPU time (of the running thread) spent in the step function
+    :ivar arrow:
+        total wall-clock time spent selecting the arrow to follow
+    """
+
+    __slots__ = ('calls', 'wall', 'cpu', 'arrow')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.arrow = 0.0
+
+    def __repr__(self):
+        return "<{} calls:{} wall:{:.6f} cpu:{:.6f} arrow:{:.6f}>".format(
+            self.__class__.__name__, self.calls, self.wall, self.cpu,
+            self.arrow)
+
+
+class FlowProfiler:
+    """
+    Profiler of flow steps and arrow transitions
+
+    :ivar stats:
+        A dictionary mapping (flow name, step name) to :class:`StepStats`
+
+    The profiler is used by passing it to :meth:`Flow._run()`, which then
+    runs each step through :meth:`run_step()`. Without the profiler flows
+    run exactly as before. One profiler can collect statistics of many flows
+    (of any class)::
+
+        profiler = FlowProfiler()
+        for record in records:
+            profiler.profile(MyFlow(autostart=False, **record))
+        profiler.print_summary()
+    """
+
+    def __init__(self):
+        self.stats = {}
+        # Names of step functions, for write_collapsed()
+        self._functions = {}
+
+    def __repr__(self):
+        return "<{} steps:{}>".format(
+            self.__class__.__name__, len(self.stats))
+
+    def profile(self, flow):
+        """
+        Run a flow to completion, profiling each step
+
+        :param flow:
+            A flow created with ``autostart=False``
+        :returns:
+            The flow
+        """
+        for obj in flow._run(profiler=self):
+            pass
+        return flow
+
+    def run_step(self, flow, step, table):
+        """
+        Run one step of a flow, just like :meth:`Flow._run_one_step()`
+        """
+        # Reset special internal state
+        step._result = None
+        start_cpu = time.thread_time()
+        start = time.perf_counter()
+        try:
+            if step.Meta.needs_flow:
+                value = step(flow)
+            else:
+                value = step()
+        except (KeyboardInterrupt, Exception):
+            value, exc = None, sys.exc_info()[1]
+        else:
+            exc = None
+        end = time.perf_counter()
+        end_cpu = time.thread_time()
+        try:
+            return flow._follow(step, table, value, exc)
+        finally:
+            self._add(flow, step, start, end, start_cpu, end_cpu)
+
+    async def run_step_async(self, flow, step, table):
+        """
+        Asynchronous counterpart of :meth:`run_step()`
+
+        The time spent waiting for coroutines of asynchronous steps counts as
+        wall-clock time of the step.
+        """
+        # Reset special internal state
+        step._result = None
+        start_cpu = time.thread_time()
+        start = time.perf_counter()
+        try:
+            if step.Meta.needs_flow:
+                value = step(flow)
+            else:
+                value = step()
+            if step.Meta.is_async:
+                value = await value
+        except (KeyboardInterrupt, Exception):
+            value, exc = None, sys.exc_info()[1]
+        else:
+            exc = None
+        end = time.perf_counter()
+        end_cpu = time.thread_time()
+        try:
+            return flow._follow(step, table, value, exc)
+        finally:
+            self._add(flow, step, start, end, start_cpu, end_cpu)
+
+    def _add(self, flow, step, start, end, start_cpu, end_cpu):
+        key = (flow.Meta.name, step.Meta.name)
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = StepStats()
+            self._functions[key] = getattr(
+                type(step).__call__, '__qualname__', step.Meta.name)
+        stats.calls += 1
+        stats.wall += end - start
+        stats.cpu += end_cpu - start_cpu
+        stats.arrow += time.perf_counter() - end
+
+    def print_summary(self, file=sys.stdout):
+        """
+        Print a table of statistics, slowest steps first
+
+        :param file:
+            stream to print to
+        """
+        total = sum(
+            stats.wall + stats.arrow for stats in self.stats.values())
+        print("{:30} {:>8} {:>12} {:>12} {:>12} {:>12} {:>6}".format(
+            "step", "calls", "wall [s]", "per call", "cpu [s]",
+            "arrows [s]", "%"), file=file)
+        for (flow_name, step_name), stats in sorted(
+                self.stats.items(), key=lambda item: -item[1].wall):
+            print("{:30} {:8} {:12.6f} {:12.6f} {:12.6f} {:12.6f} {:6.1%}"
+                  .format(
+                      "{}.{}".format(flow_name, step_name), stats.calls,
+                      stats.wall, stats.wall / stats.calls, stats.cpu,
+                      stats.arrow,
+                      (stats.wall + stats.arrow) / total if total else 0),
+                  file=file)
+
+    def write_collapsed(self, file):
+        """
+        Write statistics in the collapsed stack format
+
+        :param file:
+            stream to write to
+
+        Each line has a stack of frames (``flow;step;function``) and the
+        wall-clock time spent there, in microseconds. Time spent selecting
+        arrows is attributed to the ``[arrow]`` frame. The output can be
+        processed by flamegraph tools, for example ``flamegraph.pl``.
+        """
+        for key, stats in sorted(self.stats.items()):
+            flow_name, step_name = key
+            function = self._functions[key]
+            for frame, elapsed in ((function, stats.wall),
+                                   ('[arrow]', stats.arrow)):
+                micros = int(round(elapsed * 1e6))
+                if micros:
+                    print("{};{};{} {}".format(
+                        flow_name, step_name, frame, micros), file=file)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Concurrent execution of I/O-bound asynchronous flows
+
+This benchmark runs many flows that spend most of their time waiting for
+simulated I/O (asyncio.sleep). The flows are awaited one after another and
+then all at once, on a single event loop, with asyncio.gather().
+"""
+import argparse
+import asyncio
+import time
+
+from arrowhead import Flow, step, arrow
+
+
+class Lookup(Flow):
+
+    @step(initial=True)
+    @arrow('fetch')
+    def prepare(step, flow):
+        flow.key = 'key-{}'.format(flow.n)
+
+    @step
+    @arrow('store')
+    async def fetch(step, flow):
+        await asyncio.sleep(flow.latency)
+        flow.value = flow.key.upper()
+
+    @step(accepting=True)
+    async def store(step, flow):
+        await asyncio.sleep(flow.latency)
+        return flow.value
+
+
+async def sequential(count, latency):
+    for n in range(count):
+        await Lookup(autostart=False, n=n, latency=latency).run_async()
+
+
+async def concurrent(count, latency):
+    await asyncio.gather(*[
+        Lookup(autostart=False, n=n, latency=latency).run_async()
+        for n in range(count)])
+
+
+def measure(func, count, latency):
+    start = time.perf_counter()
+    asyncio.run(func(count, latency))
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '-n', default=1000, type=int,
+        help="Number of flows to run")
+    parser.add_argument(
+        '-l', '--latency', default=0.01, type=float,
+        help="Simulated latency of each I/O-bound step (in seconds)")
+    parser.add_argument(
+        '-s', '--sequential', default=50, type=int,
+        help="Number of flows to run sequentially (it is slow)")
+    ns = parser.parse_args()
+    baseline = measure(sequential, ns.sequential, ns.latency)
+    fast = measure(concurrent, ns.n, ns.latency)
+    print("sequential: {:10,.0f} flows/s".format(baseline))
+    print("concurrent: {:10,.0f} flows/s ({} flows)".format(fast, ns.n))
+    print("speedup:    {:10.2f}x".format(fast / baseline))
+
+
+if __name__ == '__main__':
+    main()
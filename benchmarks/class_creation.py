@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Creation time of flow classes in deep hierarchies
+
+This benchmark creates a base flow with a long chain of steps and then a deep
+hierarchy of derived flows where each derived flow overrides one step and
+adds one step. The cost of creating each derived flow should depend on what
+the derived flow changes, not on the size of the base flow.
+"""
+import argparse
+import collections
+import time
+
+from arrowhead import Flow, step, arrow
+
+
+def make_step(name, target=None, **kwargs):
+    def body(step):
+        pass
+    body.__name__ = body.__qualname__ = name
+    if target is not None:
+        arrow(target)(body)
+    return step(**kwargs)(body)
+
+
+def make_base(num_steps):
+    ns = collections.OrderedDict()
+    ns['s0'] = make_step('s0', 's1', initial=True)
+    for i in range(1, num_steps - 1):
+        ns['s{}'.format(i)] = make_step('s{}'.format(i), 's{}'.format(i + 1))
+    ns['s{}'.format(num_steps - 1)] = make_step(
+        's{}'.format(num_steps - 1), accepting=True)
+    return type(Flow)('Base', (Flow,), ns)
+
+
+def make_hierarchy(base, depth):
+    """
+    Derive depth flows, each one from the previous one
+    """
+    flow_cls = base
+    last = 's{}'.format(len(base.Meta.steps) - 1)
+    for i in range(depth):
+        # Override the first step to visit the new step first
+        extra = 'x{}'.format(i)
+        ns = collections.OrderedDict()
+        ns['s0'] = make_step('s0', extra, initial=True)
+        ns[extra] = make_step(extra, 's1')
+        flow_cls = type(Flow)('Derived{}'.format(i), (flow_cls,), ns)
+    # Sanity check, the deepest flow still works
+    flow = flow_cls()
+    assert flow._steps[flow_cls.Meta.step_ids[last]] is not None
+    return flow_cls
+
+
+def measure(func, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '-s', '--steps', default=[100, 1000, 10000], type=int, nargs='+',
+        help="Number of steps in the base flow")
+    parser.add_argument(
+        '-d', '--depth', default=200, type=int,
+        help="Number of derived flows in the hierarchy")
+    parser.add_argument(
+        '-r', '--repeat', default=3, type=int,
+        help="Number of repetitions (best time is reported)")
+    ns = parser.parse_args()
+    print("{:>8} {:>14} {:>18}".format(
+        "steps", "base flow", "each derived flow"))
+    for num_steps in ns.steps:
+        base_time = measure(lambda: make_base(num_steps), ns.repeat)
+        base = make_base(num_steps)
+        derived_time = measure(
+            lambda: make_hierarchy(base, ns.depth), ns.repeat)
+        print("{:8,} {:12.2f}ms {:16.1f}us".format(
+            num_steps, base_time * 1e3, derived_time / ns.depth * 1e6))
+
+
+if __name__ == '__main__':
+    main()
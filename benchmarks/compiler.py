@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Speedup of flows compiled to Python functions
+
+This benchmark runs the two-step loop of ``transitions.py``, a long chain
+and a wide value-routing fan-out (see ``generators.py``) with the
+interpreter of ``Flow._execute()`` and with the function generated by
+``arrowhead.compiler.compile_flow()``. The outcome of both is compared and
+the time needed to compile each flow is reported as well.
+"""
+import argparse
+import time
+
+from arrowhead import Flow
+from arrowhead.compiler import compile_flow
+
+import generators
+from transitions import CountDown
+
+
+def measure(func, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def compare(name, flow_cls, records, transitions, repeat):
+    """
+    Run flows made from each record with both engines and print the speedup
+    """
+    compiled_cls = type(Flow)(
+        'Compiled' + flow_cls.__name__, (flow_cls,), {}, compiled=True)
+    start = time.perf_counter()
+    compile_flow(compiled_cls)
+    compile_time = time.perf_counter() - start
+    for record in records:
+        expected = flow_cls(**record).__dict__
+        actual = compiled_cls(**record).__dict__
+        expected.pop('_steps')
+        actual.pop('_steps')
+        if expected != actual:
+            raise SystemExit("{}: different outcome for {!r}".format(
+                name, record))
+    interpreted = measure(
+        lambda: [flow_cls(**record) for record in records], repeat)
+    compiled = measure(
+        lambda: [compiled_cls(**record) for record in records], repeat)
+    print("{:10} {:12,.0f} {:12,.0f} {:8.2f}x {:10.1f}ms".format(
+        name, transitions / interpreted, transitions / compiled,
+        interpreted / compiled, compile_time * 1e3))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '-n', default=100000, type=int,
+        help="Number of round trips through the loop")
+    parser.add_argument(
+        '-s', '--size', default=1000, type=int,
+        help="Number of steps of the chain and of the fan-out")
+    parser.add_argument(
+        '-r', '--repeat', default=5, type=int,
+        help="Number of repetitions (best time is reported)")
+    ns = parser.parse_args()
+    print("{:10} {:>12} {:>12} {:>9} {:>12}".format(
+        "flow", "interpreted", "compiled", "speedup", "compile"))
+    print("{:10} {:>12} {:>12}".format("", "[trans/s]", "[trans/s]"))
+    compare('loop', CountDown, [{'n': ns.n}], 2 * ns.n + 1, ns.repeat)
+    compare('chain', generators.make_chain(ns.size), [{}] * 100,
+            100 * ns.size, ns.repeat)
+    choices = [i * 7919 % ns.size for i in range(10000)]
+    compare('fan_out', generators.make_fan_out(ns.size),
+            [{'choice': choice} for choice in choices], 2 * len(choices),
+            ns.repeat)
+
+
+if __name__ == '__main__':
+    main()
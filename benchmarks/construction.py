@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Construction cost of flow instances
+
+This benchmark creates and runs many instances of a large, generated flow
+where each run takes the shortest path (two steps). Flows are constructed with
+all the steps instantiated upfront (the old, eager behavior), with steps
+instantiated on first use (the default) and reused from a FlowPool.
+"""
+import argparse
+import collections
+import time
+
+from arrowhead import Flow, step, arrow
+from arrowhead.pool import FlowPool
+
+
+def make_flow(num_steps):
+    """
+    Make a flow where most of the steps are never visited
+
+    The initial step goes straight to the accepting step unless the flow is
+    asked to take the long way through the chain of the remaining steps.
+    """
+    ns = collections.OrderedDict()
+
+    def start(step, flow):
+        return flow.long_way
+    arrow('s1', value=True)(start)
+    arrow('end', value=False)(start)
+    ns['start'] = step(initial=True)(start)
+    for i in range(1, num_steps - 1):
+        def body(step):
+            pass
+        body.__name__ = 's{}'.format(i)
+        arrow('s{}'.format(i + 1) if i < num_steps - 2 else 'end')(body)
+        ns[body.__name__] = step(body)
+
+    def end(step):
+        return 'done'
+    ns['end'] = step(accepting=True)(end)
+    return type(Flow)('Generated', (Flow,), ns)
+
+
+def make_eager_flow(flow_cls):
+
+    class Eager(flow_cls):
+
+        def __init__(self, autostart=True, **kwargs):
+            super().__init__(autostart=False, **kwargs)
+            for step_id in range(len(self.Meta.step_classes)):
+                self._activate(step_id)
+            if autostart:
+                self._execute()
+
+    return Eager
+
+
+def measure(func, count, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        for j in range(count):
+            func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return count / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '-s', '--steps', default=300, type=int,
+        help="Number of steps in the generated flow")
+    parser.add_argument(
+        '-n', default=10000, type=int,
+        help="Number of flows to run")
+    parser.add_argument(
+        '-r', '--repeat', default=5, type=int,
+        help="Number of repetitions (best time is reported)")
+    ns = parser.parse_args()
+    flow_cls = make_flow(ns.steps)
+    eager_cls = make_eager_flow(flow_cls)
+    pool = FlowPool(flow_cls)
+    eager = measure(lambda: eager_cls(long_way=False), ns.n, ns.repeat)
+    lazy = measure(lambda: flow_cls(long_way=False), ns.n, ns.repeat)
+    pooled = measure(lambda: pool.run(long_way=False), ns.n, ns.repeat)
+    print("eager steps: {:10,.0f} flows/s".format(eager))
+    print("lazy steps:  {:10,.0f} flows/s ({:.2f}x)".format(
+        lazy, lazy / eager))
+    print("FlowPool:    {:10,.0f} flows/s ({:.2f}x)".format(
+        pooled, pooled / eager))
+
+
+if __name__ == '__main__':
+    main()
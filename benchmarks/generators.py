@@ -0,0 +1,162 @@
+"""
+Synthetic flows of configurable size
+
+Each generator returns a new flow class. The flows don't do any work in their
+steps so that benchmarks measure the engine and not the steps.
+"""
+import collections
+import types
+
+from arrowhead import Flow, step, arrow
+from arrowhead.builder import FlowBuilder
+
+
+class StepFailed(Exception):
+    """
+    Exception raised by steps of flows made by :func:`make_error_path()`
+    """
+
+
+def make_step(name, targets=(), errors=(), func=None, **kwargs):
+    """
+    Make a step with arrows to given targets
+
+    :param name:
+        name of the step
+    :param targets:
+        names of target steps, the first one is reached with a normal arrow
+        and the others with value arrows (the value is the index of the
+        target)
+    :param errors:
+        names of target steps reached with error arrows (for
+        :class:`StepFailed`)
+    :param func:
+        step function (by default the step does nothing), it is copied so
+        that one function can be used by many steps
+    :param kwargs:
+        additional arguments for :func:`arrowhead.step()`
+    """
+    if func is None:
+        def func(step):
+            pass
+    else:
+        func = types.FunctionType(
+            func.__code__, func.__globals__, name, func.__defaults__,
+            func.__closure__)
+    func.__name__ = func.__qualname__ = name
+    for index, target in enumerate(targets):
+        if index == 0:
+            arrow(target)(func)
+        else:
+            arrow(target, value=index)(func)
+    for target in errors:
+        arrow(target, error=StepFailed)(func)
+    return step(**kwargs)(func)
+
+
+def make_class(name, steps, bases=(Flow,), **kwargs):
+    ns = collections.OrderedDict(
+        (step_cls.Meta.name, step_cls) for step_cls in steps)
+    return type(Flow)(name, bases, ns, **kwargs)
+
+
+def make_chain(num_steps):
+    """
+    Make a flow where steps form one long chain
+
+    Running the flow visits each step once.
+    """
+    names = ['s{}'.format(i) for i in range(num_steps)]
+    steps = [make_step(names[0], names[1:2], initial=True)]
+    steps.extend(
+        make_step(names[i], names[i + 1:i + 2])
+        for i in range(1, num_steps - 1))
+    steps.append(make_step(names[-1], accepting=True))
+    return make_class('Chain', steps)
+
+
+def build_chain(num_steps):
+    """
+    Make the same flow as :func:`make_chain()` with :class:`FlowBuilder`
+    """
+    names = ['s{}'.format(i) for i in range(num_steps)]
+    builder = FlowBuilder('Chain')
+    builder.add_steps(
+        names, accepting=[i == num_steps - 1 for i in range(num_steps)])
+    builder.set_initial(names[0])
+    builder.add_arrows(names[:-1], names[1:])
+    return builder.build()
+
+
+def make_padded_chain(num_steps, optimize=False):
+    """
+    Make a flow where every other step of a chain does nothing
+
+    The other steps count the steps that did something in ``flow.count``,
+    which has to be given when the flow is created. With ``optimize=True``
+    the flow is optimized (see :mod:`arrowhead.optimizer`) and the steps
+    that do nothing are skipped.
+    """
+    def count(step, flow):
+        flow.count += 1
+    names = ['s{}'.format(i) for i in range(num_steps)]
+    steps = [make_step(names[0], names[1:2], initial=True)]
+    steps.extend(
+        make_step(names[i], names[i + 1:i + 2],
+                  func=count if i % 2 else None)
+        for i in range(1, num_steps - 1))
+    steps.append(make_step(names[-1], accepting=True))
+    return make_class('PaddedChain', steps, optimize=optimize)
+
+
+def make_fan_out(width):
+    """
+    Make a flow where the initial step routes on a value to many steps
+
+    The initial step returns ``flow.choice``, a number in ``range(width)``.
+    Each of the targets leads to the accepting step. Running the flow makes
+    two transitions.
+    """
+    names = ['t{}'.format(i) for i in range(width)]
+
+    def start(step, flow):
+        return flow.choice
+    steps = [make_step('start', names, func=start, initial=True)]
+    steps.extend(make_step(name, ['end']) for name in names)
+    steps.append(make_step('end', accepting=True))
+    return make_class('FanOut', steps)
+
+
+def make_error_path(num_steps):
+    """
+    Make a flow where each step raises an exception
+
+    The exception is routed to the next step with an error arrow. Running
+    the flow visits each step once.
+    """
+    def fail(step):
+        raise StepFailed
+    names = ['e{}'.format(i) for i in range(num_steps)]
+    steps = [
+        make_step(names[i], errors=names[i + 1:i + 2], func=fail,
+                  initial=(i == 0))
+        for i in range(num_steps - 1)]
+    steps.append(make_step(names[-1], accepting=True))
+    return make_class('ErrorPath', steps)
+
+
+def make_hierarchy(base, depth):
+    """
+    Derive a chain of flows from a flow made by :func:`make_chain()`
+
+    Each derived flow overrides the initial step to visit a new step first.
+    The deepest flow is returned.
+    """
+    flow_cls = base
+    for i in range(depth):
+        extra = 'x{}'.format(i)
+        flow_cls = make_class('Derived{}'.format(i), [
+            make_step('s0', [extra], initial=True),
+            make_step(extra, ['s1']),
+        ], (flow_cls,))
+    return flow_cls
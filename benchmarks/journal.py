@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Cost of journaling flow transitions
+
+This benchmark runs the count-down loop from ``transitions.py`` by exhausting
+the observable ``Flow._run()`` generator, without a journal and with journals
+that are synced after every record and after batches of records. Only the
+counter changes on each transition so each record is a small delta.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from arrowhead.journal import Journal
+
+from transitions import CountDown
+
+
+def observed(n, path, sync_every):
+    flow = CountDown(autostart=False, n=n)
+    if sync_every is None:
+        for obj in flow._run():
+            pass
+        return
+    with Journal(path, sync_every) as journal:
+        journal.begin(flow)
+        for obj in flow._run(journal):
+            pass
+
+
+def measure(n, repeat, path, sync_every):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        observed(n, path, sync_every)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    # each round trip is two transitions, plus the final one to 'done'
+    return (2 * n + 1) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '-n', default=10000, type=int,
+        help="Number of round trips through the loop")
+    parser.add_argument(
+        '-r', '--repeat', default=3, type=int,
+        help="Number of repetitions (best time is reported)")
+    parser.add_argument(
+        '-b', '--batch', default=1000, type=int,
+        help="Number of records synced at a time in the batched run")
+    ns = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'journal')
+        baseline = measure(ns.n, ns.repeat, path, None)
+        batched = measure(ns.n, ns.repeat, path, ns.batch)
+        synced = measure(ns.n, ns.repeat, path, 1)
+        size = os.path.getsize(path)
+    print("no journal:         {:12,.0f} transitions/s".format(baseline))
+    print("sync every {:<6}    {:12,.0f} transitions/s".format(
+        ns.batch, batched))
+    print("sync every record:  {:12,.0f} transitions/s".format(synced))
+    print("journal size:       {:12,.0f} bytes/transition".format(
+        size / (2 * ns.n + 1)))
+
+
+if __name__ == '__main__':
+    main()
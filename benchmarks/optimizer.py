@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Differential test and speedup of the flow optimizer
+
+This benchmark generates random flows where many steps do nothing or return
+a constant value, checks that the optimized graph (see
+``arrowhead.optimizer``) gives the same outcome as the unoptimized engine for
+many initial states and then measures how much faster a long chain where
+every other step does nothing runs when it is optimized. It exits with an
+error if any of the outcomes differ.
+"""
+import argparse
+import random
+import sys
+import time
+
+from arrowhead import Flow
+from arrowhead.builder import FlowBuilder
+from arrowhead.optimizer import compare_engines
+
+import generators
+
+
+def work(step, flow):
+    flow.trace.append(step.Meta.name)
+    flow.n = flow.n * 7 % 11
+    if flow.n == 3:
+        raise generators.StepFailed
+    return flow.n % 3
+
+
+def make_constant(value):
+    def constant(step):
+        return value
+    return constant
+
+
+def make_random_flow(rng, num_steps):
+    """
+    Make a random optimized flow
+
+    Arrows only lead forward, to steps with higher numbers, so that all the
+    flows finish.
+    """
+    names = ['r{}'.format(i) for i in range(num_steps)]
+    funcs = []
+    for i in range(num_steps):
+        kind = rng.random()
+        if kind < 0.3:
+            funcs.append(None)
+        elif kind < 0.6:
+            funcs.append(make_constant(rng.choice([0, 1, 2, 'x', None])))
+        else:
+            funcs.append(work)
+    builder = FlowBuilder('Random')
+    builder.add_steps(
+        names, funcs=funcs,
+        accepting=[i == num_steps - 1 for i in range(num_steps)])
+    builder.set_initial(names[0])
+    builder.add_arrows(names[:-1], names[1:])
+    for i in range(num_steps - 1):
+        later = names[i + 1:]
+        values = rng.sample([0, 1, 2, 'x'], rng.randint(0, 2))
+        builder.add_arrows(
+            [names[i]] * len(values),
+            [rng.choice(later) for value in values], values=values)
+        if rng.random() < 0.3:
+            builder.add_arrow(
+                names[i], rng.choice(later), error=generators.StepFailed)
+    return type(Flow)('OptimizedRandom', (builder.build(),), {},
+                      optimize=True)
+
+
+def check(num_flows, num_steps, num_records, seed):
+    rng = random.Random(seed)
+    failures = folded = 0
+    for i in range(num_flows):
+        flow_cls = make_random_flow(rng, num_steps)
+        folded += len(flow_cls.Meta.optimized.folded)
+        records = [{'n': n, 'trace': []} for n in range(1, num_records + 1)]
+        for record, optimized, unoptimized in compare_engines(
+                flow_cls, records):
+            failures += 1
+            print("mismatch for {!r}:\n  optimized:   {!r}\n"
+                  "  unoptimized: {!r}".format(
+                      record, optimized, unoptimized), file=sys.stderr)
+    print("checked {} flows, {} steps folded, {} mismatches".format(
+        num_flows, folded, failures))
+    return failures
+
+
+def measure(flow_cls, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        flow_cls(count=0)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '-f', '--flows', default=200, type=int,
+        help="Number of random flows to check")
+    parser.add_argument(
+        '-s', '--size', default=10000, type=int,
+        help="Number of steps of the benchmarked chain")
+    parser.add_argument(
+        '--seed', default=0, type=int,
+        help="Seed of random flows")
+    parser.add_argument(
+        '-r', '--repeat', default=5, type=int,
+        help="Number of repetitions (best time is reported)")
+    ns = parser.parse_args()
+    if check(ns.flows, 20, 10, ns.seed):
+        raise SystemExit(1)
+    plain = measure(generators.make_padded_chain(ns.size), ns.repeat)
+    optimized = measure(
+        generators.make_padded_chain(ns.size, optimize=True), ns.repeat)
+    print("unoptimized: {:10.3f}ms".format(plain * 1e3))
+    print("optimized:   {:10.3f}ms".format(optimized * 1e3))
+    print("speedup:     {:10.2f}x".format(plain / optimized))
+
+
+if __name__ == '__main__':
+    main()
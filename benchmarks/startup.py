@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Cold-start cost of importing arrowhead and creating flow classes
+
+This benchmark measures how long ``import arrowhead`` takes in a fresh
+interpreter, checks that modules that are only needed by the command line
+interface, the debugger, visualization and executors are not imported along
+with it and measures how long it takes to create a flow class (per step). It
+exits with an error if any of that goes over the budget.
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+from construction import make_flow
+
+# Modules that programs which only run flows should never import
+DEFERRED = [
+    'argparse', 'asyncio', 'concurrent.futures', 'inspect', 'pdb',
+    'subprocess', 'tempfile', 'arrowhead.main', 'arrowhead.inspector',
+    'arrowhead.executors', 'arrowhead.batch', 'arrowhead.cache',
+]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import arrowhead
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(' '.join(name for name in {!r} if name in sys.modules))
+"""
+
+
+def measure_import(repeat):
+    best = None
+    for i in range(repeat):
+        output = subprocess.check_output(
+            [sys.executable, '-c', PROBE.format(DEFERRED)],
+            universal_newlines=True)
+        elapsed, imported = output.split('\n', 1)
+        elapsed = float(elapsed)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, imported.split()
+
+
+def measure_class_creation(num_steps, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        make_flow(num_steps)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / num_steps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '-s', '--steps', default=300, type=int,
+        help="Number of steps in the generated flow")
+    parser.add_argument(
+        '-r', '--repeat', default=10, type=int,
+        help="Number of repetitions (best time is reported)")
+    parser.add_argument(
+        '--import-budget', default=50, type=float, metavar='MS',
+        help="Maximum time of 'import arrowhead' (in milliseconds)")
+    parser.add_argument(
+        '--step-budget', default=100, type=float, metavar='US',
+        help="Maximum time of creating a flow class, per step"
+        " (in microseconds)")
+    ns = parser.parse_args()
+    import_time, imported = measure_import(ns.repeat)
+    step_time = measure_class_creation(ns.steps, ns.repeat)
+    print("import arrowhead: {:8.2f}ms (budget {}ms)".format(
+        import_time * 1e3, ns.import_budget))
+    print("class creation:   {:8.2f}us per step (budget {}us)".format(
+        step_time * 1e6, ns.step_budget))
+    failed = False
+    if imported:
+        print("deferred modules imported: {}".format(', '.join(imported)))
+        failed = True
+    if import_time * 1e3 > ns.import_budget:
+        print("import time is over the budget")
+        failed = True
+    if step_time * 1e6 > ns.step_budget:
+        print("class creation time is over the budget")
+        failed = True
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
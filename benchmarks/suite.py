@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite of the flow engine on synthetic flows
+
+This benchmark generates chains, wide value-routing fan-outs, error-heavy
+paths and deep inheritance hierarchies (see ``generators.py``) and measures
+class creation (with class statements and with ``FlowBuilder``), instance
+construction, transitions per second of
+``Flow._run()`` and ``Flow._execute()`` and rendering of ``print_dot_graph()``
+and ``print_flow_state()``. Results can be saved as JSON and compared against
+a saved baseline. The comparison fails if any result got slower by more than
+the threshold.
+"""
+import argparse
+import io
+import json
+import platform
+import sys
+import time
+
+from arrowhead.inspector import print_dot_graph
+from arrowhead.inspector import print_flow_state
+
+import generators
+
+
+def measure(func, repeat, count=1):
+    """
+    Measure the best time of running a function
+
+    :param func:
+        function to call
+    :param repeat:
+        number of repetitions
+    :param count:
+        number of units of work done by each call
+    :returns:
+        the best time per unit of work (in seconds)
+    """
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / count
+
+
+def exhaust(flow):
+    for obj in flow._run():
+        pass
+    return flow
+
+
+def bench_chain(size, repeat):
+    yield 'chain.class_creation', measure(
+        lambda: generators.make_chain(size), repeat, size)
+    flow_cls = generators.make_chain(size)
+    yield 'chain.construction', measure(
+        lambda: [flow_cls(autostart=False) for i in range(1000)],
+        repeat, 1000)
+    yield 'chain.run', measure(
+        lambda: exhaust(flow_cls(autostart=False)), repeat, size)
+    yield 'chain.execute', measure(lambda: flow_cls(), repeat, size)
+    yield 'chain.dot_graph', measure(
+        lambda: print_dot_graph(flow_cls, 's0', file=io.StringIO()),
+        repeat, size)
+    flow = exhaust(flow_cls(autostart=False))
+    yield 'chain.flow_state', measure(
+        lambda: print_flow_state(flow, 's0', file=io.StringIO()),
+        repeat, size)
+
+
+def bench_fan_out(size, repeat):
+    yield 'fan_out.class_creation', measure(
+        lambda: generators.make_fan_out(size), repeat, size)
+    flow_cls = generators.make_fan_out(size)
+    choices = [i * 7919 % size for i in range(1000)]
+    yield 'fan_out.run', measure(
+        lambda: [exhaust(flow_cls(autostart=False, choice=choice))
+                 for choice in choices],
+        repeat, 2 * len(choices))
+    yield 'fan_out.execute', measure(
+        lambda: [flow_cls(choice=choice) for choice in choices],
+        repeat, 2 * len(choices))
+
+
+def bench_error_path(size, repeat):
+    yield 'error_path.class_creation', measure(
+        lambda: generators.make_error_path(size), repeat, size)
+    flow_cls = generators.make_error_path(size)
+    yield 'error_path.run', measure(
+        lambda: exhaust(flow_cls(autostart=False)), repeat, size)
+    yield 'error_path.execute', measure(lambda: flow_cls(), repeat, size)
+
+
+def bench_hierarchy(size, repeat, depth=100):
+    base = generators.make_chain(size)
+    yield 'hierarchy.class_creation', measure(
+        lambda: generators.make_hierarchy(base, depth), repeat, depth)
+    flow_cls = generators.make_hierarchy(base, depth)
+    yield 'hierarchy.execute', measure(lambda: flow_cls(), repeat, size)
+
+
+def bench_builder(size, repeat):
+    yield 'builder.build', measure(
+        lambda: generators.build_chain(size), repeat, size)
+    flow_cls = generators.build_chain(size)
+    yield 'builder.execute', measure(lambda: flow_cls(), repeat, size)
+
+
+BENCHMARKS = [
+    ('chain', bench_chain, "seconds per step"),
+    ('fan_out', bench_fan_out, "seconds per step (or transition)"),
+    ('error_path', bench_error_path, "seconds per step"),
+    ('hierarchy', bench_hierarchy, "seconds per derived flow (or step)"),
+    ('builder', bench_builder, "seconds per step"),
+]
+
+
+def run_suite(sizes, repeat, selected):
+    results = {}
+    for name, bench, unit in BENCHMARKS:
+        if selected and name not in selected:
+            continue
+        for size in sizes:
+            for key, value in bench(size, repeat):
+                key = '{}[{}]'.format(key, size)
+                results[key] = value
+                print("{:40} {:12.3f}us".format(key, value * 1e6),
+                      file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with the baseline
+
+    The comparison is printed to stderr, stdout is reserved for results.
+
+    :returns:
+        A list of names of results that regressed
+    """
+    regressed = []
+    print("{:40} {:>12} {:>12} {:>8}".format(
+        "benchmark", "baseline", "current", "change"), file=sys.stderr)
+    for key, value in sorted(results.items()):
+        if key not in baseline:
+            continue
+        change = value / baseline[key] - 1
+        flag = ''
+        if change > threshold:
+            flag = ' REGRESSION'
+            regressed.append(key)
+        print("{:40} {:10.3f}us {:10.3f}us {:+7.1%}{}".format(
+            key, baseline[key] * 1e6, value * 1e6, change, flag),
+            file=sys.stderr)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '-s', '--sizes', default=[100, 1000, 10000], type=int, nargs='+',
+        help="Sizes (number of steps) of generated flows")
+    parser.add_argument(
+        '--large', action='store_true',
+        help="Include flows with 100000 steps")
+    parser.add_argument(
+        '-b', '--bench', action='append', metavar='NAME',
+        choices=[name for name, bench, unit in BENCHMARKS],
+        help="Run only the selected benchmark (may be repeated)")
+    parser.add_argument(
+        '-r', '--repeat', default=3, type=int,
+        help="Number of repetitions (best time is reported)")
+    parser.add_argument(
+        '-o', '--output', metavar='FILE',
+        help="Save results to a JSON file")
+    parser.add_argument(
+        '--baseline', metavar='FILE',
+        help="Compare results with a JSON file saved earlier")
+    parser.add_argument(
+        '-t', '--threshold', default=0.1, type=float,
+        help="Relative slowdown that counts as a regression (default 0.1)")
+    ns = parser.parse_args()
+    sizes = list(ns.sizes)
+    if ns.large and 100000 not in sizes:
+        sizes.append(100000)
+    results = run_suite(sizes, ns.repeat, ns.bench)
+    document = {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'unit': 'seconds',
+        'units': {name: unit for name, bench, unit in BENCHMARKS},
+        'results': results,
+    }
+    if ns.output:
+        with open(ns.output, 'wt') as stream:
+            json.dump(document, stream, indent=2, sort_keys=True)
+    else:
+        json.dump(document, sys.stdout, indent=2, sort_keys=True)
+        print()
+    if ns.baseline:
+        with open(ns.baseline, 'rt') as stream:
+            baseline = json.load(stream)['results']
+        regressed = compare(results, baseline, ns.threshold)
+        if regressed:
+            raise SystemExit("{} benchmark(s) regressed by more than {:.0%}"
+                             .format(len(regressed), ns.threshold))
+
+
+if __name__ == '__main__':
+    main()
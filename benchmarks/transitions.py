@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Transitions per second of the flow engine
+
+This benchmark runs a two-step loop, just like ``examples/infinite.py``, except
+that it stops after a fixed number of round trips. The same flow is executed
+by exhausting the observable ``Flow._run()`` generator (which is what the
+viewers and the pdb support use) and by the headless ``Flow._execute()`` loop
+that is used when the flow is started automatically.
+"""
+import argparse
+import time
+
+from arrowhead import Flow, step, arrow
+
+
+class CountDown(Flow):
+
+    @step(initial=True)
+    @arrow('b')
+    def a(step, flow):
+        flow.n -= 1
+
+    @step
+    @arrow('done', value=0)
+    @arrow('a')
+    def b(step, flow):
+        return flow.n
+
+    @step(accepting=True)
+    def done(step):
+        pass
+
+
+def observed(n):
+    flow = CountDown(autostart=False, n=n)
+    for obj in flow._run():
+        pass
+
+
+def headless(n):
+    CountDown(n=n)
+
+
+def measure(func, n, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(n)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    # each round trip is two transitions, plus the final one to 'done'
+    return (2 * n + 1) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        '-n', default=100000, type=int,
+        help="Number of round trips through the loop")
+    parser.add_argument(
+        '-r', '--repeat', default=5, type=int,
+        help="Number of repetitions (best time is reported)")
+    ns = parser.parse_args()
+    baseline = measure(observed, ns.n, ns.repeat)
+    fast = measure(headless, ns.n, ns.repeat)
+    print("Flow._run():     {:12,.0f} transitions/s".format(baseline))
+    print("Flow._execute(): {:12,.0f} transitions/s".format(fast))
+    print("speedup:         {:12.2f}x".format(fast / baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+import asyncio
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.core import Step
+from arrowhead.errors import FlowIsAsynchronous
+
+
+class Fetch(Flow):
+
+    @step(initial=True)
+    @arrow('fetch')
+    def start(step, flow):
+        flow.log.append((flow.name, 'start'))
+
+    @step
+    @arrow('parse', value=True)
+    @arrow('timeout', error=asyncio.TimeoutError)
+    async def fetch(step, flow):
+        flow.log.append((flow.name, 'fetch'))
+        await flow.ready.wait()
+        if flow.fail:
+            raise asyncio.TimeoutError()
+        return True
+
+    @step(accepting=True)
+    def parse(step, flow):
+        flow.log.append((flow.name, 'parse'))
+        return flow.name.upper()
+
+    @step(accepting=True)
+    async def timeout(step, flow):
+        return 'timeout'
+
+
+class Sync(Flow):
+
+    @step(initial=True, accepting=True)
+    def start(step):
+        return 'sync'
+
+
+def make_flow(name, log, fail=False):
+    flow = Fetch(autostart=False, name=name, log=log, fail=fail)
+    flow.ready = asyncio.Event()
+    flow.ready.set()
+    return flow
+
+
+class AsyncFlowTests(unittest.TestCase):
+
+    def test_async_steps_are_flagged(self):
+        self.assertTrue(Fetch.Meta.steps['fetch'].Meta.is_async)
+        self.assertFalse(Fetch.Meta.steps['parse'].Meta.is_async)
+        self.assertTrue(Fetch.Meta.is_async)
+        self.assertFalse(Sync.Meta.is_async)
+
+        class Derived(Fetch):
+            pass
+
+        class Mixed(Sync):
+
+            @step(initial=True, accepting=True)
+            async def start(step):
+                return 'async'
+
+        self.assertTrue(Derived.Meta.is_async)
+        self.assertTrue(Mixed.Meta.is_async)
+
+    def test_sync_execution_is_refused(self):
+        with self.assertRaises(FlowIsAsynchronous):
+            Fetch(name='a', log=[], fail=False)
+        flow = Fetch(autostart=False, name='a', log=[], fail=False)
+        with self.assertRaises(FlowIsAsynchronous):
+            flow.run()
+        with self.assertRaises(FlowIsAsynchronous):
+            next(flow._run())
+
+    def test_vectorized_steps_cannot_be_async(self):
+        with self.assertRaises(TypeError):
+            @step(vectorized=True)
+            async def compute(step):
+                pass
+
+    def test_coroutines_are_awaited(self):
+        flow = make_flow('a', [])
+        self.assertEqual(asyncio.run(flow.run_async()), 'A')
+        self.assertIs(getattr(flow.fetch, 'return'), True)
+        self.assertEqual(getattr(flow, 'return'), 'A')
+
+    def test_errors_in_coroutines_follow_error_arrows(self):
+        flow = make_flow('a', [], fail=True)
+        self.assertEqual(asyncio.run(flow.run_async()), 'timeout')
+        self.assertIsInstance(
+            getattr(flow.fetch, 'raise'), asyncio.TimeoutError)
+
+    def test_sync_flows_run_async(self):
+        flow = Sync(autostart=False)
+        self.assertEqual(asyncio.run(flow.run_async()), 'sync')
+
+    def test_flows_run_concurrently(self):
+        log = []
+
+        async def main():
+            first = make_flow('a', log)
+            second = make_flow('b', log)
+            first.ready.clear()
+            task = asyncio.ensure_future(first.run_async())
+            # Let the first flow run until it waits
+            await asyncio.sleep(0)
+            result = await second.run_async()
+            first.ready.set()
+            return [await task, result]
+
+        self.assertEqual(asyncio.run(main()), ['A', 'B'])
+        # The second flow ran while the first one was waiting
+        self.assertEqual(log, [
+            ('a', 'start'), ('a', 'fetch'),
+            ('b', 'start'), ('b', 'fetch'), ('b', 'parse'),
+            ('a', 'parse')])
+
+    def test_observable_execution(self):
+        async def observe(flow):
+            return [obj.Meta.name async for obj in flow._run_async()
+                    if isinstance(obj, Step)]
+
+        flow = make_flow('a', [])
+        self.assertEqual(
+            asyncio.run(observe(flow)), ['start', 'fetch', 'parse'])
+        self.assertEqual(getattr(flow, 'return'), 'A')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+from unittest import mock
+
+from arrowhead import Flow, step, arrow
+from arrowhead.batch import make_column
+from arrowhead.batch import numpy
+from arrowhead.cache import ResultCache
+from arrowhead.errors import NumPyNotInstalled
+from arrowhead.errors import TransitionBudgetExceeded
+from arrowhead.limits import FlowLimits
+
+
+def make_area_flow():
+    class Area(Flow):
+
+        @step(initial=True, vectorized=True)
+        @arrow('big', value=True)
+        @arrow('small', value=False)
+        @arrow('invalid', error=ValueError)
+        def is_big(step, flow):
+            if (flow.width < 0).any():
+                raise ValueError("negative width")
+            flow.size = flow.width * flow.height
+            return flow.size > 100
+
+        @step(accepting=True)
+        def big(step, flow):
+            return ('big', flow.size)
+
+        @step(accepting=True, vectorized=True)
+        def small(step, flow):
+            return flow.size * -1
+
+        @step(accepting=True)
+        def invalid(step, flow):
+            return 'invalid'
+
+    return Area
+
+
+RECORDS = [
+    {'width': 10, 'height': 20},
+    {'width': 3, 'height': 4},
+    {'width': 11, 'height': 10},
+    {'width': 1, 'height': 1},
+]
+
+
+class Counter(Flow):
+
+    @step(initial=True)
+    @arrow('count')
+    def count(step, flow):
+        flow.n += 1
+
+
+class BatchTests(unittest.TestCase):
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_vectorized_steps_match_the_scalar_engine(self):
+        Area = make_area_flow()
+        expected = [getattr(Area(**record), 'return') for record in RECORDS]
+        self.assertEqual(expected, [('big', 200), -12, ('big', 110), -1])
+        self.assertEqual(Area.run_many(RECORDS), expected)
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_vectorized_error_is_the_outcome_of_the_group(self):
+        Area = make_area_flow()
+        records = RECORDS + [{'width': -1, 'height': 1}]
+        self.assertEqual(getattr(Area(**records[-1]), 'return'), 'invalid')
+        self.assertEqual(Area.run_many(records), ['invalid'] * len(records))
+
+    def test_vectorized_steps_require_numpy(self):
+        with mock.patch('arrowhead.batch.numpy', None):
+            with self.assertRaises(NumPyNotInstalled):
+                make_area_flow()
+            with self.assertRaises(NumPyNotInstalled):
+                make_column([1, 2])
+
+    def test_flows_with_limits_are_limited(self):
+        class Limited(Counter, limits=FlowLimits(max_transitions=5)):
+            pass
+        with self.assertRaises(TransitionBudgetExceeded):
+            Limited.run_many([{'n': 0}])
+
+    def test_flows_with_cache_use_it(self):
+        cache = ResultCache()
+
+        class Cached(Flow, cache=cache):
+
+            @step(initial=True, accepting=True)
+            def double(step, flow):
+                return flow.x * 2
+
+        self.assertEqual(Cached.run_many([{'x': 1}, {'x': 1}]), [2, 2])
+        self.assertEqual((cache.misses, cache.hits), (1, 1))
+
+    def test_compiled_flows_run_compiled(self):
+        class Compiled(Flow, compiled=True):
+
+            @step(initial=True, accepting=True)
+            def double(step, flow):
+                return flow.x * 2
+
+        self.assertEqual(Compiled.run_many([{'x': 1}, {'x': 2}]), [2, 4])
+        self.assertIn('compiled_flow', Compiled.Meta.__dict__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.builder import FlowBuilder
+from arrowhead.errors import ConflictingArrow
+
+# Arrows of the step 'start', as keyword arguments of arrow()
+CONFLICTS = [
+    ('normal', [{}, {}]),
+    ('value', [{'value': 1}, {'value': 1}]),
+    ('error', [{'error': ValueError}, {'error': ValueError}]),
+]
+
+ALLOWED = [
+    ('values', [{'value': 1}, {'value': 2}, {}]),
+    ('unhashable', [{'value': []}, {'value': []}]),
+    ('errors', [{'error': ValueError}, {'error': KeyError}]),
+]
+
+
+def make_class(arrows):
+    def start(step):
+        pass
+    for kwargs in arrows:
+        start = arrow('end', **kwargs)(start)
+    return type('Declared', (Flow,), {
+        'start': step(initial=True)(start),
+        'end': step(accepting=True)(lambda step: None),
+    })
+
+
+def build_class(arrows):
+    builder = FlowBuilder('Built')
+    builder.add_step('start', initial=True)
+    builder.add_step('end', accepting=True)
+    for kwargs in arrows:
+        builder.add_arrow('start', 'end', **kwargs)
+    return builder.build()
+
+
+class ArrowValidationTests(unittest.TestCase):
+
+    def test_conflicting_arrows_are_rejected_by_both(self):
+        for kind, arrows in CONFLICTS:
+            for factory in (make_class, build_class):
+                with self.subTest(kind=kind, factory=factory.__name__):
+                    with self.assertRaises(ConflictingArrow):
+                        factory(arrows)
+
+    def test_distinct_arrows_are_accepted_by_both(self):
+        for kind, arrows in ALLOWED:
+            for factory in (make_class, build_class):
+                with self.subTest(kind=kind, factory=factory.__name__):
+                    self.assertEqual(
+                        len(factory(arrows).start.Meta.arrows), len(arrows))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.cache import ResultCache
+
+
+class CacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_steps_sharing_cache_dir_have_separate_keys(self):
+        directory = self.directory
+
+        class Twins(Flow):
+
+            @step(initial=True, cache='x', cache_dir=directory)
+            @arrow('b')
+            def a(step, flow):
+                flow.y = 'a'
+                return 'a'
+
+            @step(cache='x', cache_dir=directory)
+            @arrow('done')
+            def b(step, flow):
+                flow.z = 'b'
+                return 'b'
+
+            @step(accepting=True)
+            def done(step, flow):
+                return (flow.a.result().value, flow.b.result().value)
+
+        flow = Twins(x=1)
+        self.assertEqual(getattr(flow, 'return'), ('a', 'b'))
+        self.assertEqual(flow.z, 'b')
+
+    def test_flows_sharing_cache_have_separate_keys(self):
+        cache = ResultCache(directory=self.directory)
+
+        class One(Flow, cache=cache):
+
+            @step(initial=True, accepting=True)
+            def run(step):
+                return 1
+
+        class Two(Flow, cache=cache):
+
+            @step(initial=True, accepting=True)
+            def run(step):
+                return 2
+
+        self.assertEqual(getattr(One(x=1), 'return'), 1)
+        self.assertEqual(getattr(Two(x=1), 'return'), 2)
+        # Both tiers, the memory tier is dropped here
+        cache._entries.clear()
+        self.assertEqual(getattr(Two(x=1), 'return'), 2)
+        self.assertEqual(cache.disk_hits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import collections
+import types
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.checker import GraphIndex
+from arrowhead.checker import get_graph_index
+from arrowhead.core import ValueArrow
+from arrowhead.errors import NoSuchStep
+
+
+def make_index(edges, accepting=()):
+    """
+    Make the index of a graph that flow classes would reject
+
+    :param edges:
+        A dictionary mapping step names to names of their successors, the
+        first step is initial
+    """
+    step_ids = collections.OrderedDict()
+    for name, targets in edges.items():
+        step_ids.setdefault(name, len(step_ids))
+        for target in targets:
+            step_ids.setdefault(target, len(step_ids))
+    step_classes = [
+        types.SimpleNamespace(Meta=types.SimpleNamespace(
+            accepting=name in accepting,
+            arrows=[ValueArrow(target, index)
+                    for index, target in enumerate(edges.get(name, ()))]))
+        for name in step_ids]
+    return GraphIndex(types.SimpleNamespace(
+        step_ids=step_ids, initial_id=0, step_classes=step_classes))
+
+
+class Diamond(Flow):
+
+    @step(initial=True)
+    @arrow('left', value='left')
+    @arrow('right', value='right')
+    def start(step, flow):
+        return flow.side
+
+    @step
+    @arrow('join')
+    def left(step):
+        pass
+
+    @step
+    @arrow('join')
+    def right(step):
+        pass
+
+    @step
+    @arrow('end')
+    def join(step):
+        pass
+
+    @step(accepting=True)
+    def end(step):
+        pass
+
+
+class CycleTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = make_index({
+            'a': ['b'], 'b': ['c'], 'c': ['a', 'd'], 'd': []},
+            accepting=['d'])
+
+    def test_components(self):
+        self.assertEqual(self.index.components, (('d',), ('a', 'b', 'c')))
+        self.assertEqual(
+            {self.index.component_of(name) for name in 'abc'}, {1})
+        self.assertEqual(self.index.component_of('d'), 0)
+
+    def test_dominators(self):
+        self.assertEqual(
+            [self.index.immediate_dominator(name) for name in 'abcd'],
+            [None, 'a', 'b', 'c'])
+        self.assertTrue(self.index.dominates('b', 'd'))
+        self.assertFalse(self.index.dominates('d', 'b'))
+
+    def test_dead_ends(self):
+        self.assertEqual(self.index.dead_ends(), [])
+
+    def test_unknown_step(self):
+        with self.assertRaises(NoSuchStep):
+            self.index.component_of('e')
+
+
+class DiamondTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = get_graph_index(Diamond)
+
+    def test_index_is_cached(self):
+        self.assertIs(get_graph_index(Diamond(autostart=False)), self.index)
+
+    def test_components(self):
+        self.assertEqual(
+            sorted(self.index.components), [
+                ('end',), ('join',), ('left',), ('right',), ('start',)])
+        self.assertEqual(self.index.components[0], ('end',))
+        self.assertEqual(self.index.components[-1], ('start',))
+
+    def test_dominators(self):
+        self.assertEqual(self.index.immediate_dominator('join'), 'start')
+        self.assertEqual(self.index.immediate_dominator('left'), 'start')
+        self.assertEqual(self.index.immediate_dominator('end'), 'join')
+        self.assertTrue(self.index.dominates('start', 'end'))
+        self.assertTrue(self.index.dominates('join', 'join'))
+        self.assertFalse(self.index.dominates('left', 'join'))
+
+    def test_paths(self):
+        path = self.index.shortest_path('start', 'end')
+        self.assertIn(path, [
+            ['start', 'left', 'join', 'end'],
+            ['start', 'right', 'join', 'end']])
+        self.assertIsNone(self.index.shortest_path('end', 'start'))
+        self.assertEqual(self.index.dead_ends(), [])
+
+
+class UnreachableAcceptingStepTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = make_index({
+            'start': ['loop'], 'loop': ['loop'], 'done': []},
+            accepting=['done'])
+
+    def test_dead_ends(self):
+        self.assertEqual(self.index.dead_ends(), ['start', 'loop'])
+        self.assertTrue(self.index.can_reach_accepting('done'))
+        self.assertFalse(self.index.can_reach_accepting('loop'))
+
+    def test_dominators(self):
+        self.assertIsNone(self.index.immediate_dominator('done'))
+        self.assertFalse(self.index.dominates('start', 'done'))
+        self.assertTrue(self.index.dominates('start', 'loop'))
+
+    def test_components(self):
+        self.assertEqual(
+            sorted(self.index.components),
+            [('done',), ('loop',), ('start',)])
+        self.assertEqual(
+            self.index.reachable_from('start'), frozenset(['start', 'loop']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import types
+import unittest
+
+from arrowhead import Flow, step, arrow
+
+
+class AnyLetter:
+    """
+    Unhashable value that is equal to any single letter
+    """
+
+    __hash__ = None
+
+    def __eq__(self, other):
+        return isinstance(other, str) and len(other) == 1
+
+
+class Router(Flow):
+
+    @step(initial=True)
+    @arrow('one', value=1)
+    @arrow('letter', value='a')
+    @arrow('empty', value=None)
+    @arrow('pair', value=[1, 2])
+    @arrow('other', error=Exception)
+    @arrow('lookup', error=LookupError)
+    @arrow('key', error=KeyError)
+    @arrow('rest')
+    def start(step, flow):
+        if isinstance(flow.outcome, Exception):
+            raise flow.outcome
+        return flow.outcome
+
+    @step(accepting=True)
+    def one(step):
+        return 'one'
+
+    @step(accepting=True)
+    def letter(step):
+        return 'letter'
+
+    @step(accepting=True)
+    def empty(step):
+        return 'empty'
+
+    @step(accepting=True)
+    def pair(step):
+        return 'pair'
+
+    @step(accepting=True)
+    def lookup(step):
+        return 'lookup'
+
+    @step(accepting=True)
+    def key(step):
+        return 'key'
+
+    @step(accepting=True)
+    def other(step):
+        return 'other'
+
+    @step(accepting=True)
+    def rest(step):
+        return 'rest'
+
+
+VALUES = [1, True, 1.0, 2, 'a', 'b', None, [1, 2], [1], (1, 2), {},
+          AnyLetter()]
+
+ERRORS = [LookupError(), KeyError(), IndexError(), ValueError()]
+
+
+def follow_each_arrow(arrows, value=None, exc=None):
+    """
+    Find the arrow that checking each arrow in turn would follow
+    """
+    step = types.SimpleNamespace()
+    if exc is not None:
+        setattr(step, 'raise', exc)
+    else:
+        setattr(step, 'return', value)
+    for candidate in arrows:
+        if candidate.should_follow(step):
+            return candidate
+
+
+class ArrowTableTests(unittest.TestCase):
+
+    def setUp(self):
+        meta = Router.Meta
+        self.arrows = meta.steps['start'].Meta.arrows
+        self.table = meta.dispatch[meta.step_ids['start']]
+        self.step_ids = meta.step_ids
+
+    def assertRoute(self, route, arrow):
+        self.assertIsNotNone(route)
+        target_id, routed_arrow = route
+        self.assertIs(routed_arrow, arrow)
+        self.assertEqual(target_id, self.step_ids[arrow.target])
+
+    def test_values_follow_the_same_arrow(self):
+        for value in VALUES:
+            with self.subTest(value=value):
+                self.assertRoute(
+                    self.table.follow_value(value),
+                    follow_each_arrow(self.arrows, value=value))
+
+    def test_errors_follow_the_same_arrow(self):
+        for exc in ERRORS:
+            with self.subTest(exc=exc):
+                self.assertRoute(
+                    self.table.follow_error(exc),
+                    follow_each_arrow(self.arrows, exc=exc))
+
+    def test_unhandled_errors_have_no_route(self):
+        self.assertIsNone(self.table.follow_error(KeyboardInterrupt()))
+
+    def test_table_layout(self):
+        self.assertEqual(set(self.table.values), {None, 1, 'a'})
+        self.assertEqual(
+            [arrow.value for target_id, arrow in self.table.fallback],
+            [[1, 2]])
+        self.assertEqual(self.table.default[1].target, 'rest')
+        self.assertEqual(
+            [arrow.target for target_id, arrow in self.table.errors],
+            ['key', 'lookup', 'other'])
+
+    def test_flows_follow_the_table(self):
+        for outcome, expected in [
+                (True, 'one'), ('a', 'letter'), (AnyLetter(), 'letter'),
+                ([1, 2], 'pair'), (None, 'empty'), ('b', 'rest'),
+                (KeyError(), 'key'), (IndexError(), 'lookup'),
+                (ValueError(), 'other')]:
+            with self.subTest(outcome=outcome):
+                flow = Router(outcome=outcome)
+                self.assertEqual(getattr(flow, 'return'), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+import asyncio
+import copy
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.batch import run_many
+from arrowhead.compiler import compile_flow
+from arrowhead.hooks import FlowHooks
+from arrowhead.limits import FlowLimits
+from arrowhead.profiler import FlowProfiler
+
+
+class Machine(Flow):
+    """
+    Flow that takes a different route for each item of ``ops``
+    """
+
+    @step(initial=True)
+    @arrow('check')
+    def start(step, flow):
+        flow.pos = 0
+        flow.retries = 0
+
+    # Constant, folded by the optimizer
+    @step
+    @arrow('work', value='go')
+    def check(step):
+        return 'go'
+
+    @step
+    @arrow('lookup', error=LookupError)
+    @arrow('retry', error=KeyError)
+    @arrow('done', value=0)
+    @arrow('big', value=[1])
+    @arrow('work')
+    def work(step, flow):
+        op = flow.ops[flow.pos]
+        flow.pos += 1
+        if op == 'key':
+            raise KeyError(op)
+        if op == 'type':
+            raise TypeError(op)
+        return op
+
+    @step
+    @arrow('work')
+    def retry(step, flow):
+        flow.retries += 1
+
+    @step(accepting=True)
+    def lookup(step, flow):
+        return ('lookup', flow.pos, flow.retries)
+
+    @step(accepting=True)
+    @arrow('done', error=ZeroDivisionError)
+    def big(step, flow):
+        if 'boom' in flow.ops:
+            raise ZeroDivisionError(flow.pos)
+        return ('big', flow.pos)
+
+    @step(accepting=True)
+    def done(step, flow):
+        return ('done', flow.pos, flow.retries)
+
+
+class CompiledMachine(Machine, compiled=True):
+    pass
+
+
+class OptimizedMachine(Machine, optimize=True):
+    pass
+
+
+RECORDS = [
+    {'ops': (0,)},
+    {'ops': ('x', 'key', 'key', 0)},
+    {'ops': ([1],)},
+    {'ops': ([1], 'boom')},
+    {'ops': ('x', 'x')},
+    {'ops': ('key', 'type')},
+    {'ops': ('key', 'x', 'key')},
+    {'ops': ('x',) * 20 + (0,)},
+]
+
+
+class Recorder(FlowHooks):
+
+    def __init__(self):
+        self.events = []
+
+    def on_flow_start(self, flow):
+        self.events.append(('start',))
+
+    def on_step_enter(self, flow, step):
+        self.events.append(('enter', step.Meta.name))
+
+    def on_step_exit(self, flow, step, result):
+        if result.raised:
+            outcome = (type(result.error), str(result.error))
+        else:
+            outcome = result.value
+        self.events.append(('exit', step.Meta.name, outcome))
+
+    def on_arrow(self, flow, step, arrow):
+        self.events.append(('arrow', step.Meta.name, str(arrow)))
+
+    def on_flow_end(self, flow):
+        self.events.append(('end',))
+
+
+def execute(flow):
+    return flow._execute()
+
+
+def interpret(flow):
+    return flow._execute_from(flow.Meta.initial_id, None)
+
+
+def observe(flow):
+    for obj in flow._run():
+        pass
+    return getattr(flow, 'return')
+
+
+def profile(flow):
+    return getattr(FlowProfiler().profile(flow), 'return')
+
+
+def compile_and_run(flow):
+    return compile_flow(type(flow)).run(flow)
+
+
+def run_async(flow):
+    return asyncio.run(flow.run_async())
+
+
+ENGINES = [
+    (Machine, execute),
+    (Machine, interpret),
+    (Machine, observe),
+    (Machine, profile),
+    (Machine, compile_and_run),
+    (Machine, run_async),
+    (CompiledMachine, execute),
+    (OptimizedMachine, execute),
+    (OptimizedMachine, run_async),
+]
+
+# Engines that honour hooks and limits
+OBSERVING_ENGINES = [
+    (Machine, execute),
+    (Machine, observe),
+    (Machine, profile),
+    (Machine, run_async),
+    (CompiledMachine, execute),
+    (OptimizedMachine, execute),
+    (OptimizedMachine, run_async),
+]
+
+
+def get_outcome(flow_cls, run, record, setup=None):
+    flow = flow_cls(autostart=False, **copy.deepcopy(record))
+    if setup is not None:
+        setup(flow)
+    try:
+        outcome = ('return', run(flow))
+    except Exception as exc:
+        outcome = ('raise', type(exc), str(exc))
+    state = {key: value for key, value in flow.__dict__.items()
+             if not key.startswith('_') and key != 'return'}
+    return outcome, state
+
+
+class EngineEquivalenceTests(unittest.TestCase):
+
+    def assertSameOutcomes(self, engines, setup_factory=None):
+        for record in RECORDS:
+            expected = None
+            for flow_cls, run in engines:
+                setup = setup_factory() if setup_factory else None
+                outcome = get_outcome(flow_cls, run, record, setup)
+                if setup is not None:
+                    outcome += (setup.recorder.events,)
+                if expected is None:
+                    expected = outcome
+                    continue
+                with self.subTest(
+                        record=record, engine=run.__name__,
+                        flow=flow_cls.__name__):
+                    self.assertEqual(outcome, expected)
+
+    def test_engines_agree(self):
+        self.assertSameOutcomes(ENGINES)
+
+    def test_batch_engine_agrees(self):
+        for record in RECORDS:
+            with self.subTest(record=record):
+                expected = get_outcome(Machine, execute, record)[0]
+                try:
+                    outcome = ('return', run_many(Machine, [record])[0])
+                except Exception as exc:
+                    outcome = ('raise', type(exc), str(exc))
+                self.assertEqual(outcome, expected)
+
+    def test_engines_agree_with_hooks(self):
+        def setup_factory():
+            def setup(flow):
+                flow.add_hooks(setup.recorder)
+            setup.recorder = Recorder()
+            return setup
+        self.assertSameOutcomes(OBSERVING_ENGINES, setup_factory)
+
+    def test_engines_agree_with_limits(self):
+        def setup_factory():
+            def setup(flow):
+                flow.add_hooks(setup.recorder)
+                flow.set_limits(FlowLimits(max_transitions=6))
+            setup.recorder = Recorder()
+            return setup
+        self.assertSameOutcomes(OBSERVING_ENGINES, setup_factory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+
+from arrowhead import Flow, step, arrow
+from arrowhead.errors import NoArrowCouldHaveBeenFollowed
+from arrowhead.hooks import FlowHooks
+
+
+class Interrupted(Exception):
+    pass
+
+
+class Retry(Flow):
+
+    @step(initial=True)
+    @arrow('attempt')
+    def start(step, flow):
+        flow.attempts = 0
+
+    @step
+    @arrow('failed', error=Interrupted)
+    @arrow('attempt', error=KeyError)
+    @arrow('done', value='ok')
+    def attempt(step, flow):
+        flow.attempts += 1
+        if flow.attempts < flow.succeed_at:
+            raise KeyError(flow.attempts)
+        if flow.attempts > flow.succeed_at:
+            raise Interrupted()
+        return flow.result
+
+    @step(accepting=True)
+    def done(step, flow):
+        return flow.attempts
+
+    @step(accepting=True)
+    def failed(step):
+        return 'failed'
+
+
+def step_outcomes(flow):
+    outcomes = {}
+    for step_name in flow.Meta.steps:
+        step = getattr(flow, step_name)
+        for item in ('return', 'raise'):
+            if hasattr(step, item):
+                value = getattr(step, item)
+                if isinstance(value, BaseException):
+                    value = (type(value), value.args)
+                outcomes[step_name] = (item, value)
+    return outcomes
+
+
+def exhaust(flow):
+    for obj in flow._run():
+        pass
+
+
+class HeadlessExecutionTests(unittest.TestCase):
+
+    def test_autostart_does_not_use_the_generator(self):
+        with mock.patch.object(Flow, '_run') as run:
+            flow = Retry(succeed_at=3, result='ok')
+        run.assert_not_called()
+        self.assertEqual(getattr(flow, 'return'), 3)
+
+    def test_hooks_use_the_generator(self):
+        flow = Retry(autostart=False, succeed_at=1, result='ok')
+        flow.add_hooks(FlowHooks())
+        with mock.patch.object(
+                Flow, '_run', autospec=True, side_effect=Flow._run) as run:
+            self.assertEqual(flow.run(), 1)
+        run.assert_called_once_with(flow)
+
+    def test_step_outcomes_are_the_same(self):
+        for succeed_at in (1, 3):
+            with self.subTest(succeed_at=succeed_at):
+                headless = Retry(succeed_at=succeed_at, result='ok')
+                observed = Retry(
+                    autostart=False, succeed_at=succeed_at, result='ok')
+                exhaust(observed)
+                self.assertEqual(
+                    step_outcomes(headless), step_outcomes(observed))
+                self.assertEqual(
+                    step_outcomes(headless)['attempt'], ('return', 'ok'))
+
+    def test_no_arrow_could_have_been_followed(self):
+        with self.assertRaises(NoArrowCouldHaveBeenFollowed):
+            Retry(succeed_at=1, result='not ok')
+        flow = Retry(autostart=False, succeed_at=1, result='not ok')
+        with self.assertRaises(NoArrowCouldHaveBeenFollowed):
+            exhaust(flow)
+
+    def test_error_arrows_are_followed(self):
+        flow = Retry(autostart=False, succeed_at=0, result='ok')
+        self.assertEqual(flow.run(), 'failed')
+        self.assertIsInstance(getattr(flow.attempt, 'raise'), Interrupted)
+        self.assertFalse(hasattr(flow.attempt, 'return'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import asyncio
+import concurrent.futures
+import threading
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.errors import NoArrowCouldHaveBeenFollowed
+from arrowhead.executors import run_concurrently
+from arrowhead.executors import submit_flows
+
+WORKERS = 4
+
+
+class Square(Flow):
+
+    @step(initial=True)
+    @arrow('square')
+    def start(step, flow):
+        # All flows of a test run at the same time or none of them finishes
+        if flow.barrier is not None:
+            flow.barrier.wait()
+        flow.thread = threading.current_thread().name
+
+    @step(accepting=True)
+    def square(step, flow):
+        if flow.n < 0:
+            raise ValueError(flow.n)
+        return flow.n * flow.n
+
+
+class AsyncSquare(Flow):
+
+    @step(initial=True, accepting=True)
+    async def start(step, flow):
+        await asyncio.sleep(0)
+        return flow.n * flow.n
+
+
+def make_inputs(numbers, barrier=None):
+    return [{'n': n, 'barrier': barrier} for n in numbers]
+
+
+class RunConcurrentlyTests(unittest.TestCase):
+
+    def test_flows_run_concurrently(self):
+        barrier = threading.Barrier(WORKERS, timeout=10)
+        inputs = make_inputs(range(WORKERS), barrier)
+        self.assertEqual(
+            run_concurrently(Square, inputs, max_workers=WORKERS),
+            [0, 1, 4, 9])
+
+    def test_results_are_in_order_of_inputs(self):
+        inputs = make_inputs(range(20))
+        self.assertEqual(
+            run_concurrently(Square, inputs, max_workers=3),
+            [n * n for n in range(20)])
+
+    def test_flows_can_be_returned(self):
+        flows = run_concurrently(
+            Square, make_inputs([2, 3]), max_workers=2, return_flows=True)
+        self.assertEqual([getattr(flow, 'return') for flow in flows], [4, 9])
+        self.assertTrue(all(isinstance(flow, Square) for flow in flows))
+        self.assertNotIn(
+            threading.current_thread().name,
+            [flow.thread for flow in flows])
+
+    def test_errors_escape(self):
+        with self.assertRaises(NoArrowCouldHaveBeenFollowed):
+            run_concurrently(Square, make_inputs([1, -1, 2]))
+
+    def test_async_flows_run_on_their_own_loop(self):
+        self.assertEqual(
+            run_concurrently(AsyncSquare, [{'n': 2}, {'n': 3}]), [4, 9])
+
+    def test_submit_flows(self):
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            futures = submit_flows(executor, Square, make_inputs([1, -1]))
+            self.assertEqual(futures[0].result(), 1)
+            self.assertIsInstance(
+                futures[1].exception(), NoArrowCouldHaveBeenFollowed)
+
+
+class FrozenMetaDataTests(unittest.TestCase):
+
+    def test_flow_meta_data_is_read_only(self):
+        with self.assertRaises(AttributeError):
+            Square.Meta.initial = 'square'
+        with self.assertRaises(AttributeError):
+            del Square.Meta.initial
+        with self.assertRaises(TypeError):
+            Square.Meta.steps['other'] = Square.Meta.steps['start']
+        with self.assertRaises(TypeError):
+            Square.Meta.step_ids['other'] = 2
+
+    def test_step_meta_data_is_read_only(self):
+        start = Square.Meta.steps['start']
+        self.assertIsInstance(start.Meta.arrows, tuple)
+        with self.assertRaises(AttributeError):
+            start.Meta.accepting = True
+        with self.assertRaises(AttributeError):
+            arrow('square')(start)
+        self.assertEqual(len(start.Meta.arrows), 1)
+
+    def test_arrows_can_be_added_before_the_flow_exists(self):
+        @arrow('end', value=False)
+        @step
+        @arrow('end', error=ValueError)
+        def start(step):
+            pass
+        self.assertEqual(
+            [type(item).__name__ for item in start.Meta.arrows],
+            ['ErrorArrow', 'ValueArrow'])
+
+    def test_levels_are_not_stored_in_steps(self):
+        square = Square.Meta.steps['square']
+
+        class Longer(Flow):
+
+            @step(initial=True)
+            @arrow('middle')
+            def start(step):
+                pass
+
+            @step
+            @arrow('square')
+            def middle(step):
+                pass
+
+            # The same step class, at a different level
+            square = Square.square
+
+        self.assertIs(Longer.Meta.steps['square'], square)
+        self.assertEqual(Square.Meta.step_levels['square'], 2)
+        self.assertEqual(Longer.Meta.step_levels['square'], 3)
+        self.assertIsNone(square.Meta.level)
+
+
+if __name__ == '__main__':
+    unittest.main()
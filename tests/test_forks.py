@@ -0,0 +1,65 @@
+import asyncio
+import threading
+import unittest
+
+from arrowhead import Flow, step, arrow
+
+
+class Rendezvous(Flow):
+
+    @step(initial=True)
+    @arrow.fork('left', 'right', join='end', backend='asyncio')
+    def start(step, flow):
+        flow.barrier = threading.Barrier(2, timeout=5)
+
+    @step
+    @arrow('end')
+    def left(step, flow):
+        # Both branches have to run at the same time to get past this
+        flow.barrier.wait()
+        flow.left = 'left'
+
+    @step
+    @arrow('end')
+    def right(step, flow):
+        flow.barrier.wait()
+        flow.right = 'right'
+
+    @step(accepting=True)
+    def end(step, flow):
+        return (flow.left, flow.right)
+
+
+class Mixed(Rendezvous):
+
+    @step
+    @arrow('end')
+    async def right(step, flow):
+        await asyncio.sleep(0)
+        flow.right = 'async right'
+
+    @step
+    @arrow('end')
+    def left(step, flow):
+        flow.left = 'left'
+
+
+class AsyncioForkTests(unittest.TestCase):
+
+    def test_synchronous_branches_run_concurrently(self):
+        flow = Rendezvous()
+        self.assertEqual(getattr(flow, 'return'), ('left', 'right'))
+
+    def test_synchronous_branches_run_concurrently_in_async_flow(self):
+        flow = Rendezvous(autostart=False)
+        self.assertEqual(
+            asyncio.run(flow.run_async()), ('left', 'right'))
+
+    def test_asynchronous_branches_run_on_the_loop(self):
+        flow = Mixed(autostart=False)
+        self.assertEqual(
+            asyncio.run(flow.run_async()), ('left', 'async right'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.hooks import FlowHooks
+
+
+class Counter(Flow):
+
+    @step(initial=True)
+    @arrow('count', value=1)
+    @arrow('count', value=2)
+    @arrow('done', error=ValueError)
+    def count(step, flow):
+        flow.n += 1
+        if flow.n == 3:
+            raise ValueError(flow.n)
+        return flow.n
+
+    @step(accepting=True)
+    def done(step):
+        return 'done'
+
+
+class Recorder(FlowHooks):
+
+    def __init__(self):
+        self.results = []
+
+    def on_step_exit(self, flow, step, result):
+        self.results.append(result)
+
+
+class HookTests(unittest.TestCase):
+
+    def test_step_exit_results_are_not_overwritten(self):
+        recorder = Recorder()
+        flow = Counter(autostart=False, n=0)
+        flow.add_hooks(recorder)
+        flow._execute()
+        self.assertEqual(
+            [(result.value, result.error and result.error.args)
+             for result in recorder.results],
+            [(1, None), (2, None), (None, (3,)), ('done', None)])
+        self.assertIsNot(recorder.results[2], flow.count.result())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import subprocess
+import sys
+import unittest
+
+
+def run_python(code):
+    return subprocess.run(
+        [sys.executable, '-c', code], stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT, universal_newlines=True)
+
+
+class ImportTests(unittest.TestCase):
+
+    def test_main_is_function_after_submodule_import(self):
+        result = run_python(
+            "from arrowhead.main import add_flow_arguments\n"
+            "from arrowhead import main\n"
+            "import arrowhead.main\n"
+            "print(callable(main), main.__module__, arrowhead.main is main)\n")
+        self.assertEqual(result.stdout, "True arrowhead.main True\n")
+
+    def test_main_is_function_when_imported_lazily(self):
+        result = run_python(
+            "import sys\n"
+            "from arrowhead import main\n"
+            "print(callable(main), 'argparse' in sys.modules)\n")
+        self.assertEqual(result.stdout, "True True\n")
+
+    def test_main_is_not_imported_with_package(self):
+        result = run_python(
+            "import sys, arrowhead\n"
+            "print('arrowhead.main' in sys.modules)\n")
+        self.assertEqual(result.stdout, "False\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
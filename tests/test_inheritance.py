@@ -0,0 +1,141 @@
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.core import _FlowMeta
+
+
+class Base(Flow):
+
+    @step(initial=True)
+    @arrow('middle')
+    def start(step):
+        pass
+
+    @step
+    @arrow('end', value=True)
+    @arrow('start', value=False)
+    def middle(step, flow):
+        return flow.done
+
+    @step(accepting=True)
+    def end(step):
+        pass
+
+
+class Overridden(Base):
+
+    # Same arrows, different step function
+    @step
+    @arrow('end', value=True)
+    @arrow('start', value=False)
+    def middle(step, flow):
+        return not flow.done
+
+
+class MoreArrows(Base):
+
+    @step
+    @arrow('end', value=True)
+    @arrow('retry', value=False)
+    @arrow('failed', error=ValueError)
+    def middle(step, flow):
+        return flow.done
+
+    @step
+    @arrow('middle')
+    def retry(step):
+        pass
+
+    @step(accepting=True)
+    def failed(step):
+        pass
+
+
+class Forked(MoreArrows):
+
+    @step(initial=True)
+    @arrow.fork('left', 'right', join='middle')
+    def start(step):
+        pass
+
+    @step
+    @arrow('middle')
+    def left(step):
+        pass
+
+    @step
+    @arrow('middle')
+    def right(step):
+        pass
+
+
+class ForkOverridden(Forked):
+
+    @step
+    @arrow('deeper')
+    def left(step):
+        pass
+
+    @step
+    @arrow('middle')
+    def deeper(step):
+        pass
+
+
+class Rerouted(Base):
+
+    # The new start step comes before middle among predecessors of end
+    @step(initial=True)
+    @arrow('middle', value=True)
+    @arrow('end', value=False)
+    def start(step, flow):
+        return flow.slow
+
+
+class Reassigned(Base):
+
+    end = Base.end
+
+
+def describe(graph):
+    steps, step_ids, step_levels, dispatch, forks, preds = graph
+    tables = [
+        (table.errors, table.values, table.fallback, table.default)
+        for table in dispatch]
+    return (
+        list(steps.items()), dict(step_ids), dict(step_levels), tables,
+        dict(forks), dict(preds))
+
+
+class DeriveGraphTests(unittest.TestCase):
+
+    def test_derived_graph_matches_full_rebuild(self):
+        for flow_cls in (Overridden, MoreArrows, Forked, ForkOverridden,
+                         Rerouted, Reassigned):
+            with self.subTest(flow=flow_cls.__name__):
+                base, = flow_cls.__bases__
+                meta = flow_cls.Meta
+                derived = _FlowMeta._derive_graph(
+                    base.Meta, dict(meta.own_steps), meta.initial)
+                built = _FlowMeta._build_graph(
+                    [base], dict(meta.own_steps), meta.initial)
+                self.assertEqual(describe(derived), describe(built))
+
+    def test_flows_use_the_derived_graph(self):
+        meta = ForkOverridden.Meta
+        built = _FlowMeta._build_graph(
+            [Forked], dict(meta.own_steps), meta.initial)
+        self.assertEqual(
+            describe((meta.steps, meta.step_ids, meta.step_levels,
+                      meta.dispatch, meta.forks, meta.predecessors)),
+            describe(built))
+
+    def test_predecessors_are_in_the_order_of_steps(self):
+        self.assertEqual(Base.Meta.predecessors['end'], ('middle',))
+        self.assertEqual(
+            Rerouted.Meta.predecessors['end'], ('start', 'middle'))
+        self.assertNotIn('start', MoreArrows.Meta.predecessors)
+
+
+if __name__ == '__main__':
+    unittest.main()
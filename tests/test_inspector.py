@@ -0,0 +1,300 @@
+import io
+import json
+import os
+import runpy
+import subprocess
+import unittest
+from unittest import mock
+from xml.etree import ElementTree
+
+from arrowhead import Flow, step, arrow
+from arrowhead.cache import ResultCache
+from arrowhead.core import Step
+from arrowhead.errors import GraphvizNotInstalled
+from arrowhead.inspector import FlowChangePrinter
+from arrowhead.inspector import _make_dot_template
+from arrowhead.inspector import export_graphml
+from arrowhead.inspector import export_json
+from arrowhead.inspector import get_graph_hash
+from arrowhead.inspector import print_dot_graph
+from arrowhead.inspector import render_graph
+
+EXAMPLES = os.path.join(os.path.dirname(__file__), os.pardir, 'examples')
+
+GRAPHML = '{http://graphml.graphdrawing.org/xmlns}'
+
+
+class Frame:
+    """
+    Large object with an expensive repr
+    """
+
+    reprs = lens = 0
+
+    def __len__(self):
+        Frame.lens += 1
+        return 1000000
+
+    def __repr__(self):
+        Frame.reprs += 1
+        return 'Frame(...)'
+
+
+class Fill(Flow):
+
+    @step(initial=True)
+    @arrow('fill')
+    def start(step, flow):
+        flow.frame = Frame()
+        flow.items = []
+
+    @step
+    @arrow('fill', value=True)
+    @arrow('done', value=False)
+    def fill(step, flow):
+        flow.items.append(len(flow.items))
+        return len(flow.items) < 3
+
+    @step(accepting=True)
+    def done(step, flow):
+        pass
+
+
+class FlowChangePrinterTests(unittest.TestCase):
+
+    def test_large_objects_are_not_formatted_again(self):
+        Frame.reprs = Frame.lens = 0
+        file = io.StringIO()
+        printer = FlowChangePrinter(file)
+        flow = Fill(autostart=False)
+        for obj in flow._run():
+            if isinstance(obj, Step):
+                printer.update(flow, obj.Meta.name)
+        printer.update(flow)
+        output = file.getvalue()
+        self.assertEqual((Frame.reprs, Frame.lens), (0, 1))
+        self.assertEqual(output.count("frame: <Frame len:1000000>"), 1)
+        # Lists changed in place are shown again
+        for line in ["items: []", "items: [0]", "items: [0, 1]",
+                     "items: [0, 1, 2]"]:
+            self.assertEqual(output.count(line + "\n"), 1, line)
+
+
+class Fork(Flow):
+
+    @step(initial=True)
+    @arrow.fork('left', 'right', join='join')
+    def start(step):
+        pass
+
+    @step
+    @arrow('join')
+    def left(step):
+        pass
+
+    @step
+    @arrow('join')
+    def right(step):
+        pass
+
+    @step(accepting=True)
+    def join(step):
+        pass
+
+
+class ExporterTests(unittest.TestCase):
+
+    def setUp(self):
+        namespace = runpy.run_path(os.path.join(EXAMPLES, 'tutorial3.py'))
+        self.CoinToss = namespace['CoinToss']
+
+    def _export_json(self, flow_cls):
+        file = io.StringIO()
+        export_json(flow_cls, file)
+        return json.loads(file.getvalue())
+
+    def _export_graphml(self, flow_cls):
+        file = io.StringIO()
+        export_graphml(flow_cls, file)
+        root = ElementTree.fromstring(file.getvalue().encode('UTF-8'))
+        self.assertEqual(root.tag, GRAPHML + 'graphml')
+        graph = root.find(GRAPHML + 'graph')
+        nodes = {
+            node.get('id'): {
+                data.get('key'): data.text for data in node}
+            for node in graph.iter(GRAPHML + 'node')}
+        edges = [
+            (edge.get('source'), edge.get('target'), {
+                data.get('key'): data.text for data in edge})
+            for edge in graph.iter(GRAPHML + 'edge')]
+        return graph.get('id'), nodes, edges
+
+    def test_json(self):
+        document = self._export_json(self.CoinToss)
+        self.assertEqual(document['name'], 'CoinToss')
+        self.assertEqual(document['initial'], 'toss_a_coin')
+        steps = {step['name']: step for step in document['steps']}
+        self.assertEqual(
+            set(steps), {'toss_a_coin', 'heads', 'tails', 'edge'})
+        self.assertTrue(steps['toss_a_coin']['initial'])
+        self.assertFalse(steps['toss_a_coin']['accepting'])
+        self.assertTrue(steps['heads']['accepting'])
+        self.assertFalse(steps['heads']['initial'])
+        self.assertEqual(steps['toss_a_coin']['arrows'], [
+            {'kind': 'error', 'target': 'edge',
+             'error': '{}.CoinFellOnTheEdge'.format(
+                 self.CoinToss.__module__)},
+            {'kind': 'value', 'target': 'tails', 'value': 'tails'},
+            {'kind': 'value', 'target': 'heads', 'value': 'heads'},
+        ])
+        self.assertEqual(steps['edge']['arrows'], [
+            {'kind': 'normal', 'target': 'toss_a_coin'}])
+
+    def test_json_fork(self):
+        steps = self._export_json(Fork)['steps']
+        self.assertEqual(steps[0]['arrows'], [
+            {'kind': 'fork', 'target': 'join',
+             'branches': ['left', 'right']}])
+
+    def test_graphml(self):
+        name, nodes, edges = self._export_graphml(self.CoinToss)
+        self.assertEqual(name, 'CoinToss')
+        self.assertEqual(
+            set(nodes), {'toss_a_coin', 'heads', 'tails', 'edge'})
+        self.assertEqual(nodes['toss_a_coin']['initial'], 'true')
+        self.assertEqual(nodes['toss_a_coin']['accepting'], 'false')
+        self.assertEqual(nodes['tails']['accepting'], 'true')
+        self.assertEqual(nodes['tails']['initial'], 'false')
+        kinds = sorted(
+            (source, target, data['kind']) for source, target, data in edges)
+        self.assertEqual(kinds, [
+            ('edge', 'toss_a_coin', 'normal'),
+            ('toss_a_coin', 'edge', 'error'),
+            ('toss_a_coin', 'heads', 'value'),
+            ('toss_a_coin', 'tails', 'value'),
+        ])
+        values = {target: data.get('value') for source, target, data in edges}
+        self.assertEqual(values['heads'], "'heads'")
+        self.assertIsNone(values['toss_a_coin'])
+
+    def test_graphml_fork(self):
+        name, nodes, edges = self._export_graphml(Fork)
+        self.assertEqual(
+            sorted((source, target, data['kind'])
+                   for source, target, data in edges), [
+                ('left', 'join', 'normal'),
+                ('right', 'join', 'normal'),
+                ('start', 'join', 'join'),
+                ('start', 'left', 'fork'),
+                ('start', 'right', 'fork'),
+            ])
+
+
+def make_quoted_flow(label):
+    class Quoted(Flow):
+
+        @step(initial=True, label=label)
+        @arrow('end')
+        def start(step):
+            pass
+
+        @step(accepting=True)
+        def end(step):
+            pass
+
+    return Quoted
+
+
+def get_dot_graph(flow, active_step_name=None):
+    file = io.StringIO()
+    print_dot_graph(flow, active_step_name, file)
+    return file.getvalue()
+
+
+class DotGraphTests(unittest.TestCase):
+
+    def test_description_is_generated_once(self):
+        Quoted = make_quoted_flow('Start')
+        with mock.patch('arrowhead.inspector._make_dot_template',
+                        wraps=_make_dot_template) as make:
+            for active_step_name in (None, 'start', 'end', None):
+                get_dot_graph(Quoted, active_step_name)
+            get_dot_graph(Quoted(autostart=False), 'end')
+        self.assertEqual(make.call_count, 1)
+
+    def test_only_the_active_node_is_highlighted(self):
+        # Labels with quotes and non-ASCII text come before the active node
+        Quoted = make_quoted_flow('Say "cześć"')
+        plain = get_dot_graph(Quoted).splitlines()
+        self.assertIn('\tstart [shape=box, label="Say \\"cześć\\""];',
+                      plain)
+        for active_step_name, line in [
+                ('end', '\tend [shape=box, label="end", style=filled,'
+                 ' fillcolor=blue, fontcolor=white];'),
+                ('_start', '\t_start [shape=circle, style=filled,'
+                 ' fillcolor=blue, label=""];')]:
+            with self.subTest(active_step_name=active_step_name):
+                active = get_dot_graph(Quoted, active_step_name).splitlines()
+                self.assertEqual(len(active), len(plain))
+                changed = [index for index, (old, new)
+                           in enumerate(zip(plain, active)) if old != new]
+                self.assertEqual(len(changed), 1)
+                self.assertEqual(active[changed[0]], line)
+
+    def test_unknown_active_step_is_ignored(self):
+        self.assertEqual(get_dot_graph(Fork, 'missing'), get_dot_graph(Fork))
+
+    def test_graph_hash(self):
+        first = make_quoted_flow('Start')
+        self.assertEqual(
+            get_graph_hash(first), get_graph_hash(make_quoted_flow('Start')))
+        self.assertEqual(get_graph_hash(first(autostart=False)),
+                         get_graph_hash(first))
+        self.assertNotEqual(
+            get_graph_hash(first), get_graph_hash(make_quoted_flow('Go')))
+        self.assertNotEqual(get_graph_hash(first), get_graph_hash(Fork))
+
+
+class RenderGraphTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResultCache()
+        patcher = mock.patch('subprocess.run', side_effect=self._run_dot)
+        self.run = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _run_dot(self, args, input, **kwargs):
+        return subprocess.CompletedProcess(
+            args, 0, stdout=b' '.join([args[-1].encode('ascii'), input]))
+
+    def test_images_are_cached(self):
+        image = render_graph(Fork, cache=self.cache)
+        self.assertEqual(
+            image, b'-Tsvg ' + get_dot_graph(Fork).encode('UTF-8'))
+        self.assertEqual(render_graph(Fork, cache=self.cache), image)
+        self.assertEqual(self.run.call_count, 1)
+
+    def test_images_are_cached_by_structure(self):
+        render_graph(make_quoted_flow('Start'), cache=self.cache)
+        render_graph(make_quoted_flow('Start'), cache=self.cache)
+        self.assertEqual(self.run.call_count, 1)
+        render_graph(make_quoted_flow('Go'), cache=self.cache)
+        self.assertEqual(self.run.call_count, 2)
+
+    def test_format_and_active_step_are_a_part_of_the_key(self):
+        render_graph(Fork, cache=self.cache)
+        self.assertTrue(
+            render_graph(Fork, 'png', cache=self.cache).startswith(b'-Tpng'))
+        image = render_graph(Fork, active_step_name='left', cache=self.cache)
+        self.assertIn(b'fillcolor=blue, fontcolor=white', image)
+        self.assertEqual(self.run.call_count, 3)
+
+    def test_graphviz_is_required(self):
+        self.run.side_effect = FileNotFoundError
+        with self.assertRaises(GraphvizNotInstalled):
+            render_graph(Fork, cache=self.cache)
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from arrowhead import Flow, step, arrow
+from arrowhead.journal import Journal
+from arrowhead.journal import _read_records
+
+
+class Tally(Flow):
+
+    @step(initial=True)
+    @arrow('loop')
+    def start(step, flow):
+        flow.i = 0
+        flow.log = ()
+
+    @step
+    @arrow('loop', value=True)
+    @arrow('done', value=False)
+    def loop(step, flow):
+        flow.i += 1
+        flow.log += (flow.i,)
+        return flow.i < flow.n
+
+    @step(accepting=True)
+    def done(step, flow):
+        return sum(flow.log)
+
+
+class Appender(Flow):
+
+    @step(initial=True)
+    @arrow('loop')
+    def start(step, flow):
+        flow.i = 0
+        flow.items = []
+
+    @step
+    @arrow('loop', value=True)
+    @arrow('done', value=False)
+    def loop(step, flow):
+        flow.i += 1
+        flow.items.append(flow.i)
+        return flow.i < flow.n
+
+    @step(accepting=True)
+    def done(step, flow):
+        return list(flow.items)
+
+
+class Blob:
+
+    pickled = 0
+
+    def __reduce__(self):
+        Blob.pickled += 1
+        return (Blob, ())
+
+
+class JournalTests(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'journal')
+
+    def _read(self):
+        with open(self.path, 'rb') as stream:
+            return [record for offset, record in _read_records(stream)]
+
+    def test_resumed_flow_has_the_journaled_state(self):
+        flow = Tally(autostart=False, n=5)
+        with Journal(self.path) as journal:
+            journal.begin(flow)
+            for obj, count in zip(flow._run(journal), range(4)):
+                pass
+        flow = Tally.resume(self.path)
+        self.assertEqual(getattr(flow, 'return'), 15)
+        self.assertEqual(flow.log, (1, 2, 3, 4, 5))
+
+    def test_changes_made_in_place_are_journaled(self):
+        flow = Appender(autostart=False, n=5)
+        with Journal(self.path) as journal:
+            journal.begin(flow)
+            for obj in flow._run(journal):
+                # Crash after the third item was appended and journaled
+                if len(getattr(flow, 'items', ())) == 3:
+                    break
+        self.assertEqual(flow.items, [1, 2, 3])
+        flow = Appender.resume(self.path)
+        self.assertEqual(getattr(flow, 'return'), [1, 2, 3, 4, 5])
+
+    def test_unchanged_values_are_not_written_again(self):
+        Blob.pickled = 0
+        flow = Tally(autostart=False, n=3, blob=Blob())
+        with Journal(self.path) as journal:
+            journal.begin(flow)
+            for obj in flow._run(journal):
+                pass
+        records = self._read()
+        self.assertIsInstance(pickle.loads(records[1][3]['blob']), Blob)
+        for record in records[2:]:
+            self.assertNotIn('blob', record[3])
+            self.assertLessEqual(set(record[3]), {'i', 'log', 'return'})
+
+    def test_unchanged_immutable_values_are_not_pickled_again(self):
+        blob = tuple(range(1000))
+        flow = Tally(autostart=False, n=3, blob=blob)
+        with mock.patch('pickle.dumps', wraps=pickle.dumps) as dumps:
+            with Journal(self.path) as journal:
+                journal.begin(flow)
+                for obj in flow._run(journal):
+                    pass
+        pickled = [call for call in dumps.call_args_list
+                   if call.args[0] is blob]
+        self.assertEqual(len(pickled), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.errors import DeadlineExceeded
+from arrowhead.errors import LimitExceeded
+from arrowhead.errors import ProgrammingError
+from arrowhead.errors import TransitionBudgetExceeded
+from arrowhead.limits import FlowLimits
+from arrowhead.main import main
+
+
+class Retry(Flow):
+
+    @step(initial=True)
+    @arrow('work', error=Exception)
+    @arrow('work')
+    def work(step, flow):
+        flow.count += 1
+
+
+class Handled(Flow):
+
+    @step(initial=True)
+    @arrow('work')
+    @arrow('handle', error=TransitionBudgetExceeded)
+    def work(step, flow):
+        flow.count += 1
+
+    @step(accepting=True)
+    def handle(step, flow):
+        return flow.count
+
+
+class LimitTests(unittest.TestCase):
+
+    def test_catch_all_error_arrow_cannot_escape_budget(self):
+        flow = Retry(autostart=False, count=0)
+        flow.set_limits(FlowLimits(max_transitions=100))
+        with self.assertRaises(TransitionBudgetExceeded):
+            flow.run()
+        # One routed overrun, the second one stops the flow
+        self.assertEqual(flow.count, 102)
+
+    def test_catch_all_error_arrow_cannot_escape_deadline(self):
+        flow = Retry(autostart=False, count=0)
+        flow.set_limits(FlowLimits(deadline=0.01))
+        with self.assertRaises(DeadlineExceeded):
+            flow.run()
+
+    def test_first_overrun_is_routed(self):
+        flow = Handled(autostart=False, count=0)
+        flow.set_limits(FlowLimits(max_transitions=10))
+        self.assertEqual(flow.run(), 11)
+
+    def test_limits_are_inherited(self):
+        class Limited(Retry, limits=FlowLimits(max_transitions=5)):
+            pass
+
+        class Derived(Limited):
+            pass
+        with self.assertRaises(TransitionBudgetExceeded):
+            Derived(count=0)
+
+    def test_limit_is_not_a_programming_error(self):
+        self.assertFalse(issubclass(LimitExceeded, ProgrammingError))
+
+    def test_command_line_reports_limit(self):
+        class Limited(Retry, limits=FlowLimits(max_transitions=5)):
+            pass
+        with self.assertRaises(SystemExit) as context:
+            main(Limited, [], count=0)
+        self.assertIn("flow stopped", str(context.exception))
+        self.assertIn("5 transitions", str(context.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import contextlib
+import io
+import unittest
+
+from arrowhead import Flow, step
+from arrowhead.main import X11FlowViewer
+from arrowhead.main import main
+
+
+class Noop(Flow):
+
+    @step(initial=True, accepting=True)
+    def start(step):
+        pass
+
+
+class MainTests(unittest.TestCase):
+
+    def _assert_rejected(self, argv):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            with self.assertRaises(SystemExit) as context:
+                main(Noop, argv)
+        self.assertEqual(context.exception.code, 2)
+        self.assertIn("argument --fps", stderr.getvalue())
+
+    def test_fps_must_be_positive(self):
+        self._assert_rejected(['--fps', '0'])
+        self._assert_rejected(['--fps', '-5'])
+        self._assert_rejected(['--fps', 'nan'])
+        self._assert_rejected(['--fps', 'fast'])
+
+    def test_viewer_rejects_fps_that_is_not_positive(self):
+        with self.assertRaises(ValueError):
+            X11FlowViewer(fps=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
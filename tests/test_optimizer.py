@@ -0,0 +1,92 @@
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.optimizer import _NOT_CONSTANT
+from arrowhead.optimizer import _get_constant
+
+LIMIT = 10
+
+
+def make_closure(value):
+    def closure(step):
+        return value
+    return closure
+
+
+class GetConstantTests(unittest.TestCase):
+
+    def test_constant_return_is_folded(self):
+        def returns_constant(step):
+            return 'go'
+        self.assertEqual(_get_constant(returns_constant), 'go')
+
+    def test_empty_function_is_folded(self):
+        def does_nothing(step):
+            pass
+        self.assertIsNone(_get_constant(does_nothing))
+
+    def test_docstring_is_ignored(self):
+        def documented(step):
+            """
+            A step with a docstring
+            """
+            return 3
+        self.assertEqual(_get_constant(documented), 3)
+
+    def test_global_is_not_folded(self):
+        def returns_global(step):
+            return LIMIT
+        self.assertIs(_get_constant(returns_global), _NOT_CONSTANT)
+
+    def test_closure_is_not_folded(self):
+        self.assertIs(_get_constant(make_closure(1)), _NOT_CONSTANT)
+
+    def test_side_effects_are_not_folded(self):
+        def has_side_effects(step, flow):
+            flow.x = 1
+            return 'go'
+        self.assertIs(_get_constant(has_side_effects), _NOT_CONSTANT)
+
+    def test_other_callables_are_not_folded(self):
+        async def coroutine(step):
+            return 1
+
+        def generator(step):
+            yield 1
+        for func in (coroutine, generator, len, lambda step: step):
+            with self.subTest(func=func):
+                self.assertIs(_get_constant(func), _NOT_CONSTANT)
+
+
+class OptimizeFlowTests(unittest.TestCase):
+
+    def test_only_constant_steps_are_folded(self):
+        class Chain(Flow, optimize=True):
+
+            @step(initial=True)
+            @arrow('constant')
+            def start(step, flow):
+                flow.x = 1
+
+            @step
+            @arrow('limit')
+            def constant(step):
+                pass
+
+            @step
+            @arrow('done')
+            def limit(step):
+                return LIMIT
+
+            @step(accepting=True)
+            def done(step, flow):
+                return flow.x
+
+        optimized = Chain.Meta.optimized
+        self.assertEqual(optimized.folded, {'constant': None})
+        self.assertEqual(optimized.removed, ('constant',))
+        self.assertEqual(getattr(Chain(), 'return'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
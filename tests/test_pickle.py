@@ -0,0 +1,120 @@
+import os
+import pickle
+import unittest
+
+from arrowhead import Flow, step, arrow, run_in_processes
+from arrowhead.core import ErrorArrow
+from arrowhead.core import ForkArrow
+from arrowhead.core import ValueArrow
+from arrowhead.errors import ConflictingArrow
+from arrowhead.errors import DuplicateInitialStep
+from arrowhead.errors import FlowIsAsynchronous
+from arrowhead.errors import InvalidFork
+from arrowhead.errors import NoArrowCouldHaveBeenFollowed
+from arrowhead.errors import NoSuchStep
+from arrowhead.errors import TransitionBudgetExceeded
+
+
+class Parity(Flow):
+
+    @step(initial=True)
+    @arrow('even', value=0)
+    @arrow('odd', value=1)
+    @arrow('invalid', error=TypeError)
+    def start(step, flow):
+        flow.pid = os.getpid()
+        return flow.n % 2
+
+    @step(accepting=True)
+    def even(step, flow):
+        return (flow.n, 'even')
+
+    @step(accepting=True)
+    def odd(step, flow):
+        return (flow.n, 'odd')
+
+    @step(accepting=True)
+    def invalid(step):
+        return 'invalid'
+
+
+def roundtrip(obj):
+    return pickle.loads(pickle.dumps(obj))
+
+
+class PickleTests(unittest.TestCase):
+
+    def test_steps_are_pickled_by_reference(self):
+        for step_cls in Parity.Meta.step_classes:
+            with self.subTest(step=step_cls.Meta.name):
+                self.assertIs(roundtrip(step_cls), step_cls)
+        self.assertEqual(
+            Parity.Meta.steps['even'].__qualname__, 'Parity.even')
+
+    def test_finished_flows(self):
+        flow = roundtrip(Parity(n=3))
+        self.assertIs(type(flow), Parity)
+        self.assertEqual(getattr(flow, 'return'), (3, 'odd'))
+        self.assertEqual(flow.n, 3)
+        self.assertEqual(getattr(flow.start, 'return'), 1)
+        self.assertEqual(getattr(flow.odd, 'return'), (3, 'odd'))
+        self.assertIsNone(flow.even.result())
+
+    def test_step_errors(self):
+        flow = roundtrip(Parity(n='x'))
+        self.assertEqual(getattr(flow, 'return'), 'invalid')
+        self.assertIsInstance(getattr(flow.start, 'raise'), TypeError)
+
+    def test_flows_can_run_after_unpickling(self):
+        flow = roundtrip(Parity(autostart=False, n=4))
+        self.assertEqual(flow.run(), (4, 'even'))
+
+    def test_arrows_and_dispatch_tables(self):
+        for obj in (ValueArrow('odd', 1), ErrorArrow('invalid', TypeError),
+                    ForkArrow(['a', 'b'], 'c', backend='processes')):
+            with self.subTest(arrow=obj):
+                self.assertEqual(repr(roundtrip(obj)), repr(obj))
+        table = Parity.Meta.dispatch[Parity.Meta.initial_id]
+        self.assertEqual(repr(roundtrip(table)), repr(table))
+
+    def test_errors(self):
+        start = Parity.Meta.steps['start']
+        arrow = ValueArrow('odd', 1)
+        for exc, attrs in [
+                (DuplicateInitialStep('a', 'b'),
+                 ('old_initial', 'new_initial')),
+                (NoArrowCouldHaveBeenFollowed(start()), ()),
+                (FlowIsAsynchronous('Parity'), ('flow_name',)),
+                (NoSuchStep('missing'), ('step_name',)),
+                (ConflictingArrow(arrow), ()),
+                (InvalidFork(arrow, 'reason'), ('reason',)),
+                (TransitionBudgetExceeded(start(), 10),
+                 ('max_transitions',))]:
+            with self.subTest(exc=type(exc).__name__):
+                copy = roundtrip(exc)
+                self.assertIs(type(copy), type(exc))
+                self.assertEqual(str(copy), str(exc))
+                for attr in attrs:
+                    self.assertEqual(getattr(copy, attr), getattr(exc, attr))
+        self.assertIs(ConflictingArrow(arrow).arrow, arrow)
+
+
+class RunInProcessesTests(unittest.TestCase):
+
+    def test_flows_run_in_other_processes(self):
+        flows = run_in_processes(
+            Parity, [{'n': n} for n in range(4)], max_workers=2,
+            return_flows=True)
+        self.assertEqual(
+            [getattr(flow, 'return') for flow in flows],
+            [(0, 'even'), (1, 'odd'), (2, 'even'), (3, 'odd')])
+        self.assertNotIn(os.getpid(), {flow.pid for flow in flows})
+
+    def test_returned_values(self):
+        self.assertEqual(
+            run_in_processes(Parity, [{'n': 5}, {'n': None}], max_workers=1),
+            [(5, 'odd'), 'invalid'])
+
+
+if __name__ == '__main__':
+    unittest.main()
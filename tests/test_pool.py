@@ -0,0 +1,55 @@
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.pool import FlowPool
+
+
+class Branchy(Flow):
+
+    @step(initial=True)
+    @arrow('left', value='left')
+    @arrow('right', value='right')
+    def start(step, flow):
+        return flow.side
+
+    @step
+    @arrow('end')
+    def left(step, flow):
+        step.payload = [1] * 10
+        return step.payload
+
+    @step
+    @arrow('end')
+    def right(step, flow):
+        return 'right'
+
+    @step(accepting=True)
+    def end(step, flow):
+        return flow.side
+
+
+class FlowPoolTests(unittest.TestCase):
+
+    def test_reused_flow_has_no_stale_step_state(self):
+        pool = FlowPool(Branchy)
+        self.assertEqual(pool.run(side='left'), 'left')
+        flow = pool.acquire(side='right')
+        self.assertIsNone(flow.left.result())
+        self.assertEqual(flow.left.__dict__, {})
+        # The record of the step is reused but doesn't keep the old value
+        self.assertIsNone(flow.left._record.value)
+        self.assertEqual(flow.right.result().value, 'right')
+
+    def test_reset_visits_only_instantiated_steps(self):
+        pool = FlowPool(Branchy)
+        flow = pool.acquire(side='right')
+        self.assertEqual(
+            [type(step).Meta.name for step in flow._activated],
+            ['start', 'right', 'end'])
+        pool.release(flow)
+        self.assertIs(pool.acquire(side='left'), flow)
+        self.assertEqual(len(flow._activated), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import asyncio
+import io
+import types
+import unittest
+from unittest import mock
+
+from arrowhead import Flow, step, arrow
+from arrowhead.profiler import FlowProfiler
+
+
+class Clock:
+    """
+    Fake clock that only moves when steps say so
+    """
+
+    def __init__(self):
+        self.wall = 0.0
+        self.cpu = 0.0
+
+    def spend(self, wall, cpu=0.0):
+        self.wall += wall
+        self.cpu += cpu
+
+    def as_time_module(self):
+        return types.SimpleNamespace(
+            perf_counter=lambda: self.wall, thread_time=lambda: self.cpu)
+
+
+class Timed(Flow):
+
+    @step(initial=True)
+    @arrow('work')
+    def start(step, flow):
+        flow.clock.spend(0.001)
+        flow.left = 3
+
+    @step
+    @arrow('work', value=True)
+    @arrow('done', value=False)
+    @arrow('failed', error=ValueError)
+    def work(step, flow):
+        flow.clock.spend(0.010, 0.004)
+        flow.left -= 1
+        if flow.left < flow.fail_below:
+            raise ValueError(flow.left)
+        return flow.left > 0
+
+    @step(accepting=True)
+    def done(step, flow):
+        return 'done'
+
+    @step(accepting=True)
+    def failed(step, flow):
+        flow.clock.spend(0.002)
+        return 'failed'
+
+
+class AsyncTimed(Flow):
+
+    @step(initial=True, accepting=True)
+    async def wait(step, flow):
+        await asyncio.sleep(0)
+        flow.clock.spend(0.020)
+        return 'waited'
+
+
+class FlowProfilerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch(
+            'arrowhead.profiler.time', self.clock.as_time_module())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.profiler = FlowProfiler()
+
+    def profile(self, **kwargs):
+        flow = Timed(autostart=False, clock=self.clock, **kwargs)
+        return self.profiler.profile(flow)
+
+    def test_per_step_timings(self):
+        flow = self.profile(fail_below=0)
+        self.assertEqual(getattr(flow, 'return'), 'done')
+        stats = self.profiler.stats
+        self.assertEqual(
+            set(stats),
+            {('Timed', 'start'), ('Timed', 'work'), ('Timed', 'done')})
+        work = stats['Timed', 'work']
+        self.assertEqual(work.calls, 3)
+        self.assertAlmostEqual(work.wall, 0.030)
+        self.assertAlmostEqual(work.cpu, 0.012)
+        self.assertEqual(work.arrow, 0.0)
+        self.assertEqual(stats['Timed', 'start'].calls, 1)
+        self.assertAlmostEqual(stats['Timed', 'start'].wall, 0.001)
+        self.assertEqual(stats['Timed', 'done'].wall, 0.0)
+
+    def test_steps_that_raise_are_timed(self):
+        flow = self.profile(fail_below=2)
+        self.assertEqual(getattr(flow, 'return'), 'failed')
+        self.assertIsInstance(getattr(flow.work, 'raise'), ValueError)
+        self.assertEqual(self.profiler.stats['Timed', 'work'].calls, 2)
+        self.assertAlmostEqual(
+            self.profiler.stats['Timed', 'failed'].wall, 0.002)
+
+    def test_statistics_of_many_flows_add_up(self):
+        self.profile(fail_below=0)
+        self.profile(fail_below=0)
+        self.assertEqual(self.profiler.stats['Timed', 'work'].calls, 6)
+        self.assertAlmostEqual(
+            self.profiler.stats['Timed', 'work'].wall, 0.060)
+
+    def test_async_steps_are_timed(self):
+        flow = AsyncTimed(autostart=False, clock=self.clock)
+
+        async def profile():
+            async for obj in flow._run_async(self.profiler):
+                pass
+
+        asyncio.run(profile())
+        self.assertEqual(getattr(flow, 'return'), 'waited')
+        self.assertAlmostEqual(
+            self.profiler.stats['AsyncTimed', 'wait'].wall, 0.020)
+
+    def test_summary(self):
+        self.profile(fail_below=0)
+        file = io.StringIO()
+        self.profiler.print_summary(file)
+        lines = file.getvalue().splitlines()
+        self.assertEqual(lines[0].split()[:3], ['step', 'calls', 'wall'])
+        # Slowest steps first
+        self.assertEqual(
+            [line.split()[0] for line in lines[1:]],
+            ['Timed.work', 'Timed.start', 'Timed.done'])
+        self.assertEqual(lines[1].split()[1], '3')
+        self.assertEqual(lines[1].split()[-1], '96.8%')
+
+    def test_collapsed_stacks(self):
+        self.profile(fail_below=0)
+        file = io.StringIO()
+        self.profiler.write_collapsed(file)
+        # Steps that took no time at all are left out
+        self.assertEqual(file.getvalue().splitlines(), [
+            'Timed;start;Timed.start 1000',
+            'Timed;work;Timed.work 30000',
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
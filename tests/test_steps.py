@@ -0,0 +1,124 @@
+import unittest
+
+from arrowhead import Flow, step, arrow
+from arrowhead.core import StepResult
+from arrowhead.errors import NoArrowCouldHaveBeenFollowed
+
+
+class Countdown(Flow):
+
+    @step(initial=True)
+    @arrow('tick')
+    def start(step, flow):
+        flow.left = flow.count
+
+    @step
+    @arrow('tick', value=True)
+    @arrow('done', value=False)
+    @arrow('broken', error=ZeroDivisionError)
+    def tick(step, flow):
+        flow.left -= 1
+        1 / flow.left
+        return flow.left > 1
+
+    @step(accepting=True)
+    def done(step, flow):
+        return flow.left
+
+    @step(accepting=True)
+    def broken(step):
+        return 'broken'
+
+
+class StepTableTests(unittest.TestCase):
+
+    def test_step_ids_are_dense(self):
+        meta = Countdown.Meta
+        self.assertEqual(
+            meta.step_ids, {'start': 0, 'tick': 1, 'done': 2, 'broken': 3})
+        self.assertEqual(meta.step_classes, tuple(meta.steps.values()))
+        self.assertEqual(meta.initial_id, meta.step_ids['start'])
+        self.assertEqual(len(meta.dispatch), len(meta.step_classes))
+        self.assertEqual(
+            [target_id for target_id, arrow in meta.dispatch[1].errors], [3])
+
+    def test_steps_are_accessed_by_name(self):
+        flow = Countdown(count=3)
+        self.assertIs(flow.tick, flow._steps[Countdown.Meta.step_ids['tick']])
+        self.assertIsInstance(flow.tick, Countdown.Meta.steps['tick'])
+        self.assertIs(Countdown.tick, Countdown.Meta.steps['tick'])
+
+    def test_only_visited_steps_are_instantiated(self):
+        flow = Countdown(count=3)
+        self.assertEqual(
+            [type(step).Meta.name for step in flow._activated],
+            ['start', 'tick', 'done'])
+        self.assertIsNone(flow._steps[Countdown.Meta.step_ids['broken']])
+
+
+class StepResultTests(unittest.TestCase):
+
+    def test_records_are_slotted(self):
+        result = StepResult(1)
+        self.assertFalse(hasattr(result, '__dict__'))
+        with self.assertRaises(AttributeError):
+            result.extra = 1
+
+    def test_record_is_reused(self):
+        flow = Countdown(autostart=False, count=3)
+        record = flow.tick.result()
+        self.assertIsNone(record)
+        flow.run()
+        record = flow.tick.result()
+        self.assertIs(record, flow.tick._record)
+        self.assertEqual((record.value, record.error), (False, None))
+
+    def test_return_state_item(self):
+        flow = Countdown(count=3)
+        result = flow.tick.result()
+        self.assertFalse(result.raised)
+        self.assertEqual(result.as_state_item(), ('return', False))
+        self.assertIs(getattr(flow.tick, 'return'), False)
+        self.assertFalse(hasattr(flow.tick, 'raise'))
+        self.assertIsNone(flow.start.result().value)
+        self.assertEqual(repr(result), 'StepResult(False)')
+
+    def test_raise_state_item(self):
+        flow = Countdown(count=1)
+        self.assertEqual(getattr(flow, 'return'), 'broken')
+        result = flow.tick.result()
+        self.assertTrue(result.raised)
+        self.assertIsInstance(result.error, ZeroDivisionError)
+        self.assertEqual(result.as_state_item(), ('raise', result.error))
+        self.assertIs(getattr(flow.tick, 'raise'), result.error)
+        self.assertFalse(hasattr(flow.tick, 'return'))
+
+    def test_steps_that_did_not_run(self):
+        flow = Countdown(autostart=False, count=3)
+        self.assertFalse(hasattr(flow.done, 'return'))
+        self.assertFalse(hasattr(flow.done, 'raise'))
+        with self.assertRaises(AttributeError):
+            flow.done.other
+
+    def test_outcome_is_shown_in_errors(self):
+        class Stuck(Flow):
+
+            @step(initial=True)
+            @arrow('end', value=1)
+            def start(step, flow):
+                step.seen = True
+                return 2
+
+            @step(accepting=True)
+            def end(step):
+                pass
+
+        with self.assertRaises(NoArrowCouldHaveBeenFollowed) as cm:
+            Stuck()
+        self.assertEqual(
+            str(cm.exception).splitlines()[-2:],
+            ["    seen: True", "    return: 2"])
+
+
+if __name__ == '__main__':
+    unittest.main()